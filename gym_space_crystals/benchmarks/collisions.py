@@ -0,0 +1,152 @@
+"""
+Benchmark of the step time against the number of entities, with the spatial-hash broad phase and with all the pairs
+of entities tested (as the nested loops it replaced did), along with the enemy x bullet collision pass alone.
+
+Run it with `python -m gym_space_crystals.benchmarks.collisions`.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from gym_space_crystals.envs import EnvConfig, SpaceCrystalsEnv, SpaceCrystalsVectorEnv
+from gym_space_crystals.envs import _spatial
+from gym_space_crystals.envs._globals import *
+
+# probability of shooting at each step, so that plenty of bullets are around
+SHOOT_PROBABILITY = 0.5
+
+
+def random_actions(rng: np.random.RandomState, n_steps: int, n_envs: int) -> np.ndarray:
+    """
+    Draw random actions, shooting often
+
+    :param rng: The random generator
+    :param n_steps: The number of steps
+    :param n_envs: The number of environments
+    :return: The actions, shape (n_steps, n_envs)
+    """
+    actions = rng.randint(4, size=(n_steps, n_envs))
+    actions[rng.uniform(size=actions.shape) < SHOOT_PROBABILITY] = 4
+    return actions
+
+
+def all_pairs(enabled: bool, _defaults=(_spatial.MAX_ALL_PAIRS, _spatial.SINGLE_CELL_SIZE)):
+    """
+    Make the collision grids test all the pairs of entities (of a scene), or restore them
+
+    :param enabled: Whether to test all the pairs
+    """
+    if enabled:
+        _spatial.MAX_ALL_PAIRS = _spatial.SINGLE_CELL_SIZE = np.inf
+    else:
+        _spatial.MAX_ALL_PAIRS, _spatial.SINGLE_CELL_SIZE = _defaults
+
+
+def run_env(actions: np.ndarray, config: EnvConfig) -> tuple:
+    """
+    Step a single environment, resetting it (untimed) at the end of each episode
+
+    :param actions: The actions, shape (n_steps, 1)
+    :param config: The environment's config
+    :return: The time per step (in seconds) and the total reward
+    """
+    np.random.seed(0)
+    env = SpaceCrystalsEnv(config=config)
+    env.reset()
+    total = 0.
+    elapsed = 0.
+    for action in actions[:, 0]:
+        start = time.perf_counter()
+        _, reward, done, _ = env.step(int(action))
+        elapsed += time.perf_counter() - start
+        total += reward
+        if done:
+            env.reset()
+    return elapsed / len(actions), total
+
+
+def run_vec_env(actions: np.ndarray, config: EnvConfig) -> tuple:
+    """
+    Step a vectorized environment
+
+    :param actions: The actions, shape (n_steps, n_envs)
+    :param config: The scenes' config
+    :return: The time per step of a single environment (in seconds) and the total reward
+    """
+    env = SpaceCrystalsVectorEnv(actions.shape[1], config=config)
+    env.seed(0)
+    env.reset()
+    total = 0.
+    start = time.perf_counter()
+    for action in actions:
+        _, rewards, _, _ = env.step(action)
+        total += rewards.sum()
+    return (time.perf_counter() - start) / actions.size, total
+
+
+def run_hits(n: int, repeats: int) -> tuple:
+    """
+    Find the hits between as many enemies and bullets spread over the window
+
+    :param n: The number of enemies and of bullets
+    :param repeats: The number of timed repetitions
+    :return: The time per repetition (in seconds) and the number of hits
+    """
+    rng = np.random.RandomState(0)
+    enemies_x, bullets_x = rng.uniform(0, SCREEN_WIDTH, size=(2, n))
+    enemies_y, bullets_y = rng.uniform(0, SCREEN_HEIGHT, size=(2, n))
+
+    def hits():
+        grid = _spatial.SpatialHash(enemies_x, enemies_y)
+        b, e = _spatial.intersecting_pairs(grid, enemies_x, enemies_y, ENTITIES.get('enemy').get('radius'),
+                                           bullets_x, bullets_y, ENTITIES.get('bullet').get('radius'))
+        return _spatial.first_hits(e, b)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        e, _ = hits()
+    return (time.perf_counter() - start) / repeats, len(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--steps', type=int, default=200, help='timed steps per run')
+    parser.add_argument('--envs', type=int, default=64, help='number of scenes of the vectorized environment')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16, 64, 256],
+                        help='multipliers of the number of crystals and enemies in the scene')
+    args = parser.parse_args()
+
+    n_crystals, n_enemies = EnvConfig().n_crystals, EnvConfig().n_enemies
+    print('%9s %-10s %14s %14s %8s' % ('entities', 'env', 'all pairs (us)', 'grid (us)', 'speedup'))
+    try:
+        for scale in args.scales:
+            config = EnvConfig(n_crystals=scale * n_crystals, n_enemies=scale * n_enemies)
+            for name, run, n_envs in [('single', run_env, 1), ('vector', run_vec_env, args.envs)]:
+                actions = random_actions(np.random.RandomState(0), args.steps, n_envs)
+                all_pairs(True)
+                all_pairs_time, all_pairs_reward = run(actions, config)
+                all_pairs(False)
+                grid_time, grid_reward = run(actions, config)
+                if not np.isclose(all_pairs_reward, grid_reward):
+                    raise AssertionError('%s rewards mismatch: %f (all pairs) != %f (grid)' %
+                                         (name, all_pairs_reward, grid_reward))
+                print('%9d %-10s %14.2f %14.2f %7.2fx' % (scale * (n_crystals + n_enemies), name,
+                                                          all_pairs_time * 1e6, grid_time * 1e6,
+                                                          all_pairs_time / grid_time))
+            # the enemy x bullet pass alone, as many bullets as enemies
+            all_pairs(True)
+            all_pairs_time, all_pairs_hits = run_hits(scale * n_enemies, args.steps)
+            all_pairs(False)
+            grid_time, grid_hits = run_hits(scale * n_enemies, args.steps)
+            if all_pairs_hits != grid_hits:
+                raise AssertionError('hits mismatch: %d (all pairs) != %d (grid)' % (all_pairs_hits, grid_hits))
+            print('%9d %-10s %14.2f %14.2f %7.2fx' % (2 * scale * n_enemies, 'hits', all_pairs_time * 1e6,
+                                                      grid_time * 1e6, all_pairs_time / grid_time))
+    finally:
+        all_pairs(False)
+    print('rewards and hits match on all the runs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark of the vectorized ray casters (full broadcast and angular buckets) against the per-ray loop they replaced.
+
+Run it with `python -m gym_space_crystals.benchmarks.raycast`.
+"""
+import argparse
+import timeit
+from types import SimpleNamespace
+
+import numpy as np
+
+from gym_space_crystals.envs import EnvConfig, SpaceCrystalsEnv
+from gym_space_crystals.envs._entities import *
+from gym_space_crystals.envs._sensors import cast_rays, cast_rays_bucketed
+
+
+def snapshot(env: SpaceCrystalsEnv) -> SimpleNamespace:
+    """
+    Copy the scene of the environment into plain Python objects, as the entities were before being pooled
+
+    :param env: The environment
+    :return: The scene
+    """
+    def entity(e: Entity) -> SimpleNamespace:
+        return SimpleNamespace(x=float(e.x), y=float(e.y), rotation=float(e.rotation), radius=e.radius,
+                               _type=e._type)
+    return SimpleNamespace(spaceship=entity(env.spaceship),
+                           entities=[entity(e) for e in env.crystals] + [entity(e) for e in env.enemies],
+                           n_observations=env.n_observations, dtheta=env.dtheta)
+
+
+def loop_observations(scene: SimpleNamespace) -> np.ndarray:
+    """
+    Compute the observations of a scene with a per-ray, per-entity loop
+
+    :param scene: The scene
+    :return: The observations
+    """
+    state = np.zeros(3 + scene.n_observations * 2)
+    state[0] = scene.spaceship.x / DIAG
+    state[1] = scene.spaceship.y / DIAG
+    state[2] = scene.spaceship.rotation / math.radians(360) % 1.
+    for alpha in range(scene.n_observations):
+        i = 3 + 2 * alpha
+        theta = scene.spaceship.rotation + alpha * scene.dtheta
+        x = scene.spaceship.x + DIAG * math.cos(theta)
+        y = scene.spaceship.y + DIAG * math.sin(theta)
+        # keep the nearest entity
+        nearest = math.inf
+        for entity in scene.entities:
+            t, d = line_entity_intersection((scene.spaceship.x, scene.spaceship.y), (x, y), entity)
+            if t != 0.0 and d < nearest:
+                state[i] = t
+                nearest = d
+        if nearest < math.inf:
+            state[i + 1] = nearest / DIAG
+        else:
+            state[i] = BORDER_VALUE
+            state[i + 1] = border_distance(scene.spaceship.x, scene.spaceship.y, theta) / DIAG
+    return state
+
+
+def random_scene(env: SpaceCrystalsEnv, rng: np.random.RandomState):
+    """
+    Move the spaceship to a random position and rotation, and reset the other entities
+
+    :param env: The environment
+    :param rng: The random generator
+    """
+    env.reset()
+    env.spaceship.x = rng.uniform(0, SCREEN_WIDTH)
+    env.spaceship.y = rng.uniform(0, SCREEN_HEIGHT)
+    env.spaceship.rotation = rng.uniform(0, 2 * math.pi)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scenes', type=int, default=50, help='number of random scenes')
+    parser.add_argument('--repeats', type=int, default=20, help='timed observations per scene')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16],
+                        help='multipliers of the number of crystals and enemies in the scene')
+    parser.add_argument('--rays', type=int, nargs='+', default=[N_OBSERVATIONS, 90, 360],
+                        help='numbers of sensor rays')
+    args = parser.parse_args()
+
+    n_crystals, n_enemies = EnvConfig().n_crystals, EnvConfig().n_enemies
+    print('%9s %6s %14s %16s %16s %8s' % ('entities', 'rays', 'loop (us)', 'broadcast (us)', 'bucketed (us)',
+                                          'speedup'))
+    for scale in args.scales:
+        for n_rays in args.rays:
+            env = SpaceCrystalsEnv(n_observations=n_rays, n_crystals=scale * n_crystals, n_enemies=scale * n_enemies)
+            rng = np.random.RandomState(0)
+            times = np.zeros(3)
+            for _ in range(args.scenes):
+                random_scene(env, rng)
+                scene = snapshot(env)
+                expected = loop_observations(scene)
+                times[0] += timeit.timeit(lambda: loop_observations(scene), number=args.repeats)
+                for k, caster in enumerate([cast_rays, cast_rays_bucketed]):
+                    env._cast_rays = caster
+                    env.make_observations()
+                    if not np.allclose(env.state, expected):
+                        raise AssertionError('%s observations mismatch:\n%s\n%s' %
+                                             (caster.__name__, env.state, expected))
+                    times[k + 1] += timeit.timeit(env.make_observations, number=args.repeats)
+            times *= 1e6 / (args.scenes * args.repeats)
+            print('%9d %6d %14.2f %16.2f %16.2f %7.2fx' % (scale * (n_crystals + n_enemies), n_rays,
+                                                           times[0], times[1], times[2],
+                                                           times[0] / times[1:].min()))
+    print('observations match on all the scenes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Standard benchmark suite of SpaceCrystalsEnv: step() throughput, reset() latency, make_observations() time and
+render('rgb_array') frame rate, swept over entity counts, ray counts and action mixes.
+
+Results are written as JSON (the progress goes to stderr); with --baseline, they are compared against a stored run
+and the exit status is non-zero if any of them regressed beyond the tolerance.
+
+Run it with `space-crystals-bench` or `python -m gym_space_crystals.benchmarks.suite`.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from gym_space_crystals.envs import EnvConfig, SpaceCrystalsEnv
+from gym_space_crystals.envs._globals import *
+
+# format version of the JSON results
+RESULTS_VERSION = 1
+# action mixes: probability of each action (accelerate, decelerate, rotate cw, rotate ccw, shoot)
+ACTION_MIXES = {
+    'random': [0.2, 0.2, 0.2, 0.2, 0.2],
+    'shoot': [0.1, 0.05, 0.05, 0.05, 0.75],
+}
+# measures: unit, and whether higher is better
+MEASURES = {
+    'step': ('steps/s', True),
+    'reset': ('us', False),
+    'observations': ('us', False),
+    'render': ('fps', True),
+}
+
+
+def best_time(fn: Callable, number: int, repeats: int) -> float:
+    """
+    Time a function, keeping the best of several runs to filter out the noise of the machine
+
+    :param fn: The function
+    :param number: The number of calls per run
+    :param repeats: The number of runs
+    :return: The best time per call (in seconds)
+    """
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def measure_step(env: SpaceCrystalsEnv, actions: np.ndarray, repeats: int) -> float:
+    """
+    Measure the step throughput, resetting (untimed) at the end of each episode
+
+    :param env: The environment
+    :param actions: The actions to apply
+    :param repeats: The number of runs
+    :return: The best number of steps per second
+    """
+    best = 0.
+    for _ in range(repeats):
+        env.seed(0)
+        env.reset()
+        elapsed = 0.
+        for action in actions:
+            start = time.perf_counter()
+            _, _, done, _ = env.step(int(action))
+            elapsed += time.perf_counter() - start
+            if done:
+                env.reset()
+        best = max(best, len(actions) / elapsed)
+    return best
+
+
+def measure_render(env: SpaceCrystalsEnv, actions: np.ndarray, repeats: int) -> float:
+    """
+    Measure the frame rate of render('rgb_array') along an episode
+
+    :param env: The environment
+    :param actions: The actions to apply between frames
+    :param repeats: The number of runs
+    :return: The best number of frames per second
+    """
+    best = 0.
+    for _ in range(repeats):
+        env.seed(0)
+        env.reset()
+        elapsed = 0.
+        for action in actions:
+            _, _, done, _ = env.step(int(action))
+            if done:
+                env.reset()
+            start = time.perf_counter()
+            env.render('rgb_array')
+            elapsed += time.perf_counter() - start
+        best = max(best, len(actions) / elapsed)
+    return best
+
+
+def run(scales: List[int], rays: List[int], mixes: List[str], steps: int, repeats: int,
+        render: bool) -> List[Dict]:
+    """
+    Run the benchmarks
+
+    :param scales: The multipliers of the number of crystals and enemies
+    :param rays: The numbers of sensor rays
+    :param mixes: The action mixes
+    :param steps: The number of steps per run
+    :param repeats: The number of runs of each benchmark (the best one is kept)
+    :param render: Whether to measure rendering
+    :return: The results
+    """
+    n_crystals, n_enemies = EnvConfig().n_crystals, EnvConfig().n_enemies
+    results = []
+
+    def add(measure: str, value: float, **params):
+        unit, higher_is_better = MEASURES[measure]
+        results.append(dict(measure=measure, params=params, value=value, unit=unit,
+                            higher_is_better=higher_is_better))
+        print('%-13s %-40s %12.2f %s' % (measure, ' '.join('%s=%s' % item for item in params.items()), value, unit),
+              file=sys.stderr)
+
+    for scale in scales:
+        config = EnvConfig(n_crystals=scale * n_crystals, n_enemies=scale * n_enemies)
+        entities = scale * (n_crystals + n_enemies)
+        for n_rays in rays:
+            env = SpaceCrystalsEnv(n_observations=n_rays, config=config)
+            env.reset()
+            add('reset', best_time(env.reset, steps, repeats) * 1e6, entities=entities, rays=n_rays)
+            add('observations', best_time(env.make_observations, steps, repeats) * 1e6, entities=entities,
+                rays=n_rays)
+            for mix in mixes:
+                actions = np.random.RandomState(0).choice(len(ACTION_MIXES[mix]), steps, p=ACTION_MIXES[mix])
+                add('step', measure_step(env, actions, repeats), entities=entities, rays=n_rays, actions=mix)
+            if render:
+                try:
+                    actions = np.random.RandomState(0).choice(5, steps, p=ACTION_MIXES['random'])
+                    add('render', measure_render(env, actions, repeats), entities=entities, rays=n_rays)
+                except Exception as error:
+                    # e.g. no display to render on
+                    print('render skipped: %s: %s' % (type(error).__name__, error), file=sys.stderr)
+                    render = False
+            env.close()
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[Dict]:
+    """
+    Compare results against a baseline
+
+    :param results: The results
+    :param baseline: The baseline results
+    :param tolerance: The relative slowdown above which a result is a regression
+    :return: The regressions
+    """
+    reference = {(entry['measure'], json.dumps(entry['params'], sort_keys=True)): entry['value']
+                 for entry in baseline}
+    regressions = []
+    print('%-13s %-40s %12s %12s %8s' % ('measure', 'params', 'baseline', 'current', 'speedup'), file=sys.stderr)
+    for entry in results:
+        key = (entry['measure'], json.dumps(entry['params'], sort_keys=True))
+        if key not in reference:
+            continue
+        # speedup > 1 is better, whatever the unit
+        speedup = entry['value'] / reference[key] if entry['higher_is_better'] else reference[key] / entry['value']
+        regressed = speedup < 1 - tolerance
+        if regressed:
+            regressions.append(dict(entry, baseline=reference[key], speedup=speedup))
+        print('%-13s %-40s %12.2f %12.2f %7.2fx%s' % (entry['measure'], ' '.join('%s=%s' % item
+                                                                                for item in entry['params'].items()),
+                                                      reference[key], entry['value'], speedup,
+                                                      '  REGRESSION' if regressed else ''), file=sys.stderr)
+    return regressions
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16],
+                        help='multipliers of the number of crystals and enemies in the scene')
+    parser.add_argument('--rays', type=int, nargs='+', default=[N_OBSERVATIONS, 90],
+                        help='numbers of sensor rays')
+    parser.add_argument('--actions', nargs='+', default=list(ACTION_MIXES), choices=list(ACTION_MIXES),
+                        help='action mixes')
+    parser.add_argument('--steps', type=int, default=500, help='steps (or calls) per run')
+    parser.add_argument('--repeats', type=int, default=3, help='runs per benchmark, the best one is kept')
+    parser.add_argument('--no-render', action='store_true', help='skip the rendering benchmark')
+    parser.add_argument('--output', '-o', help='file to write the JSON results to (stdout if not given)')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative slowdown against the baseline above which a benchmark regressed')
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.rays, args.actions, args.steps, args.repeats, not args.no_render)
+    report = dict(version=RESULTS_VERSION,
+                  meta=dict(time=time.strftime('%Y-%m-%dT%H:%M:%S%z'), python=platform.python_version(),
+                            numpy=np.__version__, platform=platform.platform(), machine=platform.machine(),
+                            args=vars(args)),
+                  results=results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print('%d benchmark(s) regressed by more than %d%%' % (len(regressions), args.tolerance * 100),
+                  file=sys.stderr)
+            sys.exit(1)
+        print('no regression', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmark of the throughput of SpaceCrystalsAsyncVectorEnv against the number of worker processes.
+
+Run it with `python -m gym_space_crystals.benchmarks.workers`.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from gym_space_crystals.envs import SpaceCrystalsAsyncVectorEnv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--envs', type=int, default=64, help='number of environments')
+    parser.add_argument('--steps', type=int, default=200, help='timed steps per run')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='numbers of worker processes (powers of 2 up to the number of CPUs by default)')
+    args = parser.parse_args()
+
+    n_cpus = os.cpu_count() or 1
+    workers = args.workers or [2 ** k for k in range(n_cpus.bit_length()) if 2 ** k <= n_cpus]
+    rng = np.random.RandomState(0)
+    actions = rng.randint(5, size=(args.steps, args.envs))
+    print('%8s %14s %8s' % ('workers', 'steps/s', 'scaling'))
+    reference = None
+    for n_workers in workers:
+        env = SpaceCrystalsAsyncVectorEnv(num_envs=args.envs, n_workers=n_workers, copy=False)
+        env.seed(0)
+        env.reset()
+        start = time.perf_counter()
+        for action in actions:
+            env.step(action)
+        throughput = actions.size / (time.perf_counter() - start)
+        env.close()
+        reference = reference or throughput / n_workers
+        print('%8d %14.0f %7.2fx' % (n_workers, throughput, throughput / reference))
+
+
+if __name__ == '__main__':
+    main()
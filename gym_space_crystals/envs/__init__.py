@@ -1 +1,17 @@
+from gym_space_crystals.envs._config import EnvConfig
+from gym_space_crystals.envs._population import PopulationEvaluator, evaluate_population, linear_policy
+from gym_space_crystals.envs._recording import TrajectoryRecorder, TrajectoryReplayer
+from gym_space_crystals.envs._state import EnvState
+from gym_space_crystals.envs._telemetry import Telemetry
+from gym_space_crystals.envs._video import VideoRecorder
 from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+
+from gym_space_crystals.envs.space_crystals_vec_env import SpaceCrystalsVectorEnv
+
+from gym_space_crystals.envs.space_crystals_multi_env import SpaceCrystalsMultiAgentEnv
+
+from gym_space_crystals.envs.space_crystals_async_env import SpaceCrystalsAsyncVectorEnv, WorkerCrashedError
+
+from gym_space_crystals.envs.space_crystals_remote_env import RemoteEnvError, SpaceCrystalsRemoteVectorEnv
+
+from gym_space_crystals.envs.space_crystals_server import EnvServer
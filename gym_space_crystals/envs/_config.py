@@ -0,0 +1,96 @@
+from typing import Mapping, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from gym_space_crystals.envs._globals import *
+
+
+class EnvConfig(NamedTuple):
+    """
+    The tunable parameters of an environment, resolved into flat numbers when the environment is created.
+
+    The defaults are ENVIRONMENT's, ENTITIES' and the rewards' globals. A config is immutable: derive variants with
+    `_replace`, e.g. `config._replace(enemy_max_velocity=4)`. The entities' sizes and sprites stay global, as the
+    renderers and the collision grids are built for them.
+    """
+    # entities per scene
+    n_crystals: int = ENVIRONMENT.get('n_crystals')
+    n_enemies: int = ENVIRONMENT.get('n_enemies')
+    # spawn distributions (normal, per coordinate), given for the window and stretched to larger worlds
+    crystals_mean_x: float = ENVIRONMENT.get('crystals_mean_1')
+    crystals_mean_y: float = ENVIRONMENT.get('crystals_mean_2')
+    crystals_std_x: float = ENVIRONMENT.get('crystals_std_1')
+    crystals_std_y: float = ENVIRONMENT.get('crystals_std_2')
+    enemies_mean_x: float = ENVIRONMENT.get('enemies_mean_1')
+    enemies_mean_y: float = ENVIRONMENT.get('enemies_mean_2')
+    enemies_std_x: float = ENVIRONMENT.get('enemies_std_1')
+    enemies_std_y: float = ENVIRONMENT.get('enemies_std_2')
+    # spaceship's motion (rotation in degrees)
+    spaceship_acceleration: float = ENTITIES.get('spaceship').get('acceleration')
+    spaceship_step_rotation: float = ENTITIES.get('spaceship').get('step_rotation')
+    spaceship_max_velocity: float = ENTITIES.get('spaceship').get('max_velocity')
+    # enemies' motion
+    enemy_step_velocity: float = ENTITIES.get('enemy').get('step_velocity')
+    enemy_max_velocity: float = ENTITIES.get('enemy').get('max_velocity')
+    # rewards
+    got_crystal: float = GOT_CRYSTAL
+    shot: float = SHOT
+    killed_enemy: float = KILLED_ENEMY
+    died: float = DIED
+    moved: float = MOVED
+    collected_all: float = COLLECTED_ALL
+
+    @property
+    def max_relative_velocity(self) -> float:
+        """
+        The largest relative motion of two colliding entities per unit of time: a bullet (twice the spaceship's
+        velocity) against an enemy, as MAX_RELATIVE_VELOCITY
+        """
+        return 2 * self.spaceship_max_velocity + self.enemy_max_velocity
+
+    def entity_params(self, _type: str) -> dict:
+        """
+        Get the parameters of an entity type, as in ENTITIES with the config's values
+
+        :param _type: The entity type
+        :return: The parameters
+        """
+        params = dict(ENTITIES.get(_type))
+        if _type == 'spaceship':
+            params.update(acceleration=self.spaceship_acceleration, step_rotation=self.spaceship_step_rotation,
+                          max_velocity=self.spaceship_max_velocity)
+        elif _type == 'enemy':
+            params.update(step_velocity=self.enemy_step_velocity, max_velocity=self.enemy_max_velocity)
+        return params
+
+
+# -- Functions --
+
+def as_config(config: Optional[Union[EnvConfig, Mapping]], n_crystals: int = None, n_enemies: int = None) -> EnvConfig:
+    """
+    Get an environment's config
+
+    :param config: The config, its fields as a mapping (e.g. from JSON), or None for the defaults
+    :param n_crystals: The number of crystals per scene, overriding the config's if not None
+    :param n_enemies: The number of enemies per scene, overriding the config's if not None
+    :return: The config
+    """
+    if config is None:
+        config = EnvConfig()
+    elif not isinstance(config, EnvConfig):
+        config = EnvConfig(**config)
+    if n_crystals is not None:
+        config = config._replace(n_crystals=n_crystals)
+    if n_enemies is not None:
+        config = config._replace(n_enemies=n_enemies)
+    return config
+
+
+def stack_configs(configs: Sequence[EnvConfig]) -> EnvConfig:
+    """
+    Stack configs field by field, for a batch of scenes
+
+    :param configs: The configs
+    :return: A config whose fields are arrays, one value per config
+    """
+    return EnvConfig(*np.array(configs, dtype=np.float64).reshape(len(configs), len(EnvConfig._fields)).T)
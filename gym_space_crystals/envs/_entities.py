@@ -1,19 +1,222 @@
 import math
-from typing import Tuple
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
 
-from gym.envs.classic_control import rendering
-from gym.envs.classic_control.rendering import Geom
+import numpy as np
 
 from gym_space_crystals.envs._globals import *
 
+if TYPE_CHECKING:
+    from gym_space_crystals.envs._config import EnvConfig
+
+# a bullet moves at least 1 px per unit of time, so it leaves the window within DIAG ticks of duration 1: with one shot
+# per tick, there are never more bullets than this in the scene (see `bullets_capacity` for larger worlds and other
+# durations)
+BULLETS_CAPACITY = math.ceil(DIAG) + 1
+
+
+# -- Entities storage --
+
+
+class EntityPool:
+    # number of float fields per slot: x, y, rotation, velocity
+    N_FIELDS = 4
+
+    def __init__(self, _type: str, capacity: int, entity_class: type = None, values: np.ndarray = None,
+                 alive: np.ndarray = None, params: dict = None):
+        """
+        Create a fixed-capacity storage for the entities of a type.
+
+        The entities' state lives in arrays (one slot per entity) with an alive mask, and free slots are kept in a
+        free-list, so that adding and removing an entity are O(1) and allocate nothing. The entity parameters are
+        resolved once, here.
+
+        :param _type: The entities' type
+        :param capacity: The maximum number of entities
+        :param entity_class: The Entity subclass viewing each slot (None if the entities are bound later)
+        :param values: The storage of the float fields, shape (N_FIELDS, capacity), allocated if None
+        :param alive: The storage of the alive mask, shape (capacity,), allocated if None
+        :param params: The entity parameters, ENTITIES' if None (see `EnvConfig.entity_params`)
+        """
+        self._type = _type
+        self.capacity = capacity
+        # entity parameters
+        params = ENTITIES.get(_type) if params is None else params
+        self.radius = params.get('radius')
+        self.value = params.get('value')
+        self.initial_rotation = params.get('initial_rotation')
+        self.initial_velocity = params.get('initial_velocity')
+        self.step_velocity = params.get('step_velocity', 0)
+        self.max_velocity = params.get('max_velocity')
+        self.step_rotation = math.radians(params.get('step_rotation', 0))
+        self.initial_acceleration = params.get('initial_acceleration', 0)
+        self.acceleration = params.get('acceleration', 0)
+        self.image = params.get('shape')
+        # entities state
+        values = np.zeros((self.N_FIELDS, capacity)) if values is None else values
+        self.x, self.y, self.rotation, self.velocity = values
+        self.alive = np.zeros(capacity, dtype=np.bool_) if alive is None else alive
+        self.n_alive = 0
+        # free slots, lowest index on top (None when it must be rebuilt from the alive mask)
+        self._free = list(range(capacity - 1, -1, -1))  # type: Optional[List[int]]
+        # one entity object per slot, reused by every entity living in it
+        self.entities = [None if entity_class is None else entity_class.view(self, i)
+                         for i in range(capacity)]  # type: List[Optional[Entity]]
+
+    def __len__(self) -> int:
+        return self.n_alive
+
+    def __iter__(self) -> Iterator['Entity']:
+        for i in np.flatnonzero(self.alive):
+            yield self.entities[i]
+
+    def indices(self) -> np.ndarray:
+        """
+        Get the slots of the alive entities
+
+        :return: The slots' indices
+        """
+        return np.flatnonzero(self.alive)
+
+    def spawn(self, x: float, y: float, rotation: float = None, velocity: float = None) -> Optional['Entity']:
+        """
+        Add an entity in a free slot
+
+        :param x: The X coordinate
+        :param y: The Y coordinate
+        :param rotation: The initial rotation
+        :param velocity: The initial velocity
+        :return: The entity, None if the pool is full
+        """
+        free = self.free_slots()
+        if not free:
+            return None
+        i = free.pop()
+        self.x[i] = x
+        self.y[i] = y
+        self.rotation[i] = self.initial_rotation if rotation is None else rotation
+        self.velocity[i] = self.initial_velocity if velocity is None else velocity
+        self.alive[i] = True
+        self.n_alive += 1
+        return self.entities[i]
+
+    def spawn_many(self, x: np.ndarray, y: np.ndarray):
+        """
+        Add entities with the initial rotation and velocity in the lowest free slots of an empty pool
+
+        :param x: The X coordinates
+        :param y: The Y coordinates
+        """
+        n = len(x)
+        assert self.n_alive == 0 and n <= self.capacity
+        self.x[:n] = x
+        self.y[:n] = y
+        self.rotation[:n] = self.initial_rotation
+        self.velocity[:n] = self.initial_velocity
+        self.alive[:n] = True
+        self.n_alive = n
+        self._free = list(range(self.capacity - 1, n - 1, -1))
+
+    def spawn_batch(self, x: np.ndarray, y: np.ndarray, rotation: np.ndarray, velocity: np.ndarray) -> np.ndarray:
+        """
+        Add entities in free slots at once, as many as fit
+
+        :param x: The X coordinates
+        :param y: The Y coordinates
+        :param rotation: The initial rotations
+        :param velocity: The initial velocities
+        :return: The slots of the added entities, in the order of the given ones
+        """
+        free = self.free_slots()
+        n = min(len(x), len(free))
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        i = np.array(free[:-n - 1:-1])
+        del free[-n:]
+        self.x[i] = x[:n]
+        self.y[i] = y[:n]
+        self.rotation[i] = rotation[:n]
+        self.velocity[i] = velocity[:n]
+        self.alive[i] = True
+        self.n_alive += n
+        return i
+
+    def kill(self, indices: np.ndarray):
+        """
+        Remove the entities in the given slots
+
+        :param indices: The slots' indices (of alive entities)
+        """
+        free = self.free_slots()
+        self.alive[indices] = False
+        self.n_alive -= len(indices)
+        free.extend(indices.tolist())
+
+    def remove(self, entity: 'Entity'):
+        """
+        Remove an entity
+
+        :param entity: The entity
+        """
+        if self.alive[entity.index]:
+            self.kill(np.array([entity.index]))
+
+    def free_slots(self) -> List[int]:
+        """
+        Get the free-list, rebuilding it if the storage was written directly
+
+        :return: The free slots, lowest index last
+        """
+        if self._free is None:
+            self._free = np.flatnonzero(~self.alive)[::-1].tolist()
+        return self._free
+
+    def sync(self):
+        """
+        Catch up with a direct write of the storage (e.g. a restored snapshot): count the alive entities again and
+        rebuild the free-list on the next spawn or kill
+        """
+        self.n_alive = int(np.count_nonzero(self.alive))
+        self._free = None
+
+    def clear(self):
+        """
+        Remove all the entities
+        """
+        self.alive[:] = False
+        self.n_alive = 0
+        self._free = list(range(self.capacity - 1, -1, -1))
+
+
+def make_pools(specs: List[Tuple[str, int, type]],
+               config: 'EnvConfig' = None) -> Tuple[np.ndarray, np.ndarray, List[EntityPool]]:
+    """
+    Create entity pools sharing a single storage, so that the state of all their entities is copied at once
+
+    :param specs: The type, capacity and Entity subclass of each pool
+    :param config: The config giving the entity parameters, ENTITIES' if None
+    :return: The float fields' storage, shape (N_FIELDS, total capacity), the alive mask's storage and the pools
+    """
+    total = sum(capacity for _, capacity, _ in specs)
+    values = np.zeros((EntityPool.N_FIELDS, total))
+    alive = np.zeros(total, dtype=np.bool_)
+    pools = []
+    start = 0
+    for _type, capacity, entity_class in specs:
+        pools.append(EntityPool(_type, capacity, entity_class, values[:, start:start + capacity],
+                                alive[start:start + capacity], None if config is None else config.entity_params(_type)))
+        start += capacity
+    return values, alive, pools
+
 
 # -- Entities --
 
 
 class Entity:
+    __slots__ = ('pool', 'index')
+
     def __init__(self, x: float, y: float, _type: str, rotation: float = None, velocity: float = None):
         """
-        Create a generic entity
+        Create a generic entity, stored in a pool of its own
 
         :param x: The X coordinate
         :param y: The Y coordinate
@@ -21,26 +224,77 @@ class Entity:
         :param rotation: The initial rotation
         :param velocity: The initial velocity
         """
-        self.x = x
-        self.y = y
-        self._type = _type
-        self.radius = ENTITIES.get(_type).get('radius')
-        self.rotation = ENTITIES.get(_type).get('initial_rotation') if rotation is None else rotation
-        self.velocity = ENTITIES.get(_type).get('initial_velocity') if velocity is None else velocity
-        self.trans = rendering.Transform(translation=(x, y))
-        self.shape = self.build_shape()
+        pool = EntityPool(_type, 1)
+        self._bind(pool, 0)
+        pool.entities[0] = self
+        pool.spawn(x, y, rotation, velocity)
+
+    @classmethod
+    def view(cls, pool: EntityPool, index: int) -> 'Entity':
+        """
+        Create the entity living in a pool's slot
 
-    def build_shape(self) -> Geom:
+        :param pool: The pool
+        :param index: The slot's index
+        :return: The entity
         """
-        Build the entity's shape
+        entity = cls.__new__(cls)
+        entity._bind(pool, index)
+        return entity
 
-        :return: A Geom object for the renderer
+    def _bind(self, pool: EntityPool, index: int):
         """
-        img = rendering.Image(ENTITIES.get(self._type).get('shape'), self.radius, self.radius)
-        # workaround to get the image colors to render correctly (https://github.com/openai/gym/issues/1994)
-        img.set_color(1., 1., 1.)
-        img.add_attr(self.trans)
-        return img
+        Bind the entity to a pool's slot
+
+        :param pool: The pool
+        :param index: The slot's index
+        """
+        self.pool = pool
+        self.index = index
+
+    # -- State, stored in the pool --
+
+    @property
+    def _type(self) -> str:
+        return self.pool._type
+
+    @property
+    def radius(self) -> float:
+        return self.pool.radius
+
+    @property
+    def x(self) -> float:
+        return self.pool.x[self.index]
+
+    @x.setter
+    def x(self, value: float):
+        self.pool.x[self.index] = value
+
+    @property
+    def y(self) -> float:
+        return self.pool.y[self.index]
+
+    @y.setter
+    def y(self, value: float):
+        self.pool.y[self.index] = value
+
+    @property
+    def rotation(self) -> float:
+        return self.pool.rotation[self.index]
+
+    @rotation.setter
+    def rotation(self, value: float):
+        self.pool.rotation[self.index] = value
+
+    @property
+    def velocity(self) -> float:
+        return self.pool.velocity[self.index]
+
+    @velocity.setter
+    def velocity(self, value: float):
+        self.pool.velocity[self.index] = value
+
+    # -- Motion --
 
     def rotate(self, cw: bool = True):
         """
@@ -48,11 +302,12 @@ class Entity:
 
         :param cw: Rotate clockwise if True, else counterclockwise
         """
-        self.rotation += math.radians(ENTITIES.get(self._type).get('step_rotation')) * (1 if cw else -1)
-        self.trans.set_rotation(self.rotation)
+        self.rotation += self.pool.step_rotation * (1 if cw else -1)
 
 
 class Bullet(Entity):
+    __slots__ = ()
+
     def __init__(self, x: float, y: float, rotation: float = 0.0, velocity: float = 1.0):
         """
         Create a bullet
@@ -63,20 +318,34 @@ class Bullet(Entity):
         :param velocity: The initial velocity
         """
         super(Bullet, self).__init__(x, y, _type='bullet', rotation=rotation, velocity=velocity)
-        self.trans.set_rotation(self.rotation)
 
-    def advance(self):
+    def advance(self, dt: float = 1.):
         """
         Update the bullet's position.
 
         The motion is at constant velocity at a constant angle
+
+        :param dt: The tick's duration
+        """
+        self.x += math.cos(self.rotation) * self.velocity * dt
+        self.y += math.sin(self.rotation) * self.velocity * dt
+
+    @staticmethod
+    def advance_all(bullets: EntityPool, dt: float = 1.):
         """
-        self.x += math.cos(self.rotation) * self.velocity
-        self.y += math.sin(self.rotation) * self.velocity
-        self.trans.set_translation(self.x, self.y)
+        Update the positions of all the bullets in a pool, as `advance` does
+
+        :param bullets: The bullets' pool
+        :param dt: The tick's duration
+        """
+        i = bullets.indices()
+        bullets.x[i] += np.cos(bullets.rotation[i]) * (bullets.velocity[i] * dt)
+        bullets.y[i] += np.sin(bullets.rotation[i]) * (bullets.velocity[i] * dt)
 
 
 class Spaceship(Entity):
+    __slots__ = ('acceleration',)
+
     def __init__(self, x: float, y: float):
         """
         Create a spaceship
@@ -85,14 +354,19 @@ class Spaceship(Entity):
         :param y: The Y coordinate
         """
         super(Spaceship, self).__init__(x, y, _type='spaceship', rotation=0, velocity=0)
-        self.acceleration = ENTITIES.get(self._type).get('initial_acceleration')
+        self.acceleration = self.pool.initial_acceleration
 
-    def shoot(self) -> Bullet:
+    def shoot(self, bullets: EntityPool = None) -> Optional[Bullet]:
         """
         Generate bullet with same rotation as spaceship and with double the spaceship's velocity if it's moving, else 1.
 
+        :param bullets: The pool to add the bullet to, if any
+        :return: The bullet, None if the pool is full
         """
-        return Bullet(self.x, self.y, self.rotation, (self.velocity * 2) if (self.velocity * 2) > 0.0 else 1)
+        velocity = (self.velocity * 2) if (self.velocity * 2) > 0.0 else 1
+        if bullets is None:
+            return Bullet(self.x, self.y, self.rotation, velocity)
+        return bullets.spawn(self.x, self.y, self.rotation, velocity)
 
     def change_acceleration(self, inc: float = True):
         """
@@ -100,24 +374,46 @@ class Spaceship(Entity):
 
         :param inc: Increment or Decrement the acceleration
         """
-        self.acceleration += ENTITIES.get(self._type).get('acceleration') * (1 if inc else -1)
+        self.acceleration += self.pool.acceleration * (1 if inc else -1)
 
-    def advance(self):
+    def advance(self, dt: float = 1.):
         """
         Update the spaceship position.
 
-        The motion is resets the acceleration at each step, simulating a motion in outer space.
+        The motion is resets the acceleration at each step, simulating a motion in outer space. The velocity is
+        bounded by the maximum velocity both ways, so that no motion outruns the swept collisions' grids.
+
+        :param dt: The tick's duration (the acceleration is an impulse, applied once whatever the duration)
         """
         self.velocity += self.acceleration
         self.acceleration = 0
-        if self.velocity >= ENTITIES.get(self._type).get('max_velocity'):
-            self.velocity = ENTITIES.get(self._type).get('max_velocity')
-        self.x += math.cos(self.rotation) * self.velocity
-        self.y += math.sin(self.rotation) * self.velocity
-        self.trans.set_translation(self.x, self.y)
+        if self.velocity >= self.pool.max_velocity:
+            self.velocity = self.pool.max_velocity
+        elif self.velocity <= -self.pool.max_velocity:
+            self.velocity = -self.pool.max_velocity
+        self.x += math.cos(self.rotation) * self.velocity * dt
+        self.y += math.sin(self.rotation) * self.velocity * dt
+
+    @staticmethod
+    def advance_all(spaceships: EntityPool, accelerations: np.ndarray, dt: float = 1.):
+        """
+        Update the positions of all the spaceships in a pool, as `advance` does
+
+        :param spaceships: The spaceships' pool
+        :param accelerations: The accelerations of all the pool's slots, reset to 0
+        :param dt: The tick's duration
+        """
+        i = spaceships.indices()
+        velocity = np.clip(spaceships.velocity[i] + accelerations[i], -spaceships.max_velocity, spaceships.max_velocity)
+        accelerations[:] = 0
+        spaceships.velocity[i] = velocity
+        spaceships.x[i] += np.cos(spaceships.rotation[i]) * (velocity * dt)
+        spaceships.y[i] += np.sin(spaceships.rotation[i]) * (velocity * dt)
 
 
 class Crystal(Entity):
+    __slots__ = ()
+
     def __init__(self, x: float, y: float):
         """
         Create a crystal
@@ -129,6 +425,8 @@ class Crystal(Entity):
 
 
 class Enemy(Entity):
+    __slots__ = ()
+
     def __init__(self, x: float, y: float):
         """
         Create an enemy
@@ -138,7 +436,7 @@ class Enemy(Entity):
         """
         super(Enemy, self).__init__(x, y, _type='enemy', rotation=0, velocity=0)
 
-    def advance(self, target_x: float = 0.0, target_y: float = 0.0):
+    def advance(self, target_x: float = 0.0, target_y: float = 0.0, dt: float = 1.):
         """
         Update the enemy position.
 
@@ -146,22 +444,168 @@ class Enemy(Entity):
 
         :param target_x: The target point's X
         :param target_y: The target point's Y
+        :param dt: The tick's duration
         """
         # update velocity
-        self.velocity += ENTITIES.get(self._type).get('step_velocity')
-        if self.velocity >= ENTITIES.get(self._type).get('max_velocity'):
-            self.velocity = ENTITIES.get(self._type).get('max_velocity')
+        self.velocity += self.pool.step_velocity * dt
+        if self.velocity >= self.pool.max_velocity:
+            self.velocity = self.pool.max_velocity
         # update rotation towards target
         self.rotation = math.atan2(target_y - self.y, target_x - self.x)
         # update position
-        self.x += math.cos(self.rotation) * self.velocity
-        self.y += math.sin(self.rotation) * self.velocity
-        self.trans.set_translation(self.x, self.y)
-        self.trans.set_rotation(self.rotation)
+        self.x += math.cos(self.rotation) * self.velocity * dt
+        self.y += math.sin(self.rotation) * self.velocity * dt
+
+    @staticmethod
+    def advance_all(enemies: EntityPool, target_x: float = 0.0, target_y: float = 0.0, dt: float = 1.):
+        """
+        Update the positions of all the enemies in a pool, as `advance` does
+
+        :param enemies: The enemies' pool
+        :param target_x: The target point's X, or one per alive enemy (e.g. its nearest spaceship's, see `nearest`)
+        :param target_y: The target point's Y, or one per alive enemy
+        :param dt: The tick's duration
+        """
+        i = enemies.indices()
+        velocity = np.minimum(enemies.velocity[i] + enemies.step_velocity * dt, enemies.max_velocity)
+        rotation = np.arctan2(target_y - enemies.y[i], target_x - enemies.x[i])
+        enemies.velocity[i] = velocity
+        enemies.rotation[i] = rotation
+        enemies.x[i] += np.cos(rotation) * (velocity * dt)
+        enemies.y[i] += np.sin(rotation) * (velocity * dt)
 
 
 # -- Functions --
 
+def box_intersection(x1: np.ndarray, y1: np.ndarray, r1: float,
+                     x2: np.ndarray, y2: np.ndarray, r2: float) -> np.ndarray:
+    """
+    Batched version of `entity_intersection`: check which pairs of entities are intersecting.
+
+    :param x1: The X coordinates of the first entities
+    :param y1: The Y coordinates of the first entities
+    :param r1: The radius of the first entities
+    :param x2: The X coordinates of the second entities, broadcastable against x1
+    :param y2: The Y coordinates of the second entities, broadcastable against y1
+    :param r2: The radius of the second entities
+    :return: The intersection mask
+    """
+    r = max(r1, r2)
+    return (np.abs(x1 - x2) < r) & (np.abs(y1 - y2) < r)
+
+
+def swept_box_intersection(x1: np.ndarray, y1: np.ndarray, start_x1: np.ndarray, start_y1: np.ndarray, r1: float,
+                           x2: np.ndarray, y2: np.ndarray, start_x2: np.ndarray, start_y2: np.ndarray,
+                           r2: float) -> np.ndarray:
+    """
+    Continuous version of `box_intersection`: check which pairs of entities intersect at any time of a tick, each
+    entity moving in a straight line from its start to its end position.
+
+    The relative motion of a pair is swept against the hitbox: along each axis, the pair overlaps during an interval of
+    the tick, and the pair intersects if the intervals of both axes overlap within the tick. Fast entities can't pass
+    through each other between two ticks, and without motion this is `box_intersection`.
+
+    :param x1: The X coordinates of the first entities, at the end of the tick
+    :param y1: The Y coordinates of the first entities, at the end of the tick
+    :param start_x1: The X coordinates of the first entities, at the start of the tick
+    :param start_y1: The Y coordinates of the first entities, at the start of the tick
+    :param r1: The radius of the first entities
+    :param x2: The X coordinates of the second entities at the end of the tick, broadcastable against x1
+    :param y2: The Y coordinates of the second entities at the end of the tick, broadcastable against y1
+    :param start_x2: The X coordinates of the second entities at the start of the tick, broadcastable against x1
+    :param start_y2: The Y coordinates of the second entities at the start of the tick, broadcastable against y1
+    :param r2: The radius of the second entities
+    :return: The intersection mask
+    """
+    r = max(r1, r2)
+    # relative position at the end of the tick, and relative motion over the tick: going back by a fraction s of the
+    # tick, the relative position is end - s * motion
+    end_x, end_y = x1 - x2, y1 - y2
+    motion_x, motion_y = end_x - (start_x1 - start_x2), end_y - (start_y1 - start_y2)
+    first, last = overlap_interval(end_x, motion_x, r)
+    first_y, last_y = overlap_interval(end_y, motion_y, r)
+    np.maximum(first, first_y, out=first)
+    np.minimum(last, last_y, out=last)
+    return np.maximum(first, 0.) < np.minimum(last, 1.)
+
+
+def overlap_interval(end: np.ndarray, motion: np.ndarray, r: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find when a relative coordinate, going back from `end` by `motion` per unit of time, lies strictly within (-r, r)
+
+    :param end: The relative coordinates at time 0
+    :param motion: The relative motions, same shape as `end`
+    :param r: The half-width of the hitbox
+    :return: The open intervals' bounds (-inf, inf for always, inf, -inf for never)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = (end - r) / motion
+        b = (end + r) / motion
+    first = np.minimum(a, b)
+    last = np.maximum(a, b)
+    # without motion, the coordinate is within the hitbox for the whole tick or never
+    still = motion == 0
+    if np.any(still):
+        inside = np.abs(end[still]) < r
+        first[still] = np.where(inside, -np.inf, np.inf)
+        last[still] = np.where(inside, np.inf, -np.inf)
+    return first, last
+
+
+def in_bounds(x: np.ndarray, y: np.ndarray, width: float = SCREEN_WIDTH, height: float = SCREEN_HEIGHT) -> np.ndarray:
+    """
+    Check which points lie strictly within the world bounds
+
+    :param x: The X coordinates
+    :param y: The Y coordinates
+    :param width: The world's width, the window's one by default
+    :param height: The world's height, the window's one by default
+    :return: The inclusion mask
+    """
+    return (x > 0.0) & (x < width) & (y > 0.0) & (y < height)
+
+
+def diagonal(width: float, height: float) -> float:
+    """
+    Get the length of a world's diagonal, computed as DIAG is
+
+    :param width: The world's width
+    :param height: The world's height
+    :return: The diagonal's length
+    """
+    return math.sqrt(math.pow(width, 2) + math.pow(height, 2))
+
+
+def bullets_capacity(width: float, height: float, dt: float = 1.) -> int:
+    """
+    Get the bullets' capacity of a scene, as BULLETS_CAPACITY for a world of the given size and ticks of the given
+    duration: a bullet leaves the world within its diagonal over `dt` ticks
+
+    :param width: The world's width
+    :param height: The world's height
+    :param dt: The ticks' duration
+    :return: The capacity
+    """
+    return math.ceil(diagonal(width, height) / dt) + 1
+
+
+def nearest(x: np.ndarray, y: np.ndarray, targets_x: np.ndarray, targets_y: np.ndarray) -> np.ndarray:
+    """
+    Find the nearest target of each point
+
+    :param x: The points' X coordinates
+    :param y: The points' Y coordinates
+    :param targets_x: The targets' X coordinates, at least one
+    :param targets_y: The targets' Y coordinates
+    :return: The index of each point's nearest target
+    """
+    if len(targets_x) == 1:
+        return np.zeros(len(x), dtype=np.int64)
+    dx = x[:, None] - targets_x
+    dy = y[:, None] - targets_y
+    return (dx * dx + dy * dy).argmin(axis=1)
+
+
 def entity_intersection(e1: Entity, e2: Entity) -> bool:
     """
     Check if two entities are intersecting.
@@ -201,32 +645,24 @@ def line_entity_intersection(p1: Tuple[float, float], p2: Tuple[float, float], e
     return 0.0, 0.0
 
 
-def border_distance(x: float, y: float, theta: float) -> float:
+def border_distance(x: float, y: float, theta: float, width: float = SCREEN_WIDTH,
+                    height: float = SCREEN_HEIGHT) -> float:
     """
-    Computes the closest distance from a point (x,y) to the window borders given the angle theta (in radians)
+    Computes the closest distance from a point (x,y) to the world borders given the angle theta (in radians)
 
     :param x: The X point coordinate
     :param y:  The Y point coordinate
     :param theta: The angle (in radians)
-    :return: The closest distance to the window borders
+    :param width: The world's width, the window's one by default
+    :param height: The world's height, the window's one by default
+    :return: The closest distance to the world borders
     """
-    x1 = x + max(SCREEN_HEIGHT, SCREEN_WIDTH) * math.cos(theta)
-    y1 = y + max(SCREEN_HEIGHT, SCREEN_WIDTH) * math.sin(theta)
-    # intersection with borders
-    left_x, left_y = line_line_intersection(x, y, x1, y1, 0, 0, 0, SCREEN_HEIGHT)
-    if included(x, x1, left_x) and included(y, y1, left_y):
-        return math.sqrt(math.pow(x - left_x, 2) + math.pow(y - left_y, 2))
-    right_x, right_y = line_line_intersection(x, y, x1, y1, SCREEN_WIDTH, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
-    if included(x, x1, right_x) and included(y, y1, right_y):
-        return math.sqrt(math.pow(x - right_x, 2) + math.pow(y - right_y, 2))
-    down_x, down_y = line_line_intersection(x, y, x1, y1, 0, 0, SCREEN_WIDTH, 0)
-    if included(x, x1, down_x) and included(y, y1, down_y):
-        return math.sqrt(math.pow(x - down_x, 2) + math.pow(y - down_y, 2))
-    up_x, up_y = line_line_intersection(x, y, x1, y1, 0, SCREEN_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT)
-    if included(x, x1, up_x) and included(y, y1, up_y):
-        return math.sqrt(math.pow(x - up_x, 2) + math.pow(y - up_y, 2))
-    # this should never happen
-    return math.nan
+    cos = math.cos(theta)
+    sin = math.sin(theta)
+    # distance to the vertical and to the horizontal border the ray is pointing at
+    dx = math.inf if cos == 0 else ((width - x) if cos > 0 else -x) / cos
+    dy = math.inf if sin == 0 else ((height - y) if sin > 0 else -y) / sin
+    return max(min(dx, dy), 0.)
 
 
 def line_line_intersection(x1: float, y1: float, x2: float, y2: float, x3: float, y3: float, x4: float, y4: float) -> \
@@ -0,0 +1,213 @@
+import math
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs._raster import Layer
+
+# observation modes: the sensor rays' vector, or the occupancy grid
+OBSERVATION_MODES = ['rays', 'grid']
+# default (width, height) of the grids, in cells: square cells of 6.25 window units
+GRID_SIZE = (96, 64)
+# channels of the grids, one per entity type: the spaceship's channel holds its disc and its heading, a segment from
+# its center as long as its diameter
+CHANNELS = ['crystal', 'enemy', 'bullet', 'spaceship']
+# extra channel of the ego-centred grids: the cells out of the world
+OUTSIDE_CHANNEL = 'outside'
+# subcell positions per axis of the precomputed discs
+SUBCELLS = 4
+
+
+class OccupancyGrid:
+    def __init__(self, width: int = GRID_SIZE[0], height: int = GRID_SIZE[1], n_scenes: int = 1, ego: bool = False,
+                 dtype: np.dtype = np.float64, occupied: float = 1.,
+                 world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT)):
+        """
+        Create a top-down occupancy grid builder, splatting batches of scenes into preallocated multi-channel grids.
+
+        Each entity is splatted as the cells whose center is within its radius (at least the cell holding its center),
+        from its type's disc precomputed at SUBCELLS x SUBCELLS positions in a cell: all the entities are written with
+        a single fancy assignment, without drawing the sprites. The grids have a margin as large as the largest disc
+        (or heading), so that the entities across the grids' borders are clipped for free. The grids cover the world,
+        or with `ego` a window-sized view centred on each scene's spaceship, with an extra channel marking the cells
+        out of the world.
+
+        :param width: The grids' width, in cells
+        :param height: The grids' height, in cells
+        :param n_scenes: The maximum number of scenes built at once
+        :param ego: Centre the grids on the spaceships
+        :param dtype: The grids' dtype
+        :param occupied: The value of the occupied cells (the empty ones are 0)
+        :param world_size: The world's (width, height), the window's by default
+        """
+        self.width = width
+        self.height = height
+        self.n_scenes = n_scenes
+        self.ego = ego
+        self.occupied = occupied
+        self.world_width, self.world_height = world_size
+        self.channels = CHANNELS + [OUTSIDE_CHANNEL] if ego else list(CHANNELS)
+        # world units per cell
+        self.cell_x = (SCREEN_WIDTH if ego else self.world_width) / width
+        self.cell_y = (SCREEN_HEIGHT if ego else self.world_height) / height
+        # discs of the entity types (by channel), on a common stencil
+        radii = [ENTITIES.get(_type).get('radius') for _type in CHANNELS]
+        self.reach = int(math.ceil(max(radii) / min(self.cell_x, self.cell_y)))
+        self.discs = np.stack([disc_table(radius, self.cell_x, self.cell_y, self.reach) for radius in radii])
+        # distances along the headings, in cells along X and Y: at least one sample per cell crossed
+        length = 2 * ENTITIES.get('spaceship').get('radius')
+        self.heading_reach = int(math.ceil(length / min(self.cell_x, self.cell_y)))
+        t = np.linspace(0., length, self.heading_reach * 2 + 1)
+        self._heading_samples = t / self.cell_x, t / self.cell_y
+        self.margin = max(self.reach, self.heading_reach) + 1
+        self.buffer = np.zeros((n_scenes, len(self.channels), height + 2 * self.margin, width + 2 * self.margin),
+                               dtype=dtype)
+        self.grids = self.buffer[:, :, self.margin:self.margin + height, self.margin:self.margin + width]
+        # offsets of the stencil's cells in the flattened buffer
+        offset_row, offset_col = np.mgrid[-self.reach:self.reach + 1, -self.reach:self.reach + 1]
+        self._offsets = (offset_row * self.buffer.shape[3] + offset_col).ravel()
+
+    def render(self, layers: List[Layer], n_scenes: int = None,
+               centers: Tuple[np.ndarray, np.ndarray] = None) -> np.ndarray:
+        """
+        Build the grids of the scenes
+
+        :param layers: The entities, one layer per type as for the rasterizer
+        :param n_scenes: The number of scenes, all of them if None
+        :param centers: With `ego`, the (X, Y) coordinates of the spaceships the grids are centred on, one per scene
+        (e.g. a dead spaceship's last position); if None, the spaceship layer must hold the spaceship of every scene,
+        in order
+        :return: The grids, shape (n_scenes, channels, height, width), overwritten at every call
+        """
+        n_scenes = self.n_scenes if n_scenes is None else n_scenes
+        self.buffer[:n_scenes].fill(0)
+        grids = self.grids[:n_scenes]
+        # world coordinates of the grids' top-left corners
+        left, top = np.zeros(n_scenes), np.full(n_scenes, float(self.world_height))
+        if self.ego:
+            if centers is None:
+                _, _, x, y, _ = next(layer for layer in layers if layer[0] == 'spaceship')
+            else:
+                x, y = centers
+            left, top = x - SCREEN_WIDTH / 2, y + SCREEN_HEIGHT / 2
+            self.mark_outside(grids, left, top)
+        layers = [layer for layer in layers if layer[0] in CHANNELS]
+        # all the types at once
+        sizes = [layer[1].size for layer in layers]
+        if sum(sizes) > 0:
+            channels = np.repeat([self.channels.index(layer[0]) for layer in layers], sizes)
+            self.splat(channels, *(np.concatenate([layer[i] for layer in layers]) for i in range(1, 4)), left, top)
+        for _type, scenes, x, y, rotation in layers:
+            if _type == 'spaceship' and scenes.size > 0:
+                self.splat_heading(self.channels.index(_type), scenes, x, y, rotation, left, top)
+        return grids
+
+    def splat(self, channels: np.ndarray, scenes: np.ndarray, x: np.ndarray, y: np.ndarray, left: np.ndarray,
+              top: np.ndarray):
+        """
+        Mark the cells covered by the discs of entities
+
+        :param channels: The entities' channels, giving their types
+        :param scenes: The entities' scenes
+        :param x: The entities' X coordinates
+        :param y: The entities' Y coordinates
+        :param left: The X coordinate of the grids' left side, per scene
+        :param top: The Y coordinate of the grids' top side, per scene
+        """
+        # entities' centers, in cells (the window's Y axis points up, the grids' one down)
+        col = (x - left[scenes]) / self.cell_x
+        row = (top[scenes] - y) / self.cell_y
+        base_col, base_row = np.floor(col), np.floor(row)
+        # the discs of the entities far out of the grids miss them
+        near = (base_col >= -self.reach) & (base_col < self.width + self.reach)
+        near &= (base_row >= -self.reach) & (base_row < self.height + self.reach)
+        if not np.all(near):
+            channels, scenes, col, row, base_col, base_row = (channels[near], scenes[near], col[near], row[near],
+                                                              base_col[near], base_row[near])
+        # (the fractional parts round to 1 just below an integer)
+        sub_col = np.minimum((col - base_col) * SUBCELLS, SUBCELLS - 1).astype(np.int64)
+        sub_row = np.minimum((row - base_row) * SUBCELLS, SUBCELLS - 1).astype(np.int64)
+        covered = self.discs[channels, sub_row, sub_col]
+        base = self._flat_index(scenes, channels, base_row.astype(np.int64), base_col.astype(np.int64))
+        self.buffer.reshape(-1)[(base[:, None] + self._offsets)[covered]] = self.occupied
+
+    def splat_heading(self, channel: int, scenes: np.ndarray, x: np.ndarray, y: np.ndarray, rotation: np.ndarray,
+                      left: np.ndarray, top: np.ndarray):
+        """
+        Mark the cells along the spaceships' headings, from their centers to a diameter away
+
+        :param channel: The spaceships' channel
+        :param scenes: The spaceships' scenes
+        :param x: The spaceships' X coordinates
+        :param y: The spaceships' Y coordinates
+        :param rotation: The spaceships' rotations
+        :param left: The X coordinate of the grids' left side, per scene
+        :param top: The Y coordinate of the grids' top side, per scene
+        """
+        col = (x - left[scenes]) / self.cell_x
+        row = (top[scenes] - y) / self.cell_y
+        near = (col >= -self.heading_reach) & (col < self.width + self.heading_reach)
+        near &= (row >= -self.heading_reach) & (row < self.height + self.heading_reach)
+        if not np.all(near):
+            scenes, col, row, rotation = scenes[near], col[near], row[near], rotation[near]
+        cols = np.floor(col[:, None] + np.cos(rotation)[:, None] * self._heading_samples[0]).astype(np.int64)
+        rows = np.floor(row[:, None] - np.sin(rotation)[:, None] * self._heading_samples[1]).astype(np.int64)
+        self.buffer.reshape(-1)[self._flat_index(scenes[:, None], channel, rows, cols)] = self.occupied
+
+    def mark_outside(self, grids: np.ndarray, left: np.ndarray, top: np.ndarray):
+        """
+        Mark the cells whose center is out of the world
+
+        :param grids: The grids
+        :param left: The X coordinate of the grids' left side, per scene
+        :param top: The Y coordinate of the grids' top side, per scene
+        """
+        center_x = left[:, None] + (np.arange(self.width) + 0.5) * self.cell_x
+        center_y = top[:, None] - (np.arange(self.height) + 0.5) * self.cell_y
+        outside_col = (center_x < 0) | (center_x > self.world_width)
+        outside_row = (center_y < 0) | (center_y > self.world_height)
+        outside = outside_row[:, :, None] | outside_col[:, None, :]
+        grids[:, self.channels.index(OUTSIDE_CHANNEL)] = outside * self.occupied
+
+    def _flat_index(self, scenes: np.ndarray, channels, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Get the indices of grids' cells in the flattened buffer
+
+        :param scenes: The cells' scenes
+        :param channels: The cells' channels
+        :param rows: The cells' rows, in the grids (the margin's ones are negative or beyond the height)
+        :param cols: The cells' columns, in the grids (the margin's ones are negative or beyond the width)
+        :return: The indices
+        """
+        _, n_channels, padded_height, padded_width = self.buffer.shape
+        return ((scenes * n_channels + channels) * padded_height + rows + self.margin) * padded_width + cols + \
+            self.margin
+
+
+# -- Functions --
+
+@lru_cache(maxsize=None)
+def disc_table(radius: float, cell_x: float, cell_y: float, reach: int) -> np.ndarray:
+    """
+    Precompute the cells covered by a disc, from the cell holding its center, for SUBCELLS x SUBCELLS positions of
+    its center in that cell
+
+    :param radius: The disc's radius, in window units
+    :param cell_x: The cells' width, in window units
+    :param cell_y: The cells' height, in window units
+    :param reach: The stencil's reach, in cells around the center's cell (covering the disc)
+    :return: Whether each cell of the stencil is covered, shape (SUBCELLS, SUBCELLS, (2 * reach + 1) ** 2), indexed by
+    the center's subcell row and column
+    """
+    # centers of the subcells, and offsets of the stencil's cells' centers, in cells
+    subcells = (np.arange(SUBCELLS) + 0.5) / SUBCELLS
+    offsets = np.arange(-reach, reach + 1) + 0.5
+    dy = (offsets[None, :] - subcells[:, None]) * cell_y
+    dx = (offsets[None, :] - subcells[:, None]) * cell_x
+    # (subcell row, subcell column, stencil row, stencil column)
+    covered = dy[:, None, :, None] ** 2 + dx[None, :, None, :] ** 2 <= radius * radius
+    # the cell holding the center
+    covered[:, :, reach, reach] = True
+    return covered.reshape(SUBCELLS, SUBCELLS, -1)
@@ -0,0 +1,178 @@
+import multiprocessing as mp
+import os
+from functools import partial
+from typing import Callable, Sequence, Tuple, Union
+
+import numpy as np
+from gym.vector.utils import CloudpickleWrapper
+
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+
+# default maximum number of steps of an evaluation episode
+MAX_EPISODE_STEPS = 1000
+# environment and policy factory of the current worker process, set by `_init_worker`
+_WORKER = {}
+
+
+class PopulationEvaluator:
+    def __init__(self, n_workers: int = None, env_fn: Callable = None, policy_fn: Callable = None,
+                 context: str = None):
+        """
+        Create an evaluator of populations of policies, running their episodes in a pool of worker processes.
+
+        Each worker creates its environment once. The policies are queued as tasks (all the episodes of a policy),
+        taken one at a time by the idle workers, so that the slow policies don't hold the others back. The episodes
+        run without rendering nor the per-step checks of `step`: the policy's action is applied tick by tick, and the
+        observations are computed once per step for the policy's next action (not at each tick, nor after the last
+        step). Each episode is seeded on its own, so the results only depend on the seeds (and on the policies being
+        deterministic), not on the scheduling.
+
+        :param n_workers: The number of worker processes, one per CPU if None, 0 to evaluate in this process
+        :param env_fn: The function creating a worker's environment, a SpaceCrystalsEnv if None
+        :param policy_fn: The function creating a policy (a callable from an observation to an action) from its
+        parameters, `linear_policy` if None; unused for populations of callables
+        :param context: The multiprocessing context (start method), the default one if None
+        """
+        self.env_fn = env_fn or partial(SpaceCrystalsEnv, reset_pool_size=1)
+        self.policy_fn = policy_fn or linear_policy
+        self.n_workers = (os.cpu_count() or 1) if n_workers is None else n_workers
+        self.pool = None
+        if self.n_workers > 0:
+            self.pool = mp.get_context(context).Pool(self.n_workers, initializer=_init_worker,
+                                                     initargs=(CloudpickleWrapper(self.env_fn),
+                                                               CloudpickleWrapper(self.policy_fn)))
+        else:
+            _init_worker(CloudpickleWrapper(self.env_fn), CloudpickleWrapper(self.policy_fn))
+
+    def evaluate(self, policies: Union[Sequence, np.ndarray], seeds: Union[Sequence[int], np.ndarray],
+                 max_steps: int = MAX_EPISODE_STEPS) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate a population of policies
+
+        :param policies: The policies: callables from an observation to an action (picklable by cloudpickle), or
+        parameter arrays given to the policy factory, e.g. an array of shape (n_policies, n_parameters)
+        :param seeds: The seeds of the episodes: shape (n_episodes,) for the same episodes for all the policies, or
+        (n_policies, n_episodes)
+        :param max_steps: The maximum number of steps of an episode
+        :return: The return and the length of each episode, shape (n_policies, n_episodes)
+        """
+        n_policies = len(policies)
+        seeds = np.asarray(seeds, dtype=np.int64)
+        if seeds.ndim == 1:
+            seeds = np.broadcast_to(seeds, (n_policies, seeds.size))
+        if seeds.shape[0] != n_policies:
+            raise ValueError('seeds must have shape (n_episodes,) or (%d, n_episodes), got %s' % (n_policies,
+                                                                                                   seeds.shape))
+        returns = np.zeros(seeds.shape)
+        lengths = np.zeros(seeds.shape, dtype=np.int64)
+        tasks = ((i, CloudpickleWrapper(policy) if callable(policy) else policy, seeds[i].tolist(), max_steps)
+                 for i, policy in enumerate(policies))
+        results = map(_evaluate, tasks) if self.pool is None else self.pool.imap_unordered(_evaluate, tasks)
+        for i, policy_returns, policy_lengths in results:
+            returns[i] = policy_returns
+            lengths[i] = policy_lengths
+        return returns, lengths
+
+    def close(self):
+        """
+        Stop the worker processes
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# -- Functions --
+
+def evaluate_population(policies: Union[Sequence, np.ndarray], seeds: Union[Sequence[int], np.ndarray],
+                        max_steps: int = MAX_EPISODE_STEPS, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate a population of policies with a new `PopulationEvaluator` (keep one across generations to reuse its
+    worker processes)
+
+    :param policies: The policies, as for `PopulationEvaluator.evaluate`
+    :param seeds: The seeds of the episodes, as for `PopulationEvaluator.evaluate`
+    :param max_steps: The maximum number of steps of an episode
+    :param kwargs: The evaluator's arguments
+    :return: The return and the length of each episode, shape (n_policies, n_episodes)
+    """
+    with PopulationEvaluator(**kwargs) as evaluator:
+        return evaluator.evaluate(policies, seeds, max_steps)
+
+
+def linear_policy(parameters: np.ndarray) -> Callable[[np.ndarray], int]:
+    """
+    Create a linear policy, taking the action of highest score
+
+    :param parameters: The weights and biases of the actions' scores, shape (n_actions, observation size + 1) or
+    flattened (with 5 actions)
+    :return: The policy
+    """
+    parameters = np.asarray(parameters, dtype=np.float64).reshape(5, -1)
+    weights, biases = parameters[:, :-1], parameters[:, -1]
+
+    def policy(observation: np.ndarray) -> int:
+        return int(np.argmax(weights @ observation + biases))
+
+    return policy
+
+
+def run_episode(env: SpaceCrystalsEnv, policy: Callable[[np.ndarray], int], seed: int,
+                max_steps: int = MAX_EPISODE_STEPS) -> Tuple[float, int]:
+    """
+    Run an episode, from the first initial scene of a seed, without rendering nor the checks of `step`
+
+    :param env: The environment
+    :param policy: The policy
+    :param seed: The seed
+    :param max_steps: The maximum number of steps
+    :return: The return and the number of steps of the episode
+    """
+    env.seed(seed)
+    observation = env.reset()
+    tick, frame_skip = env.tick, env.frame_skip
+    total = 0.
+    for step in range(1, max_steps + 1):
+        action = policy(observation)
+        # summed per step as by `step`
+        reward = 0.
+        for _ in range(frame_skip):
+            tick(action)
+            reward += env.reward
+            if env.done:
+                return total + reward, step
+        total += reward
+        env.make_observations()
+    return total, max_steps
+
+
+def _init_worker(env_fn: CloudpickleWrapper, policy_fn: CloudpickleWrapper):
+    """
+    Create the environment of a worker process
+
+    :param env_fn: The function creating the environment
+    :param policy_fn: The function creating a policy from its parameters
+    """
+    _WORKER['env'] = env_fn.fn()
+    _WORKER['policy_fn'] = policy_fn.fn
+
+
+def _evaluate(task: tuple) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Run the episodes of a policy in the worker's environment
+
+    :param task: The policy's index, the policy (a callable, wrapped, or its parameters), its episodes' seeds and the
+    maximum number of steps of an episode
+    :return: The policy's index, and its episodes' returns and lengths
+    """
+    i, policy, seeds, max_steps = task
+    policy = policy.fn if isinstance(policy, CloudpickleWrapper) else _WORKER['policy_fn'](policy)
+    results = np.array([run_episode(_WORKER['env'], policy, seed, max_steps) for seed in seeds]).reshape(-1, 2)
+    return i, results[:, 0], results[:, 1].astype(np.int64)
@@ -0,0 +1,96 @@
+from time import perf_counter
+from typing import Dict, Optional
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Create a profiler timing the phases of the environment's calls (e.g. step, reset).
+
+        A call is split in consecutive phases: entering a phase closes the running one, so that timing a phase costs a
+        single clock read. Entities counts are recorded along. Each call gives a record (time per phase and counts),
+        and the records are aggregated per kind of call.
+        """
+        self.totals = {}  # type: Dict[str, dict]
+        self.phases = {}  # type: Dict[str, float]
+        self.counts = {}  # type: Dict[str, int]
+        self._kind = None  # type: Optional[str]
+        self._phase = None  # type: Optional[str]
+        self._last = 0.
+
+    def start(self, kind: str, phase: str):
+        """
+        Start profiling a call
+
+        :param kind: The kind of call
+        :param phase: The first phase
+        """
+        self._kind = kind
+        self.phases = {}
+        self.counts = {}
+        self._phase = phase
+        self._last = perf_counter()
+
+    def enter(self, phase: Optional[str]) -> Optional[str]:
+        """
+        Close the running phase and start another one
+
+        :param phase: The new phase, None to close the running phase only
+        :return: The closed phase, to enter it again after a nested phase
+        """
+        now = perf_counter()
+        closed = self._phase
+        if closed is not None:
+            self.phases[closed] = self.phases.get(closed, 0.) + now - self._last
+        self._phase = phase
+        self._last = now
+        return closed
+
+    def count(self, name: str, n: int):
+        """
+        Record a count during the call
+
+        :param name: The count's name
+        :param n: The count
+        """
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def stop(self) -> dict:
+        """
+        Stop profiling the call, and aggregate it
+
+        :return: The call's record: the time of each phase (in seconds) and the counts
+        """
+        self.enter(None)
+        totals = self.totals.setdefault(self._kind, {'calls': 0, 'phases': {}, 'counts': {}})
+        totals['calls'] += 1
+        for phase, elapsed in self.phases.items():
+            totals['phases'][phase] = totals['phases'].get(phase, 0.) + elapsed
+        for name, n in self.counts.items():
+            totals['counts'][name] = totals['counts'].get(name, 0) + n
+        return {'phases': self.phases, 'counts': self.counts}
+
+    def stats(self) -> dict:
+        """
+        Get the aggregated statistics of the profiled calls
+
+        :return: For each kind of call: the number of calls, the total and mean time of each phase (in seconds) with
+        its share of the call's time, and the total and mean counts
+        """
+        stats = {}
+        for kind, totals in self.totals.items():
+            calls = totals['calls']
+            total = sum(totals['phases'].values()) or 1.
+            stats[kind] = {
+                'calls': calls,
+                'phases': {phase: {'total': elapsed, 'mean': elapsed / calls, 'share': elapsed / total}
+                           for phase, elapsed in totals['phases'].items()},
+                'counts': {name: {'total': n, 'mean': n / calls} for name, n in totals['counts'].items()},
+            }
+        return stats
+
+    def clear(self):
+        """
+        Forget the aggregated statistics
+        """
+        self.totals = {}
@@ -0,0 +1,120 @@
+import json
+import struct
+from typing import List, Tuple, Union
+
+import numpy as np
+
+# header of the requests: payload's length and command
+REQUEST_HEADER = struct.Struct('<IB')
+# header of the replies: payload's length and status
+REPLY_HEADER = struct.Struct('<IB')
+# commands
+MAKE = 1  # payload: JSON {num_envs, kwargs}; reply: JSON description of the environments
+SEED = 2  # payload: int64 seed, -1 for None; reply: empty
+RESET = 3  # payload: empty; reply: observations
+STEP = 4  # payload: int64 actions; reply: observations, float64 rewards, bool dones, terminal observations
+CLOSE = 5  # payload: empty; reply: empty, then the connection is closed
+COMMANDS = {MAKE: 'make', SEED: 'seed', RESET: 'reset', STEP: 'step', CLOSE: 'close'}
+# statuses
+OK = 0
+ERROR = 1  # payload: UTF-8 error message
+# number of ended environments in a step's reply, followed by their indices and terminal observations
+TERMINAL_HEADER = struct.Struct('<I')
+# address of a server: (host, port) for TCP, or the path of a Unix socket
+Address = Union[Tuple[str, int], str]
+
+
+# -- Functions --
+
+def encode_request(command: int, payload: bytes = b'') -> bytes:
+    """
+    Frame a request
+
+    :param command: The command
+    :param payload: The payload
+    :return: The frame
+    """
+    return REQUEST_HEADER.pack(len(payload), command) + payload
+
+
+def encode_reply(parts: List[bytes], status: int = OK) -> bytes:
+    """
+    Frame a reply
+
+    :param parts: The parts of the payload, concatenated
+    :param status: The status
+    :return: The frame
+    """
+    payload = b''.join(parts)
+    return REPLY_HEADER.pack(len(payload), status) + payload
+
+
+def encode_json(value) -> bytes:
+    """
+    Encode a JSON payload
+
+    :param value: The value
+    :return: The payload
+    """
+    return json.dumps(value).encode('utf-8')
+
+
+def decode_json(payload: Union[bytes, memoryview]):
+    """
+    Decode a JSON payload
+
+    :param payload: The payload
+    :return: The value
+    """
+    return json.loads(bytes(payload).decode('utf-8'))
+
+
+def encode_step(observations: np.ndarray, rewards: np.ndarray, dones: np.ndarray, infos: List[dict]) -> List[bytes]:
+    """
+    Encode the results of a batched step, as raw arrays
+
+    :param observations: The observations, shape (num_envs,) + observation shape
+    :param rewards: The rewards
+    :param dones: The dones
+    :param infos: The infos, of which only the terminal observations are sent
+    :return: The parts of the payload
+    """
+    ended = [i for i, info in enumerate(infos) if 'terminal_observation' in info]
+    parts = [np.ascontiguousarray(observations).tobytes(), rewards.astype(np.float64).tobytes(),
+             dones.astype(np.bool_).tobytes(), TERMINAL_HEADER.pack(len(ended))]
+    if ended:
+        parts.append(np.array(ended, dtype=np.int32).tobytes())
+        parts.append(np.stack([infos[i]['terminal_observation'] for i in ended]).astype(observations.dtype).tobytes())
+    return parts
+
+
+def decode_step(payload: Union[bytes, memoryview], num_envs: int, observation_shape: tuple,
+                observation_dtype: np.dtype) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[dict]]:
+    """
+    Decode the results of a batched step, as views of the payload
+
+    :param payload: The payload
+    :param num_envs: The number of environments
+    :param observation_shape: The shape of an observation
+    :param observation_dtype: The observations' dtype
+    :return: The observations, rewards, dones and infos (with the terminal observations)
+    """
+    observation_dtype = np.dtype(observation_dtype)
+    n_observations = num_envs * int(np.prod(observation_shape))
+    offset = n_observations * observation_dtype.itemsize
+    observations = np.frombuffer(payload, observation_dtype, n_observations).reshape((num_envs,) + observation_shape)
+    rewards = np.frombuffer(payload, np.float64, num_envs, offset)
+    offset += num_envs * 8
+    dones = np.frombuffer(payload, np.bool_, num_envs, offset)
+    offset += num_envs
+    n_ended, = TERMINAL_HEADER.unpack_from(payload, offset)
+    offset += TERMINAL_HEADER.size
+    infos = [{} for _ in range(num_envs)]
+    if n_ended:
+        ended = np.frombuffer(payload, np.int32, n_ended, offset)
+        offset += n_ended * 4
+        terminal = np.frombuffer(payload, observation_dtype, n_ended * int(np.prod(observation_shape)),
+                                 offset).reshape((n_ended,) + observation_shape)
+        for i, observation in zip(ended.tolist(), terminal):
+            infos[i]['terminal_observation'] = observation.copy()
+    return observations, rewards, dones, infos
@@ -0,0 +1,232 @@
+import math
+import os
+import struct
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from gym_space_crystals.envs._globals import *
+
+# number of prerendered rotations of each sprite (5 degrees apart, so the spaceship's 10 degrees steps fall on them)
+N_ROTATIONS = 72
+# subpixel samples per axis when prerendering the sprites
+SUPERSAMPLING = 4
+# color of the empty window (the viewer's clear color)
+BACKGROUND = 255
+# order in which the entities are drawn, the last ones on top (the viewer's order)
+LAYERS = ['spaceship', 'crystal', 'enemy', 'bullet']
+# a layer: the entities' type, then their scenes, X and Y coordinates and rotations
+Layer = Tuple[str, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class Rasterizer:
+    def __init__(self, width: int = SCREEN_WIDTH, height: int = SCREEN_HEIGHT, n_scenes: int = 1):
+        """
+        Create an offscreen renderer drawing batches of scenes into preallocated RGB frames, with NumPy only.
+
+        Each entity type's sprite is prerendered at N_ROTATIONS rotations (with its alpha channel, supersampled), and
+        the entities are blitted with their nearest prerendered rotation. The frames have a margin as large as the
+        largest sprite, so that the entities across the window's borders are clipped for free.
+
+        :param width: The frames' width, in pixels (the window's width is scaled to it)
+        :param height: The frames' height, in pixels (the window's height is scaled to it)
+        :param n_scenes: The number of scenes drawn at once
+        """
+        self.width = width
+        self.height = height
+        self.n_scenes = n_scenes
+        self.scale_x = width / SCREEN_WIDTH
+        self.scale_y = height / SCREEN_HEIGHT
+        self.sprites = {_type: sprite_table(ENTITIES.get(_type).get('shape'), ENTITIES.get(_type).get('radius'),
+                                            self.scale_x, self.scale_y)
+                        for _type in LAYERS}  # type: Dict[str, Tuple[np.ndarray, np.ndarray]]
+        self.margin = max(max(alpha.shape[1:]) for _, alpha in self.sprites.values())
+        self.buffer = np.empty((n_scenes, height + 2 * self.margin, width + 2 * self.margin, 3), dtype=np.uint8)
+        self.frames = self.buffer[:, self.margin:self.margin + height, self.margin:self.margin + width]
+
+    def render(self, layers: List[Layer], origins: Tuple[np.ndarray, np.ndarray] = None) -> np.ndarray:
+        """
+        Draw the scenes
+
+        :param layers: The entities to draw, one layer per type, in drawing order
+        :param origins: The world coordinates of the views' bottom-left corners, per scene (see `view_origin`), the
+        window's origin if None
+        :return: The frames, shape (n_scenes, height, width, 3), overwritten at every call
+        """
+        self.buffer.fill(BACKGROUND)
+        for layer in layers:
+            self.blit(*layer, origins=origins)
+        return self.frames
+
+    def blit(self, _type: str, scenes: np.ndarray, x: np.ndarray, y: np.ndarray, rotation: np.ndarray,
+             origins: Tuple[np.ndarray, np.ndarray] = None):
+        """
+        Draw entities of a type, alpha-blending them over the frames.
+
+        The entities of a layer are blended over the frame as it was before the layer: where two of them overlap,
+        the last one wins.
+
+        :param _type: The entities' type
+        :param scenes: The entities' scenes
+        :param x: The entities' X coordinates
+        :param y: The entities' Y coordinates
+        :param rotation: The entities' rotations
+        :param origins: The views' bottom-left corners per scene, the window's origin if None
+        """
+        colors, alpha = self.sprites[_type]
+        n_rotations, size_y, size_x = alpha.shape
+        if origins is not None:
+            x = x - origins[0][scenes]
+            y = y - origins[1][scenes]
+        # top-left corner of the sprites in the buffer (the window's Y axis points up, the frames' one down)
+        col = np.rint(x * self.scale_x - 0.5).astype(np.int64) - size_x // 2 + self.margin
+        row = np.rint((SCREEN_HEIGHT - y) * self.scale_y - 0.5).astype(np.int64) - size_y // 2 + self.margin
+        visible = (col >= 0) & (col + size_x <= self.buffer.shape[2])
+        visible &= (row >= 0) & (row + size_y <= self.buffer.shape[1])
+        if not np.all(visible):
+            scenes, rotation, col, row = scenes[visible], rotation[visible], col[visible], row[visible]
+        if scenes.size == 0:
+            return
+        k = np.rint(rotation * (n_rotations / (2 * math.pi))).astype(np.int64) % n_rotations
+        # the visible pixels of each sprite
+        i, sprite_row, sprite_col = np.nonzero(alpha[k])
+        k = k[i]
+        a = alpha[k, sprite_row, sprite_col][:, None]
+        s, r, c = scenes[i], row[i] + sprite_row, col[i] + sprite_col
+        self.buffer[s, r, c] = self.buffer[s, r, c] * (1 - a) + colors[k, sprite_row, sprite_col]
+
+
+# -- Functions --
+
+def view_origin(x: np.ndarray, y: np.ndarray, world_width: float,
+                world_height: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Place window-sized views (cameras) following the spaceships: centred on them, but kept within the world (and
+    centred on the worlds smaller than the window)
+
+    :param x: The spaceships' X coordinates
+    :param y: The spaceships' Y coordinates
+    :param world_width: The world's width
+    :param world_height: The world's height
+    :return: The world coordinates of the views' bottom-left corners
+    """
+    left = np.clip(x - SCREEN_WIDTH / 2, 0., world_width - SCREEN_WIDTH) if world_width >= SCREEN_WIDTH else \
+        np.full(np.shape(x), (world_width - SCREEN_WIDTH) / 2)
+    bottom = np.clip(y - SCREEN_HEIGHT / 2, 0., world_height - SCREEN_HEIGHT) if world_height >= SCREEN_HEIGHT else \
+        np.full(np.shape(y), (world_height - SCREEN_HEIGHT) / 2)
+    return left, bottom
+
+
+def asset_path(path: str) -> str:
+    """
+    Resolve an asset's path, relative to the directory containing the package (as in `ENTITIES`) whatever the working
+    directory
+
+    :param path: The asset's path
+    :return: The path to open
+    """
+    if os.path.isabs(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), path)
+
+
+def read_png(path: str) -> np.ndarray:
+    """
+    Decode an 8-bit, non-interlaced RGB or RGBA PNG image
+
+    :param path: The image's path
+    :return: The RGBA pixels, shape (height, width, 4)
+    """
+    with open(asset_path(path), 'rb') as f:
+        data = f.read()
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('%s is not a PNG image' % path)
+    offset = 8
+    header = None
+    idat = []
+    while offset < len(data):
+        length, chunk = struct.unpack('>I4s', data[offset:offset + 8])
+        body = data[offset + 8:offset + 8 + length]
+        if chunk == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif chunk == b'IDAT':
+            idat.append(body)
+        elif chunk == b'IEND':
+            break
+        offset += 12 + length
+    width, height, depth, color_type, _, _, interlace = header
+    if depth != 8 or color_type not in (2, 6) or interlace != 0:
+        raise ValueError('%s: only 8-bit, non-interlaced RGB or RGBA PNG images are supported' % path)
+    channels = 4 if color_type == 6 else 3
+    stride = width * channels
+    raw = np.frombuffer(zlib.decompress(b''.join(idat)), dtype=np.uint8).reshape(height, stride + 1)
+    pixels = np.zeros((height, stride), dtype=np.int64)
+    previous = np.zeros(stride, dtype=np.int64)
+    for y in range(height):
+        line = raw[y, 1:].astype(np.int64)
+        kind = raw[y, 0]
+        if kind == 1 or kind == 3 or kind == 4:
+            # filters depending on the previous pixel: undo them pixel by pixel
+            for x in range(stride):
+                left = line[x - channels] if x >= channels else 0
+                up_left = previous[x - channels] if x >= channels else 0
+                if kind == 1:
+                    line[x] = (line[x] + left) & 0xFF
+                elif kind == 3:
+                    line[x] = (line[x] + (left + previous[x]) // 2) & 0xFF
+                else:
+                    p = left + previous[x] - up_left
+                    pa, pb, pc = abs(p - left), abs(p - previous[x]), abs(p - up_left)
+                    predictor = left if pa <= pb and pa <= pc else (previous[x] if pb <= pc else up_left)
+                    line[x] = (line[x] + predictor) & 0xFF
+        elif kind == 2:
+            line = (line + previous) & 0xFF
+        pixels[y] = previous = line
+    pixels = pixels.astype(np.uint8).reshape(height, width, channels)
+    if channels == 3:
+        pixels = np.concatenate((pixels, np.full((height, width, 1), 255, dtype=np.uint8)), axis=2)
+    return pixels
+
+
+@lru_cache(maxsize=None)
+def sprite_table(path: str, size: float, scale_x: float, scale_y: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Prerender an image at N_ROTATIONS rotations, as the viewer draws it: a `size` x `size` square (in window units)
+    centered on the entity, rotated counterclockwise.
+
+    :param path: The image's path
+    :param size: The side of the drawn image, in window units
+    :param scale_x: The frames' pixels per window unit, along X
+    :param scale_y: The frames' pixels per window unit, along Y
+    :return: The colors, premultiplied by alpha and in [0, 255], shape (N_ROTATIONS, size_y, size_x, 3), and the
+    alpha, in [0, 1], shape (N_ROTATIONS, size_y, size_x)
+    """
+    image = read_png(path).astype(np.float32) / 255
+    image_height, image_width = image.shape[:2]
+    # the rotated image fits in its circumscribed circle
+    half_x = math.ceil(size * math.sqrt(2) / 2 * scale_x)
+    half_y = math.ceil(size * math.sqrt(2) / 2 * scale_y)
+    # window offsets (Y up) of the subpixel samples, from the sprite's center
+    subpixels = (np.arange(SUPERSAMPLING) + 0.5) / SUPERSAMPLING - 0.5
+    offset_x = ((np.arange(2 * half_x + 1) - half_x)[:, None] + subpixels).ravel() / scale_x
+    offset_y = -((np.arange(2 * half_y + 1) - half_y)[:, None] + subpixels).ravel() / scale_y
+    offset_x, offset_y = np.meshgrid(offset_x, offset_y)
+    colors = np.zeros((N_ROTATIONS, 2 * half_y + 1, 2 * half_x + 1, 3), dtype=np.float32)
+    alpha = np.zeros((N_ROTATIONS, 2 * half_y + 1, 2 * half_x + 1), dtype=np.float32)
+    for k in range(N_ROTATIONS):
+        theta = k * 2 * math.pi / N_ROTATIONS
+        # back to the unrotated image's coordinates, then to its pixels (the image's top is up)
+        u = (math.cos(theta) * offset_x + math.sin(theta) * offset_y) / size + 0.5
+        v = 0.5 - (-math.sin(theta) * offset_x + math.cos(theta) * offset_y) / size
+        inside = (u >= 0) & (u < 1) & (v >= 0) & (v < 1)
+        texels = image[np.clip((v * image_height).astype(np.int64), 0, image_height - 1),
+                       np.clip((u * image_width).astype(np.int64), 0, image_width - 1)]
+        texels[~inside] = 0
+        texels[..., :3] *= texels[..., 3:]
+        # average the subpixel samples
+        texels = texels.reshape(2 * half_y + 1, SUPERSAMPLING, 2 * half_x + 1, SUPERSAMPLING, 4).mean(axis=(1, 3))
+        colors[k] = texels[..., :3] * 255
+        alpha[k] = texels[..., 3]
+    return colors, alpha
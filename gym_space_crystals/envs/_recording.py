@@ -0,0 +1,375 @@
+import json
+import os
+import queue
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import gym
+import numpy as np
+
+from gym_space_crystals.envs._state import EnvState
+
+# format version of the recordings
+RECORDING_VERSION = 1
+# default number of rows per chunk file
+CHUNK_SIZE = 1 << 16
+# columns of the episodes table: first row, number of rows (reset observation included), seed and number of resets
+# since the seed
+EPISODE_COLUMNS = ['start', 'length', 'seed', 'resets']
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    def __init__(self, env: gym.Env, directory: str, chunk_size: int = CHUNK_SIZE, snapshot_interval: int = 0,
+                 seed: int = None):
+        """
+        Record the trajectories of a SpaceCrystalsEnv into chunked, memory-mapped .npy files.
+
+        Each observation is a row: the reset observation (action -1) or the observation after a step, with the action,
+        reward and done flag of that step. The rows are written into preallocated chunks of `chunk_size` rows, mapped
+        in memory: a full chunk is handed to a background thread which flushes it to disk, while the next one was
+        already allocated. Each episode is recorded with its seed and its number of resets since the seed, so that
+        `TrajectoryReplayer` can simulate it again from its actions.
+
+        :param env: The environment, seeded only through the recorder
+        :param directory: The directory to write the recording into (created if needed)
+        :param chunk_size: The number of rows per chunk file
+        :param snapshot_interval: Also snapshot the scene every `snapshot_interval` rows (0 not to)
+        :param seed: The seed of the environment's random generator (drawn from the OS entropy if None)
+        """
+        super(TrajectoryRecorder, self).__init__(env)
+        if snapshot_interval and chunk_size % snapshot_interval != 0:
+            raise ValueError('chunk_size (%d) must be a multiple of snapshot_interval (%d)'
+                             % (chunk_size, snapshot_interval))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.snapshot_interval = snapshot_interval
+        self.n_rows = 0
+        # first row, seed and number of resets since the seed of each episode
+        self.episodes = []  # type: List[Tuple[int, int, int]]
+        self._seed = None  # type: int
+        self._resets = 0
+        self._chunk = None  # type: Dict[str, np.ndarray]
+        self._next_chunk = None  # type: Dict[str, np.ndarray]
+        self._row = 0
+        self._snapshot_size = None  # type: Tuple[int, int]
+        # chunks to flush, then closed by the background thread
+        self._flushes = queue.Queue()
+        self._flusher = threading.Thread(target=_flush_chunks, args=(self._flushes,), daemon=True)
+        self._flusher.start()
+        self.seed(seed)
+
+    def seed(self, seed: int = None) -> List[int]:
+        seeds = self.env.seed(seed)
+        self._seed = seeds[0]
+        self._resets = 0
+        return seeds
+
+    def reset(self, **kwargs) -> np.ndarray:
+        observation = self.env.reset(**kwargs)
+        self.episodes.append((self.n_rows, self._seed, self._resets))
+        self._resets += 1
+        self._record(observation, -1, 0., False)
+        return observation
+
+    def step(self, action: int) -> Tuple[np.ndarray, float, bool, dict]:
+        observation, reward, done, info = self.env.step(action)
+        self._record(observation, action, reward, done)
+        return observation, reward, done, info
+
+    def close(self):
+        self.flush(wait=True)
+        self._flushes.put(None)
+        self._flusher.join()
+        if self._chunk is not None:
+            # the chunks allocated ahead of time and never written into: the one after the current chunk, and the
+            # current one itself if the last rows filled the previous one
+            index = self.n_rows // self.chunk_size
+            unused = [] if self._next_chunk is None else [index + 1]
+            if self._row == 0:
+                unused.append(index)
+            names = list(self._chunk)
+            for chunk in [self._chunk, self._next_chunk]:
+                if chunk is not None:
+                    chunk.clear()
+            for i in unused:
+                for name in names:
+                    os.remove(chunk_path(self.directory, name, i))
+            self._next_chunk = None
+        self._chunk = None
+        super(TrajectoryRecorder, self).close()
+
+    def flush(self, wait: bool = False):
+        """
+        Flush the rows recorded so far and write the recording's index
+
+        :param wait: Wait until the flushed data is on disk
+        """
+        if self._chunk is not None:
+            self._flushes.put((self._chunk, False))
+        self._write_index()
+        if wait:
+            self._flushes.join()
+
+    def _record(self, observation: np.ndarray, action: int, reward: float, done: bool):
+        """
+        Write a row into the current chunk, starting the next one when full
+
+        :param observation: The observation
+        :param action: The action leading to it
+        :param reward: The reward of the action
+        :param done: Whether the episode ended
+        """
+        if self._chunk is None:
+            self._chunk = self._open_chunk(self.n_rows // self.chunk_size, observation)
+            self._next_chunk = None
+            self._row = 0
+        chunk = self._chunk
+        row = self._row
+        chunk['observations'][row] = observation
+        chunk['actions'][row] = action
+        chunk['rewards'][row] = reward
+        chunk['dones'][row] = done
+        if self.snapshot_interval and row % self.snapshot_interval == 0:
+            state = self.env.unwrapped.clone_state()
+            chunk['snapshot_values'][row // self.snapshot_interval] = state.values
+            chunk['snapshot_alive'][row // self.snapshot_interval] = np.packbits(state.alive)
+        self.n_rows += 1
+        self._row += 1
+
+        if self._row == self.chunk_size:
+            # hand the full chunk over to the flusher, move on to the next one and allocate the following one ahead
+            self._flushes.put((chunk, True))
+            index = self.n_rows // self.chunk_size
+            self._chunk = self._open_chunk(index, observation) if self._next_chunk is None else self._next_chunk
+            self._next_chunk = self._open_chunk(index + 1, observation)
+            self._row = 0
+            self._write_index()
+        elif self._next_chunk is None and self._row == self.chunk_size // 2:
+            self._next_chunk = self._open_chunk(self.n_rows // self.chunk_size + 1, observation)
+
+    def _open_chunk(self, index: int, observation: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Preallocate a chunk's files and map them in memory
+
+        :param index: The chunk's index
+        :param observation: An observation, giving the observations' shape and type
+        :return: The chunk's arrays, by field
+        """
+        fields = {
+            'observations': ((self.chunk_size,) + observation.shape, observation.dtype),
+            'actions': ((self.chunk_size,), np.int64),
+            'rewards': ((self.chunk_size,), np.float64),
+            'dones': ((self.chunk_size,), np.bool_),
+        }
+        if self.snapshot_interval:
+            if self._snapshot_size is None:
+                state = self.env.unwrapped.clone_state()
+                self._snapshot_size = (state.values.size, np.packbits(state.alive).size)
+            n_snapshots = self.chunk_size // self.snapshot_interval
+            fields['snapshot_values'] = ((n_snapshots, self._snapshot_size[0]), np.float64)
+            fields['snapshot_alive'] = ((n_snapshots, self._snapshot_size[1]), np.uint8)
+        return {name: np.lib.format.open_memmap(chunk_path(self.directory, name, index), mode='w+', dtype=dtype,
+                                                 shape=shape)
+                for name, (shape, dtype) in fields.items()}
+
+    def _write_index(self):
+        """
+        Write the recording's metadata and episodes table
+        """
+        # seeds drawn from the OS entropy don't fit in int64
+        episodes = np.array(self.episodes, dtype=np.uint64).reshape(-1, 3)
+        # each episode lasts until the next one, the last one until the last row
+        lengths = np.diff(np.append(episodes[:, 0], np.uint64(self.n_rows)))
+        np.save(os.path.join(self.directory, 'episodes.npy'), np.insert(episodes, 1, lengths, axis=1))
+        meta = dict(version=RECORDING_VERSION, n_rows=self.n_rows, chunk_size=self.chunk_size,
+                    snapshot_interval=self.snapshot_interval, episode_columns=EPISODE_COLUMNS)
+        path = os.path.join(self.directory, 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+class TrajectoryReplayer:
+    def __init__(self, directory: str):
+        """
+        Read a recording written by `TrajectoryRecorder`, loading the chunks lazily, and simulate its episodes again.
+
+        :param directory: The recording's directory
+        """
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.n_rows = self.meta['n_rows']
+        self.chunk_size = self.meta['chunk_size']
+        self.snapshot_interval = self.meta['snapshot_interval']
+        self.episodes = np.load(os.path.join(directory, 'episodes.npy'))
+        self._chunks = {}  # type: Dict[Tuple[str, int], np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.episodes)
+
+    def rows(self, name: str, start: int, stop: int) -> np.ndarray:
+        """
+        Read a range of rows of a field, mapping only the chunks it spans
+
+        :param name: The field: 'observations', 'actions', 'rewards' or 'dones'
+        :param start: The first row
+        :param stop: The row after the last one
+        :return: The rows (a view of the mapped chunk if they lie in a single one)
+        """
+        parts = []
+        while start < stop:
+            index, offset = divmod(start, self.chunk_size)
+            n = min(stop - start, self.chunk_size - offset)
+            parts.append(self._chunk(name, index)[offset:offset + n])
+            start += n
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else self._chunk(name, 0)[:0]
+
+    def episode(self, i: int) -> Dict[str, np.ndarray]:
+        """
+        Read an episode
+
+        :param i: The episode's index
+        :return: Its rows, by field: the observations from the reset one, and the actions, rewards and dones leading
+        to them (-1, 0 and False for the reset observation)
+        """
+        start, length = self.episodes[i, :2].tolist()
+        return {name: self.rows(name, start, start + length)
+                for name in ['observations', 'actions', 'rewards', 'dones']}
+
+    def iter_episodes(self) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Read the episodes in order
+
+        :return: The episodes, as given by `episode`
+        """
+        for i in range(len(self)):
+            yield self.episode(i)
+
+    def reset(self, env: gym.Env, i: int) -> np.ndarray:
+        """
+        Reset an environment (configured as the recorded one) to the start of an episode, from its seed and its
+        number of resets since the seed
+
+        :param env: The environment
+        :param i: The episode's index
+        :return: The reset observation
+        """
+        _, _, seed, resets = self.episodes[i].tolist()
+        env = env.unwrapped
+        env.seed(seed)
+        # the initial scenes are drawn in sequence: skip the ones of the previous episodes
+        if resets > 0:
+            env.reset_pool.take(resets)
+        return env.reset()
+
+    def replay(self, env: gym.Env, i: int, check: bool = True) -> Iterator[Tuple[np.ndarray, float, bool, dict]]:
+        """
+        Simulate an episode again from its actions
+
+        :param env: The environment, configured as the recorded one
+        :param i: The episode's index
+        :param check: Check that the simulated observations, rewards and dones are the recorded ones
+        :return: The steps' outputs, as given by `step`
+        """
+        episode = self.episode(i)
+        observation = self.reset(env, i)
+        if check:
+            _check_row(episode, 0, observation, 0., False)
+        env = env.unwrapped
+        for row in range(1, len(episode['actions'])):
+            observation, reward, done, info = env.step(int(episode['actions'][row]))
+            if check:
+                _check_row(episode, row, observation, reward, done)
+            yield observation, reward, done, info
+
+    def restore(self, env: gym.Env, row: int) -> Optional[int]:
+        """
+        Bring an environment (configured as the recorded one) to the scene of a row, from the closest snapshot at or
+        before it, then simulating the steps in between
+
+        :param env: The environment
+        :param row: The row
+        :return: The row of the snapshot used
+        """
+        assert self.snapshot_interval, 'the recording has no snapshots'
+        i = int(np.searchsorted(self.episodes[:, 0], row, side='right')) - 1
+        start = max(int(self.episodes[i, 0]), row - row % self.snapshot_interval)
+        # the episode's initial scene sets the generator's state, shared by all the episode's snapshots
+        self.reset(env, i)
+        env = env.unwrapped
+        if start % self.snapshot_interval == 0:
+            index, offset = divmod(start, self.chunk_size)
+            values = self._chunk('snapshot_values', index)[offset // self.snapshot_interval]
+            alive = self._chunk('snapshot_alive', index)[offset // self.snapshot_interval]
+            env.restore_state(EnvState(np.array(values), np.unpackbits(alive)[:env.scene_alive.size].astype(np.bool_),
+                                       env.reset_pool.batch_state))
+        for action in self.rows('actions', start + 1, row + 1).tolist():
+            env.step(action)
+        return start
+
+    def _chunk(self, name: str, index: int) -> np.ndarray:
+        """
+        Map a chunk's field in memory, read-only, on first use
+
+        :param name: The field
+        :param index: The chunk's index
+        :return: The mapped array
+        """
+        key = (name, index)
+        if key not in self._chunks:
+            self._chunks[key] = np.load(chunk_path(self.directory, name, index), mmap_mode='r')
+        return self._chunks[key]
+
+
+# -- Functions --
+
+def chunk_path(directory: str, name: str, index: int) -> str:
+    """
+    Get the path of a chunk's field
+
+    :param directory: The recording's directory
+    :param name: The field
+    :param index: The chunk's index
+    :return: The path
+    """
+    return os.path.join(directory, '%s_%06d.npy' % (name, index))
+
+
+def _flush_chunks(flushes: queue.Queue):
+    """
+    Flush the chunks put in a queue to disk, until None is put
+
+    :param flushes: The queue of (chunk, whether it is full and can be closed)
+    """
+    while True:
+        item = flushes.get()
+        try:
+            if item is None:
+                return
+            chunk, full = item
+            for array in chunk.values():
+                array.flush()
+            if full:
+                # drop the mapping
+                chunk.clear()
+        finally:
+            flushes.task_done()
+
+
+def _check_row(episode: Dict[str, np.ndarray], row: int, observation: np.ndarray, reward: float, done: bool):
+    """
+    Check that a simulated step gives the recorded row
+
+    :param episode: The recorded episode
+    :param row: The row
+    :param observation: The simulated observation
+    :param reward: The simulated reward
+    :param done: The simulated done flag
+    """
+    if not (np.array_equal(episode['observations'][row], observation) and episode['rewards'][row] == reward and
+            episode['dones'][row] == done):
+        raise RuntimeError('the replay diverged from the recording at row %d of the episode' % row)
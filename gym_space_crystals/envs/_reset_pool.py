@@ -0,0 +1,141 @@
+from typing import Tuple
+
+import numpy as np
+
+from gym_space_crystals.envs._config import EnvConfig
+from gym_space_crystals.envs._globals import *
+
+# number of initial scenes drawn at once
+RESET_POOL_SIZE = 256
+
+
+class ResetPool:
+    def __init__(self, rng: np.random.RandomState, n_crystals: int, n_enemies: int, size: int = RESET_POOL_SIZE,
+                 world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT), config: EnvConfig = None,
+                 standard: bool = False):
+        """
+        Create a bounded pool of initial scenes, drawn in bulk from a random generator.
+
+        Each refill draws a whole batch of scenes in one vectorized call, one scene per row in the order of the
+        generator's stream: the sequence of scenes only depends on the generator's seed, not on the pool's size nor on
+        how many scenes are taken at once. The generator's state before the current batch is kept, so that a
+        position in the sequence (batch state, cursor) can be restored.
+
+        :param rng: The random generator, only drawn from by the pool
+        :param n_crystals: The number of crystals per scene
+        :param n_enemies: The number of enemies per scene
+        :param size: The number of scenes per batch
+        :param world_size: The world's (width, height): the entities' distributions, given for the window, are
+        stretched to it
+        :param config: The config giving the entities' distributions, the default one if None
+        :param standard: Draw standard normal coordinates instead, for the caller to stretch them (e.g. per scene, see
+        `spawn_distribution`)
+        """
+        self.n_crystals = n_crystals
+        self.n_enemies = n_enemies
+        self.size = size
+        # per-column means and standard deviations: crystals' X and Y, then enemies' X and Y
+        if standard:
+            self._mean, self._std = np.zeros(2 * (n_crystals + n_enemies)), np.ones(2 * (n_crystals + n_enemies))
+        else:
+            self._mean, self._std = spawn_distribution(config or EnvConfig(), n_crystals, n_enemies, world_size)
+        self.rng = None  # type: np.random.RandomState
+        self.batch_state = None  # type: tuple
+        self.scenes = None  # type: np.ndarray
+        self.cursor = 0
+        self.seed(rng)
+
+    def seed(self, rng: np.random.RandomState):
+        """
+        Start drawing from a new generator, discarding the pooled scenes
+
+        :param rng: The random generator
+        """
+        self.rng = rng
+        self.refill()
+
+    def refill(self):
+        """
+        Replace the pooled scenes with a new batch
+        """
+        self.batch_state = self.rng.get_state()
+        self.scenes = self._mean + self._std * self.rng.standard_normal((self.size, self._mean.size))
+        self.cursor = 0
+
+    def restore(self, batch_state: tuple, cursor: int):
+        """
+        Go back to a position in the sequence of scenes
+
+        :param batch_state: The generator's state before the batch, as kept in `batch_state`
+        :param cursor: The position in the batch
+        """
+        if not same_state(batch_state, self.batch_state):
+            self.rng.set_state(batch_state)
+            self.refill()
+            # keep the given state, so that the snapshots sharing it are restored without drawing again
+            self.batch_state = batch_state
+        self.cursor = cursor
+
+    def take(self, n: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Take the next initial scenes, refilling the pool as needed
+
+        :param n: The number of scenes
+        :return: The crystals' X and Y coordinates, shape (n, n_crystals), and the enemies' X and Y coordinates,
+        shape (n, n_enemies)
+        """
+        if self.cursor == self.size:
+            self.refill()
+        if self.cursor + n <= self.size:
+            scenes = self.scenes[self.cursor:self.cursor + n]
+            self.cursor += n
+        else:
+            chunks = []
+            while n > 0:
+                if self.cursor == self.size:
+                    self.refill()
+                k = min(n, self.size - self.cursor)
+                chunks.append(self.scenes[self.cursor:self.cursor + k])
+                self.cursor += k
+                n -= k
+            scenes = np.concatenate(chunks)
+        c, e = self.n_crystals, self.n_enemies
+        return scenes[:, :c], scenes[:, c:2 * c], scenes[:, 2 * c:2 * c + e], scenes[:, 2 * c + e:]
+
+
+# -- Functions --
+
+def spawn_distribution(config: EnvConfig, n_crystals: int, n_enemies: int,
+                       world_size: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the means and standard deviations of the coordinates of a scene's entities
+
+    :param config: The config giving the entities' distributions, for the window, or stacked configs (see
+    `stack_configs`) for one row per config
+    :param n_crystals: The number of crystals
+    :param n_enemies: The number of enemies
+    :param world_size: The world's (width, height), the distributions being stretched to it
+    :return: The means and standard deviations, one per coordinate: crystals' X and Y, then enemies' X and Y
+    """
+    counts = [n_crystals, n_crystals, n_enemies, n_enemies]
+    scale = np.repeat([world_size[0] / SCREEN_WIDTH, world_size[1] / SCREEN_HEIGHT] * 2, counts)
+    mean = np.stack([config.crystals_mean_x, config.crystals_mean_y, config.enemies_mean_x, config.enemies_mean_y],
+                    axis=-1)
+    std = np.stack([config.crystals_std_x, config.crystals_std_y, config.enemies_std_x, config.enemies_std_y],
+                   axis=-1)
+    return np.repeat(mean, counts, axis=-1) * scale, np.repeat(std, counts, axis=-1) * scale
+
+
+def same_state(a: tuple, b: tuple) -> bool:
+    """
+    Check whether two states of a random generator, as given by `RandomState.get_state`, are the same
+
+    :param a: The first state
+    :param b: The second state
+    :return: True if they are the same
+    """
+    if a is b:
+        return True
+    if a is None or b is None:
+        return False
+    return a[0] == b[0] and a[2:] == b[2:] and np.array_equal(a[1], b[1])
@@ -0,0 +1,314 @@
+import math
+from functools import lru_cache
+from typing import Callable, Tuple
+
+import numpy as np
+from gym import spaces
+
+from gym_space_crystals.envs._globals import *
+
+# number of ray-entity pairs in a batch above which bucketing the rays by angle is faster than a full broadcast
+BUCKETED_MIN_PAIRS = 4096
+# observation dtypes: floats, or unsigned integers quantized over the features' ranges
+OBSERVATION_DTYPES = ['float64', 'float32', 'uint8', 'uint16']
+
+
+class ObservationEncoding:
+    def __init__(self, dtype: str = 'float64', diag: float = DIAG, sensor_range: float = None):
+        """
+        Describe how the observations are written in their buffer, directly in its dtype, and how far the sensor rays
+        see.
+
+        The rays see the entities and the borders up to their range: a ray seeing nothing within it reports the border
+        value at the range's distance.
+
+        The features are normalized whatever the dtype: the positions and distances in [0, 1], the rotation in turns
+        wrapped to [0, 1), and the sensed values in [-1, 1]. Floats hold them as they are, and unsigned integers
+        quantized over their range, mapped to [0, max] (so that the border's 0 is the middle value).
+
+        :param dtype: The observations' dtype, one of OBSERVATION_DTYPES
+        :param diag: The length normalizing the positions: the world's diagonal
+        :param sensor_range: The rays' range, normalizing the distances they sense: the world's diagonal if None, so
+        that they see the whole world
+        """
+        if dtype not in OBSERVATION_DTYPES:
+            raise ValueError('dtype must be one of %s, got %r' % (OBSERVATION_DTYPES, dtype))
+        self.dtype = np.dtype(dtype)
+        self.diag = diag
+        self.sensor_range = diag if sensor_range is None else sensor_range
+        if self.sensor_range <= 0:
+            raise ValueError('sensor_range must be positive, got %r' % sensor_range)
+        self.quantized = self.dtype.kind == 'u'
+        # number of quantization steps over a feature's range
+        self.levels = np.iinfo(self.dtype).max if self.quantized else None
+        # encoded value of a feature's maximum (e.g. an occupied cell)
+        self.maximum = self.levels if self.quantized else 1.
+
+    def space(self, n_rays: int) -> spaces.Box:
+        """
+        Get the observation space
+
+        :param n_rays: The number of sensor rays
+        :return: The space
+        """
+        size = 3 + n_rays * 2
+        if self.quantized:
+            return spaces.Box(0, self.levels, (size,), dtype=self.dtype)
+        low = np.zeros(size, dtype=self.dtype)
+        # the sensed values
+        low[3::2] = -1
+        return spaces.Box(low, np.ones(size, dtype=self.dtype), dtype=self.dtype)
+
+    def grid_space(self, shape: tuple) -> spaces.Box:
+        """
+        Get the observation space of occupancy grids
+
+        :param shape: The grids' shape (channels, height, width)
+        :return: The space
+        """
+        return spaces.Box(0, self.maximum, shape, dtype=self.dtype)
+
+    def status(self, x: np.ndarray, y: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+        """
+        Encode the spaceships' status
+
+        :param x: The spaceships' X coordinates, shape (B,)
+        :param y: The spaceships' Y coordinates, shape (B,)
+        :param rotation: The spaceships' rotations, shape (B,)
+        :return: The encoded status, shape (B, 3), to be assigned to the buffer
+        """
+        status = np.stack([x / self.diag, y / self.diag, rotation / math.radians(360)], axis=-1)
+        status[:, 2] %= 1.
+        if self.quantized:
+            return self._quantize(status)
+        return status
+
+    def values(self, values: np.ndarray) -> np.ndarray:
+        """
+        Encode the values sensed by the rays
+
+        :param values: The values, in [-1, 1]
+        :return: The encoded values, to be assigned to the buffer
+        """
+        if self.quantized:
+            return self._quantize((values + 1) / 2)
+        return values
+
+    def distances(self, distances: np.ndarray) -> np.ndarray:
+        """
+        Encode the distances sensed by the rays
+
+        :param distances: The distances, in pixels
+        :return: The encoded distances (normalized by the sensor range), to be assigned to the buffer
+        """
+        if self.quantized:
+            return self._quantize(distances / self.sensor_range)
+        return distances / self.sensor_range
+
+    def decode(self, observations: np.ndarray) -> np.ndarray:
+        """
+        Get the normalized features of encoded observations (up to the quantization)
+
+        :param observations: The observations, shape (..., 3 + 2 * n_rays)
+        :return: The features, as float64
+        """
+        features = observations.astype(np.float64)
+        if self.quantized:
+            features /= self.levels
+            features[..., 3::2] = features[..., 3::2] * 2 - 1
+        return features
+
+    def _quantize(self, features: np.ndarray) -> np.ndarray:
+        """
+        Scale features in [0, 1] to the integer levels, rounded to the nearest one and clipped (e.g. the distances from
+        a spaceship that left the window)
+
+        :param features: The features
+        :return: The levels, as floats to be cast by the assignment
+        """
+        return np.clip(features * self.levels + 0.5, 0, self.levels)
+
+
+# the default encoding
+FLOAT64 = ObservationEncoding()
+
+
+# -- Functions --
+
+@lru_cache(maxsize=None)
+def ray_offsets(n_rays: int) -> np.ndarray:
+    """
+    Get the angles of the sensor rays relative to the spaceship's rotation
+
+    :param n_rays: The number of rays, evenly spread around the spaceship
+    :return: The angles (in radians)
+    """
+    return np.arange(n_rays) * (2 * np.pi / n_rays)
+
+
+def border_distances(x: np.ndarray, y: np.ndarray, cos: np.ndarray, sin: np.ndarray,
+                     world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT)) -> np.ndarray:
+    """
+    Compute, in closed form, the distance from the points (x,y) to the world borders along the given directions
+
+    :param x: The X coordinates, broadcastable against the directions
+    :param y: The Y coordinates, broadcastable against the directions
+    :param cos: The directions' cosines
+    :param sin: The directions' sines
+    :param world_size: The world's (width, height), the window's by default
+    :return: The distances to the world borders
+    """
+    width, height = world_size
+    # distance to the vertical and to the horizontal border the ray is pointing at
+    # (rays parallel to a border get a huge, finite distance to it, so that no division by zero happens)
+    dx = np.where(cos > 0, width - x, x) / np.maximum(np.abs(cos), 1e-12)
+    dy = np.where(sin > 0, height - y, y) / np.maximum(np.abs(sin), 1e-12)
+    return np.maximum(np.minimum(dx, dy), 0.)
+
+
+def choose_caster(n_scenes: int, n_rays: int, n_entities: int) -> Callable:
+    """
+    Choose the fastest ray caster for a batch of scenes
+
+    :param n_scenes: The number of scenes in the batch
+    :param n_rays: The number of rays per spaceship
+    :param n_entities: The number of sensed entities per scene
+    :return: Either `cast_rays` or `cast_rays_bucketed`
+    """
+    return cast_rays_bucketed if n_scenes * n_rays * n_entities >= BUCKETED_MIN_PAIRS else cast_rays
+
+
+def cast_rays(x: np.ndarray, y: np.ndarray, rotation: np.ndarray,
+              entities_x: np.ndarray, entities_y: np.ndarray, entities_alive: np.ndarray,
+              radii: np.ndarray, values: np.ndarray, n_rays: int, out: np.ndarray,
+              encoding: ObservationEncoding = None,
+              world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT)) -> np.ndarray:
+    """
+    Cast the sensor rays of a batch of spaceships against the entities of their scenes.
+
+    All rays are tested against all entities in a single broadcast: a ray hits an entity if it passes within its
+    radius and the entity lies within the ray's extent, the encoding's sensor range (same test as
+    `line_entity_intersection`). Each ray reports the value and the distance of the nearest entity it hits, else the
+    border value and the border distance, capped at the sensor range.
+
+    :param x: The spaceships' X coordinates, shape (B,)
+    :param y: The spaceships' Y coordinates, shape (B,)
+    :param rotation: The spaceships' rotations, shape (B,)
+    :param entities_x: The entities' X coordinates, shape (B, K)
+    :param entities_y: The entities' Y coordinates, shape (B, K)
+    :param entities_alive: The entities' alive mask, shape (B, K)
+    :param radii: The entities' radii, shape (K,) or (B, K)
+    :param values: The entities' observed values, shape (K,) or (B, K)
+    :param n_rays: The number of rays, evenly spread around the spaceship
+    :param out: The buffer to write the (value, normalized distance) pairs in, shape (B, 2 * n_rays)
+    :param encoding: The encoding of the pairs in the buffer and the rays' range, floats as they are over the
+    window's diagonal if None
+    :param world_size: The world's (width, height), whose borders the rays see
+    :return: The index of the entity seen by each ray, -1 for the border, shape (B, n_rays)
+    """
+    encoding = encoding or FLOAT64
+    theta = rotation[:, None] + ray_offsets(n_rays)
+    cos = np.cos(theta)
+    sin = np.sin(theta)
+    borders = np.minimum(border_distances(x[:, None], y[:, None], cos, sin, world_size), encoding.sensor_range)
+    if entities_x.shape[1] == 0:
+        # nothing to see but the borders
+        out[:, 0::2] = encoding.values(np.float64(BORDER_VALUE))
+        out[:, 1::2] = encoding.distances(borders)
+        return np.full(theta.shape, -1)
+    # rays (B, R, 1) against entities relative to the spaceship (B, 1, K)
+    cos = cos[:, :, None]
+    sin = sin[:, :, None]
+    dx = (entities_x - x[:, None])[:, None, :]
+    dy = (entities_y - y[:, None])[:, None, :]
+    # distance entity center - ray line
+    hit = np.abs(sin * dx - cos * dy) <= (radii if radii.ndim == 1 else radii[:, None, :])
+    # the entity center must lie within the ray's extent
+    ray_x = encoding.sensor_range * cos
+    ray_y = encoding.sensor_range * sin
+    hit &= (dx * ray_x >= 0) & (np.abs(dx) <= np.abs(ray_x))
+    hit &= (dy * ray_y >= 0) & (np.abs(dy) <= np.abs(ray_y))
+    hit &= entities_alive[:, None, :]
+    # pick the nearest entity per ray, within the range
+    dist = np.sqrt(dx * dx + dy * dy)
+    dist = np.where(hit & (dist <= encoding.sensor_range), dist, np.inf)
+    nearest = dist.argmin(axis=2)
+    dist = dist.min(axis=2)
+    seen = dist < np.inf
+    nearest_values = values[nearest] if values.ndim == 1 else values[np.arange(len(x))[:, None], nearest]
+    # fill in the value and distance pairs
+    out[:, 0::2] = encoding.values(np.where(seen, nearest_values, BORDER_VALUE))
+    out[:, 1::2] = encoding.distances(np.where(seen, dist, borders))
+    return np.where(seen, nearest, -1)
+
+
+def cast_rays_bucketed(x: np.ndarray, y: np.ndarray, rotation: np.ndarray,
+                       entities_x: np.ndarray, entities_y: np.ndarray, entities_alive: np.ndarray,
+                       radii: np.ndarray, values: np.ndarray, n_rays: int, out: np.ndarray,
+                       encoding: ObservationEncoding = None,
+                       world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT)) -> np.ndarray:
+    """
+    Cast the sensor rays of a batch of spaceships against the entities of their scenes, bucketing the rays by angle.
+
+    Each entity is projected once into the angular interval it covers around its spaceship, and only the rays
+    within that interval are tested against it (with the same test as `cast_rays`): the cost grows with the
+    number of entities plus the number of covered rays, rather than with their product.
+    The parameters and the return value are the same as `cast_rays`.
+    """
+    encoding = encoding or FLOAT64
+    n = len(x)
+    dtheta = 2 * np.pi / n_rays
+    theta = rotation[:, None] + ray_offsets(n_rays)
+    cos = np.cos(theta)
+    sin = np.sin(theta)
+    # start from the borders everywhere
+    out[:, 0::2] = encoding.values(np.float64(BORDER_VALUE))
+    out[:, 1::2] = encoding.distances(np.minimum(border_distances(x[:, None], y[:, None], cos, sin, world_size),
+                                                 encoding.sensor_range))
+    seen = np.full((n, n_rays), -1)
+    # project the entities around their spaceship
+    scenes, entities = np.nonzero(entities_alive)
+    if scenes.size == 0:
+        return seen
+    radii = np.broadcast_to(radii, entities_alive.shape)[scenes, entities]
+    dx = entities_x[scenes, entities] - x[scenes]
+    dy = entities_y[scenes, entities] - y[scenes]
+    dist = np.sqrt(dx * dx + dy * dy)
+    # angular interval covered by each entity, relative to the spaceship rotation (everything if it's inside)
+    center = np.arctan2(dy, dx) - rotation[scenes]
+    half_width = np.where(dist > radii, np.arcsin(np.minimum(radii / np.maximum(dist, 1e-12), 1.)), np.pi)
+    # slightly widen the intervals so that no grazing ray is lost to rounding (the ray test decides anyway)
+    first = np.ceil((center - half_width - 1e-9) / dtheta).astype(np.int64)
+    count = np.minimum(np.floor((center + half_width + 1e-9) / dtheta).astype(np.int64) - first + 1, n_rays)
+    count = np.maximum(count, 0)
+    # expand the (entity, ray) candidate pairs
+    owner = np.repeat(np.arange(scenes.size), count)
+    rays = (first[owner] + np.arange(owner.size) - np.repeat(np.cumsum(count) - count, count)) % n_rays
+    pair_scenes = scenes[owner]
+    pair_cos = cos[pair_scenes, rays]
+    pair_sin = sin[pair_scenes, rays]
+    pair_dx = dx[owner]
+    pair_dy = dy[owner]
+    # exact ray test on the candidates
+    hit = np.abs(pair_sin * pair_dx - pair_cos * pair_dy) <= radii[owner]
+    ray_x = encoding.sensor_range * pair_cos
+    ray_y = encoding.sensor_range * pair_sin
+    hit &= (pair_dx * ray_x >= 0) & (np.abs(pair_dx) <= np.abs(ray_x))
+    hit &= (pair_dy * ray_y >= 0) & (np.abs(pair_dy) <= np.abs(ray_y))
+    hit &= dist[owner] <= encoding.sensor_range
+    owner = owner[hit]
+    ray_ids = pair_scenes[hit] * n_rays + rays[hit]
+    # keep the nearest entity per ray
+    order = np.lexsort((dist[owner], ray_ids))
+    ray_ids = ray_ids[order]
+    nearest = np.ones(ray_ids.size, dtype=np.bool_)
+    nearest[1:] = ray_ids[1:] != ray_ids[:-1]
+    ray_ids = ray_ids[nearest]
+    owner = owner[order][nearest]
+    # fill in the value and distance pairs of the rays that see something
+    hit_scenes, hit_rays = np.divmod(ray_ids, n_rays)
+    out[hit_scenes, 2 * hit_rays] = encoding.values(np.broadcast_to(values, entities_alive.shape)[scenes[owner],
+                                                                                                  entities[owner]])
+    out[hit_scenes, 2 * hit_rays + 1] = encoding.distances(dist[owner])
+    seen[hit_scenes, hit_rays] = entities[owner]
+    return seen
@@ -0,0 +1,242 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+from gym_space_crystals.envs._entities import box_intersection, swept_box_intersection
+from gym_space_crystals.envs._globals import *
+
+# grid cells are as large as the largest entity: intersecting entities always lie in the same or in adjacent cells
+CELL_SIZE = max(entity.get('radius') for entity in ENTITIES.values())
+# largest relative motion of two colliding entities per unit of time: a bullet (twice the spaceship's velocity)
+# against an enemy, the spaceship's velocity being bounded by its maximum velocity both ways
+MAX_RELATIVE_VELOCITY = 2 * ENTITIES.get('spaceship').get('max_velocity') + ENTITIES.get('enemy').get('max_velocity')
+# queries over fewer candidate pairs than this test all of them: it is cheaper than hashing
+MAX_ALL_PAIRS = 4096
+# groups of fewer points than this (on average) are a single cell each
+SINGLE_CELL_SIZE = 64
+# offsets of a cell and of its neighbours
+_NEIGHBOURS_X = np.repeat([-1, 0, 1], 3)
+_NEIGHBOURS_Y = np.tile([-1, 0, 1], 3)
+
+
+class SpatialHash:
+    def __init__(self, x: np.ndarray, y: np.ndarray, groups: np.ndarray = None, cell_size: float = CELL_SIZE):
+        """
+        Create a uniform grid over a set of points, used as collision broad phase.
+
+        The points are sorted by cell, so that the points in a cell are found by binary search. Points in different
+        groups (e.g. scenes of a batch) never share a cell, and small groups are a single cell each. The points are
+        only hashed by the first query that is too large to test all of its pairs.
+
+        :param x: The points' X coordinates
+        :param y: The points' Y coordinates
+        :param groups: The points' groups, all in group 0 if None
+        :param cell_size: The cells' side
+        """
+        self.x = x
+        self.y = y
+        self.groups = groups
+        self.cell_size = cell_size
+        self.size = len(x)
+        self.single_cell = False
+        self.keys = None
+        self.order = None
+
+    def _hash(self):
+        """
+        Sort the points by cell
+        """
+        if self.groups is not None and self.size <= SINGLE_CELL_SIZE * (self.groups.max() + 1):
+            self.single_cell = True
+            keys = self.groups
+        else:
+            cx = np.floor(self.x / self.cell_size).astype(np.int64)
+            cy = np.floor(self.y / self.cell_size).astype(np.int64)
+            self.min_x, self.max_x = cx.min(), cx.max()
+            self.min_y, self.max_y = cy.min(), cy.max()
+            keys = self._keys(cx, cy, self.groups)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def _keys(self, cx: np.ndarray, cy: np.ndarray, groups: np.ndarray = None) -> np.ndarray:
+        """
+        Compute the keys of the given cells, -1 for the cells outside the grid
+
+        :param cx: The cells' X indices
+        :param cy: The cells' Y indices
+        :param groups: The cells' groups, all in group 0 if None
+        :return: The keys
+        """
+        nx = self.max_x - self.min_x + 1
+        ny = self.max_y - self.min_y + 1
+        keys = (cx - self.min_x) * ny + (cy - self.min_y)
+        if groups is not None:
+            keys += groups * (nx * ny)
+        outside = (cx < self.min_x) | (cx > self.max_x) | (cy < self.min_y) | (cy > self.max_y)
+        keys[outside] = -1
+        return keys
+
+    def candidates(self, x: np.ndarray, y: np.ndarray, groups: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the grid's points in the same or in adjacent cells as the query points
+
+        :param x: The query points' X coordinates
+        :param y: The query points' Y coordinates
+        :param groups: The query points' groups, all in group 0 if None
+        :return: The indices of the query points and of the grid's points of each candidate pair
+        """
+        if self.size == 0 or len(x) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        if groups is None and len(x) * self.size <= MAX_ALL_PAIRS:
+            return np.divmod(np.arange(len(x) * self.size), self.size)
+        if self.keys is None:
+            self._hash()
+        if self.single_cell:
+            # a single cell per group: the cell of each query point is its group
+            keys = groups
+            n_cells = 1
+        else:
+            cx = np.floor(x / self.cell_size).astype(np.int64)[:, None] + _NEIGHBOURS_X
+            cy = np.floor(y / self.cell_size).astype(np.int64)[:, None] + _NEIGHBOURS_Y
+            keys = self._keys(cx, cy, None if groups is None else groups[:, None]).ravel()
+            n_cells = len(_NEIGHBOURS_X)
+        first = np.searchsorted(self.keys, keys, side='left')
+        counts = np.searchsorted(self.keys, keys, side='right') - first
+        # expand each (query point, cell) into the grid's points in the cell
+        owner = np.repeat(np.arange(keys.size), counts)
+        position = first[owner] + np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner // n_cells, self.order[position]
+
+    def in_box(self, left: float, bottom: float, right: float, top: float) -> np.ndarray:
+        """
+        Find the grid's points within a rectangle (e.g. a view of the world), visiting only the cells it overlaps: the
+        cost depends on the rectangle's area and on the points in it, not on the grid's extent
+
+        :param left: The rectangle's left side
+        :param bottom: The rectangle's bottom side
+        :param right: The rectangle's right side
+        :param top: The rectangle's top side
+        :return: The indices of the points, of any group
+        """
+        if self.size <= SINGLE_CELL_SIZE:
+            # cheaper than hashing
+            i = np.arange(self.size)
+        else:
+            if self.keys is None:
+                self._hash()
+            if self.single_cell:
+                i = self.order
+            else:
+                # the overlapped cells, within the grid's extent
+                cx = np.arange(max(math.floor(left / self.cell_size), self.min_x),
+                               min(math.floor(right / self.cell_size), self.max_x) + 1)
+                cy = np.arange(max(math.floor(bottom / self.cell_size), self.min_y),
+                               min(math.floor(top / self.cell_size), self.max_y) + 1)
+                if self.groups is None:
+                    groups, cx, cy = None, cx[:, None], cy[None, :]
+                else:
+                    groups, cx, cy = np.broadcast_arrays(np.arange(self.groups.max() + 1)[:, None, None],
+                                                         cx[None, :, None], cy[None, None, :])
+                keys = self._keys(cx, cy, groups).ravel()
+                first = np.searchsorted(self.keys, keys, side='left')
+                counts = np.searchsorted(self.keys, keys, side='right') - first
+                position = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+                i = self.order[position]
+        x, y = self.x[i], self.y[i]
+        return i[(x >= left) & (x <= right) & (y >= bottom) & (y <= top)]
+
+
+# -- Functions --
+
+def intersecting_pairs(grid: SpatialHash, grid_x: np.ndarray, grid_y: np.ndarray, grid_radius: float,
+                       x: np.ndarray, y: np.ndarray, radius: float,
+                       groups: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the pairs of intersecting entities between query entities and the entities indexed by a grid.
+
+    The grid gives the candidate pairs (broad phase), then `box_intersection` keeps the intersecting ones (narrow
+    phase).
+
+    :param grid: The grid indexing the entities
+    :param grid_x: The X coordinates of the entities indexed by the grid
+    :param grid_y: The Y coordinates of the entities indexed by the grid
+    :param grid_radius: The radius of the entities indexed by the grid
+    :param x: The X coordinates of the query entities
+    :param y: The Y coordinates of the query entities
+    :param radius: The radius of the query entities
+    :param groups: The groups of the query entities, all in group 0 if None
+    :return: The indices of the query entities and of the indexed entities of each pair
+    """
+    assert max(grid_radius, radius) <= grid.cell_size
+    i, j = grid.candidates(x, y, groups)
+    if i.size == 0:
+        return i, j
+    hit = box_intersection(x[i], y[i], radius, grid_x[j], grid_y[j], grid_radius)
+    return i[hit], j[hit]
+
+
+def swept_pairs(grid: SpatialHash, grid_x: np.ndarray, grid_y: np.ndarray, grid_start_x: np.ndarray,
+                grid_start_y: np.ndarray, grid_radius: float, x: np.ndarray, y: np.ndarray, start_x: np.ndarray,
+                start_y: np.ndarray, radius: float, groups: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Continuous version of `intersecting_pairs`: find the pairs of entities intersecting at any time of a tick.
+
+    The grid indexes the end positions, so its cells must cover the entities' motion over the tick too (see
+    `swept_cell_size`); `swept_box_intersection` keeps the intersecting pairs.
+
+    :param grid: The grid indexing the entities
+    :param grid_x: The X coordinates of the entities indexed by the grid, at the end of the tick
+    :param grid_y: The Y coordinates of the entities indexed by the grid, at the end of the tick
+    :param grid_start_x: The X coordinates of the entities indexed by the grid, at the start of the tick
+    :param grid_start_y: The Y coordinates of the entities indexed by the grid, at the start of the tick
+    :param grid_radius: The radius of the entities indexed by the grid
+    :param x: The X coordinates of the query entities, at the end of the tick
+    :param y: The Y coordinates of the query entities, at the end of the tick
+    :param start_x: The X coordinates of the query entities, at the start of the tick
+    :param start_y: The Y coordinates of the query entities, at the start of the tick
+    :param radius: The radius of the query entities
+    :param groups: The groups of the query entities, all in group 0 if None
+    :return: The indices of the query entities and of the indexed entities of each pair
+    """
+    i, j = grid.candidates(x, y, groups)
+    if i.size == 0:
+        return i, j
+    hit = swept_box_intersection(x[i], y[i], start_x[i], start_y[i], radius,
+                                 grid_x[j], grid_y[j], grid_start_x[j], grid_start_y[j], grid_radius)
+    return i[hit], j[hit]
+
+
+def swept_cell_size(dt: float, max_relative_velocity: float = MAX_RELATIVE_VELOCITY) -> float:
+    """
+    Get the cells' side of the grids used by `swept_pairs`: entities intersecting during a tick lie, at its end, within
+    the largest radius plus their relative motion
+
+    :param dt: The tick's duration
+    :param max_relative_velocity: The largest relative velocity of two colliding entities (see
+    `EnvConfig.max_relative_velocity`)
+    :return: The cells' side
+    """
+    return CELL_SIZE + max_relative_velocity * dt
+
+
+def first_hits(i: np.ndarray, j: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair each entity of a side with at most one of the other: each i gets its first j, and each j only goes to its
+    first i
+
+    :param i: The first entities of the intersecting pairs
+    :param j: The second entities of the intersecting pairs
+    :return: The retained pairs
+    """
+    if i.size <= 1:
+        return i, j
+    order = np.lexsort((j, i))
+    i, j = i[order], j[order]
+    first = np.ones(i.size, dtype=np.bool_)
+    first[1:] = i[1:] != i[:-1]
+    i, j = i[first], j[first]
+    _, first = np.unique(j, return_index=True)
+    first.sort()
+    return i[first], j[first]
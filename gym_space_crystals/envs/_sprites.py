@@ -0,0 +1,133 @@
+import math
+from typing import TYPE_CHECKING, Dict, Set, Tuple
+
+import numpy as np
+import pyglet
+from gym.envs.classic_control import rendering
+
+from gym_space_crystals.envs._entities import Entity, EntityPool
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs._raster import LAYERS, read_png
+
+if TYPE_CHECKING:
+    from pyglet.image import Texture
+    from pyglet.sprite import Sprite
+
+# textures of the entities' images, per entity type: each image is read and uploaded once per process
+_TEXTURES = {}  # type: Dict[str, Texture]
+
+
+class SpriteBatch(rendering.Geom):
+    def __init__(self):
+        """
+        Create a viewer's geom drawing all the entities as sprites of a single pyglet batch.
+
+        Each pool slot gets its sprite the first time it is shown, then the sprite is only hidden and shown again: the
+        entities removed and spawned (e.g. at every reset) reuse their slots' sprites. Only the sprites of the entities
+        in view need to be shown (see `cull`), so that drawing a large world costs what is visible.
+        """
+        super(SpriteBatch, self).__init__()
+        # workaround to get the image colors to render correctly (https://github.com/openai/gym/issues/1994)
+        self.set_color(1., 1., 1.)
+        self.batch = pyglet.graphics.Batch()
+        # one group per entity type, drawn in the viewer's order
+        self.groups = {_type: pyglet.graphics.OrderedGroup(i) for i, _type in enumerate(LAYERS)}
+        self.sprites = {}  # type: Dict[Tuple[str, int], Sprite]
+        # slots of the shown sprites, per entity type
+        self.shown = {_type: set() for _type in LAYERS}  # type: Dict[str, Set[int]]
+
+    def render1(self):
+        self.batch.draw()
+
+    def show(self, entity: Entity):
+        """
+        Draw an entity, from its current position and rotation
+
+        :param entity: The entity
+        """
+        key = (entity._type, entity.index)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            texture = load_texture(entity._type)
+            sprite = pyglet.sprite.Sprite(texture, batch=self.batch, group=self.groups[entity._type], subpixel=True)
+            # the viewer draws the images as radius x radius squares
+            sprite.update(scale_x=entity.radius / texture.width, scale_y=entity.radius / texture.height)
+            self.sprites[key] = sprite
+        sprite.visible = True
+        self.shown[entity._type].add(entity.index)
+        self.move(entity.pool, [entity.index])
+
+    def hide(self, entity: Entity):
+        """
+        Stop drawing an entity
+
+        :param entity: The entity
+        """
+        sprite = self.sprites.get((entity._type, entity.index))
+        if sprite is not None:
+            sprite.visible = False
+        self.shown[entity._type].discard(entity.index)
+
+    def hide_all(self):
+        """
+        Stop drawing all the entities
+        """
+        for _type, shown in self.shown.items():
+            for i in shown:
+                self.sprites[(_type, i)].visible = False
+            shown.clear()
+
+    def cull(self, entities: EntityPool, indices: np.ndarray):
+        """
+        Draw only the given entities of a pool (e.g. the ones in view), from their current positions and rotations:
+        the cost depends on the entities shown now and at the previous call, not on the pool's size
+
+        :param entities: The entities' pool
+        :param indices: The slots of the entities to draw
+        """
+        shown = self.shown[entities._type]
+        visible = set(indices.tolist())
+        for i in shown - visible:
+            self.sprites[(entities._type, i)].visible = False
+        for i in visible - shown:
+            self.show(entities.entities[i])
+        self.shown[entities._type] = visible
+        self.move(entities, indices)
+
+    def move(self, entities: EntityPool, indices: np.ndarray = None):
+        """
+        Move the sprites of entities to their current positions and rotations
+
+        :param entities: The entities' pool
+        :param indices: The slots of the entities to move, all the alive ones if None
+        """
+        indices = entities.indices() if indices is None else np.asarray(indices)
+        sprites = self.sprites
+        for i, x, y, rotation in zip(indices.tolist(), entities.x[indices].tolist(), entities.y[indices].tolist(),
+                                     entities.rotation[indices].tolist()):
+            sprite = sprites.get((entities._type, i))
+            if sprite is not None:
+                # the entities turn counterclockwise in radians, the sprites clockwise in degrees
+                sprite.update(x=x, y=y, rotation=-math.degrees(rotation))
+
+
+# -- Functions --
+
+def load_texture(_type: str) -> 'Texture':
+    """
+    Get the texture of an entity type's image, loading it on first use
+
+    :param _type: The entity type
+    :return: The texture, anchored at its center
+    """
+    texture = _TEXTURES.get(_type)
+    if texture is None:
+        pixels = read_png(ENTITIES.get(_type).get('shape'))
+        height, width = pixels.shape[:2]
+        # the image's rows go top to bottom, OpenGL's bottom to top
+        image = pyglet.image.ImageData(width, height, 'RGBA', pixels.tobytes(), pitch=-width * 4)
+        texture = image.get_texture()
+        texture.anchor_x = width / 2
+        texture.anchor_y = height / 2
+        _TEXTURES[_type] = texture
+    return texture
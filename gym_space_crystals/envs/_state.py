@@ -0,0 +1,53 @@
+import numpy as np
+
+# header of the serialized state: sizes of the values, of the alive mask and of the generator's key, then the
+# generator's position and Gaussian flag
+_HEADER_SIZE = 5
+
+
+class EnvState:
+    __slots__ = ('values', 'alive', 'rng')
+
+    def __init__(self, values: np.ndarray, alive: np.ndarray, rng: tuple):
+        """
+        Create a snapshot of an environment's scene, as flat arrays
+
+        :param values: The scene's float values (episode's flags, observations and entities' fields)
+        :param alive: The entities' alive mask
+        :param rng: The random generator's state before the reset pool's current batch, as given by
+        `RandomState.get_state`
+        """
+        self.values = values
+        self.alive = alive
+        self.rng = rng
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the snapshot
+
+        :return: The bytes
+        """
+        name, key, pos, has_gauss, gauss = self.rng
+        assert name == 'MT19937'
+        header = np.array([self.values.size, self.alive.size, key.size, pos, has_gauss], dtype=np.int64)
+        return b''.join([header.tobytes(), np.float64(gauss).tobytes(), self.values.tobytes(), self.alive.tobytes(),
+                         key.astype(np.uint32).tobytes()])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'EnvState':
+        """
+        Deserialize a snapshot
+
+        :param data: The bytes, as given by `to_bytes`
+        :return: The snapshot
+        """
+        n_values, n_alive, n_key, pos, has_gauss = np.frombuffer(data, dtype=np.int64, count=_HEADER_SIZE)
+        offset = _HEADER_SIZE * 8
+        gauss = float(np.frombuffer(data, dtype=np.float64, count=1, offset=offset)[0])
+        offset += 8
+        values = np.frombuffer(data, dtype=np.float64, count=n_values, offset=offset).copy()
+        offset += values.nbytes
+        alive = np.frombuffer(data, dtype=np.bool_, count=n_alive, offset=offset).copy()
+        offset += alive.nbytes
+        key = np.frombuffer(data, dtype=np.uint32, count=n_key, offset=offset).copy()
+        return cls(values, alive, ('MT19937', key, int(pos), int(has_gauss), gauss))
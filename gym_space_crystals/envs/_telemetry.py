@@ -0,0 +1,128 @@
+import csv
+import os
+import time
+from typing import List
+
+import numpy as np
+
+# per-episode counters, one row each in `Telemetry.counters`
+COUNTERS = ['crystals_collected', 'enemies_killed', 'shots_fired', 'steps', 'return']
+CRYSTALS, ENEMIES, SHOTS, STEPS, RETURN = range(len(COUNTERS))
+# episodes' endings: the spaceship left the world, crashed into an enemy, collected all the crystals, or the scene was
+# reset before the end (e.g. by a time limit)
+ENDINGS = ['out_of_bounds', 'enemy', 'collected_all', 'truncated']
+ENDED_OUT_OF_BOUNDS, ENDED_ENEMY, ENDED_COLLECTED_ALL, ENDED_TRUNCATED = range(len(ENDINGS))
+# default minimum interval between two exports, in seconds
+TELEMETRY_INTERVAL = 10.
+# prefix of the exported metrics
+METRICS_PREFIX = 'space_crystals'
+
+
+class Telemetry:
+    def __init__(self, path: str, n_scenes: int = 1, interval: float = TELEMETRY_INTERVAL):
+        """
+        Count the events of the episodes of a batch of scenes, and export the totals of the ended episodes.
+
+        The environment adds each step's events to the running episodes' counters (preallocated, one column per
+        scene), and hands over the scenes whose episode ended to `end`, which adds their counters to the totals. The
+        totals are exported when an episode ends at least `interval` seconds after the previous export, and on
+        `close`: the Prometheus text format (for the node exporter's textfile collector) replaces `path`.prom, and a
+        row is appended to `path`.csv. The metrics are labelled with the file's name (source="..."), so that several
+        environments can export to the same directory.
+
+        :param path: The path of the exported files, without extension
+        :param n_scenes: The number of scenes
+        :param interval: The minimum interval between two exports, in seconds
+        """
+        self.path = path
+        self.interval = interval
+        self.source = os.path.basename(path)
+        # running episodes' counters and endings (the latter set when they end)
+        self.counters = np.zeros((len(COUNTERS), n_scenes))
+        self.endings = np.zeros(n_scenes, dtype=np.int64)
+        # ended episodes' totals
+        self.n_episodes = 0
+        self.totals = np.zeros(len(COUNTERS))
+        self.ended = np.zeros(len(ENDINGS), dtype=np.int64)
+        self.exported = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def episode(self, scene: int) -> dict:
+        """
+        Get the counters of a scene's episode, once it ended (before `end`)
+
+        :param scene: The scene's index
+        :return: The counters, and the episode's ending as 'ending'
+        """
+        values = dict(zip(COUNTERS, self.counters[:, scene].tolist()))
+        values['steps'] = int(values['steps'])
+        values['ending'] = ENDINGS[self.endings[scene]]
+        return values
+
+    def truncate(self, scenes: np.ndarray):
+        """
+        End the running episodes of scenes being reset before the end, if they have any step
+
+        :param scenes: The indices of the scenes being reset
+        """
+        scenes = scenes[self.counters[STEPS, scenes] > 0]
+        if scenes.size > 0:
+            self.endings[scenes] = ENDED_TRUNCATED
+            self.end(scenes)
+
+    def end(self, scenes: np.ndarray):
+        """
+        Add the ended episodes of scenes to the totals and start their new episode, exporting the totals if the last
+        export is old enough
+
+        :param scenes: The indices of the scenes whose episode ended, their ending being set in `endings`
+        """
+        self.n_episodes += len(scenes)
+        self.totals += self.counters[:, scenes].sum(axis=1)
+        self.ended += np.bincount(self.endings[scenes], minlength=len(ENDINGS))
+        self.counters[:, scenes] = 0
+        if time.monotonic() - self.exported >= self.interval:
+            self.export()
+
+    def export(self):
+        """
+        Export the totals of the ended episodes
+        """
+        self.exported = time.monotonic()
+        labels = 'source="%s"' % self.source
+        lines = []  # type: List[str]
+        for name, kind, description, samples in [
+            ('episodes_total', 'counter', 'Ended episodes.', [(labels, self.n_episodes)]),
+            ('episode_endings_total', 'counter', 'Ended episodes, by ending.',
+             [('%s,ending="%s"' % (labels, ending), n) for ending, n in zip(ENDINGS, self.ended.tolist())]),
+            ('crystals_collected_total', 'counter', 'Crystals collected in the ended episodes.',
+             [(labels, self.totals[CRYSTALS])]),
+            ('enemies_killed_total', 'counter', 'Enemies killed in the ended episodes.',
+             [(labels, self.totals[ENEMIES])]),
+            ('shots_fired_total', 'counter', 'Shots fired in the ended episodes.', [(labels, self.totals[SHOTS])]),
+            ('episode_steps_total', 'counter', 'Steps of the ended episodes.', [(labels, self.totals[STEPS])]),
+            ('episode_return_sum', 'gauge', 'Sum of the returns of the ended episodes.',
+             [(labels, self.totals[RETURN])])]:
+            lines.append('# HELP %s_%s %s' % (METRICS_PREFIX, name, description))
+            lines.append('# TYPE %s_%s %s' % (METRICS_PREFIX, name, kind))
+            lines += ['%s_%s{%s} %r' % (METRICS_PREFIX, name, sample_labels, float(value))
+                      for sample_labels, value in samples]
+        # replaced at once, so that the collector never reads a partial file
+        with open(self.path + '.prom.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(self.path + '.prom.tmp', self.path + '.prom')
+
+        new = not os.path.exists(self.path + '.csv')
+        with open(self.path + '.csv', 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(['time', 'episodes'] + ENDINGS + COUNTERS)
+            writer.writerow([time.time(), self.n_episodes] + self.ended.tolist() + self.totals.tolist())
+
+    def close(self):
+        """
+        Export the totals a last time
+        """
+        self.export()
@@ -0,0 +1,367 @@
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import struct
+import subprocess
+from typing import Callable, List, Optional, Tuple
+
+import gym
+import numpy as np
+from gym.error import DependencyNotInstalled
+
+# video formats: animated GIF (built-in encoder) or MP4 (through the ffmpeg executable)
+VIDEO_FORMATS = ['gif', 'mp4']
+# default number of frames in the ring buffer shared with the encoder
+FRAMES_CAPACITY = 32
+# default largest interval between recorded steps under back-pressure, before frames are dropped
+MAX_STRIDE = 8
+# GIF palette: the 6 x 6 x 6 color cube (the white background is exact), padded to 256 colors
+GIF_LEVELS = 6
+GIF_PALETTE = np.zeros((256, 3), dtype=np.uint8)
+GIF_PALETTE[:GIF_LEVELS ** 3] = np.stack(np.meshgrid(*[np.arange(GIF_LEVELS) * (255 // (GIF_LEVELS - 1))] * 3,
+                                                     indexing='ij'), axis=-1).reshape(-1, 3)
+# fastest GIF frame rate: delays under 2 hundredths of a second are slowed down by most viewers
+GIF_MAX_FPS = 50
+
+
+class VideoRecorder(gym.Wrapper):
+    def __init__(self, env: gym.Env, directory: str, video_format: str = 'gif', fps: float = 30,
+                 capacity: int = FRAMES_CAPACITY, every: int = 1, max_stride: int = MAX_STRIDE,
+                 episodes: Callable[[int], bool] = None, context: str = None):
+        """
+        Record episodes of an environment as videos, encoded by a background process so that the env loop never waits
+        for the encoder.
+
+        The 'rgb_array' frames are copied into a bounded ring buffer shared with the encoder process, which sends the
+        slots back once it has taken their frame. When the encoder falls behind (more than half of the ring in use),
+        the frames are recorded every other step, then every 4 steps and so on up to `max_stride`, coming back to
+        every step once it has caught up; when the ring is full, frames are dropped. The frames' durations follow the
+        steps they stand for, so that the videos keep their speed. The memory used is the ring, whatever the length
+        of the episodes.
+
+        :param env: The environment, rendering 'rgb_array' frames of a fixed size
+        :param directory: The directory to write the videos into (created if needed), one file per recorded episode
+        :param video_format: 'gif' for animated GIFs (built-in encoder, 6 x 6 x 6 color cube), 'mp4' for MP4 videos
+        (needs the ffmpeg executable)
+        :param fps: The number of steps per second of video
+        :param capacity: The number of frames in the ring buffer
+        :param every: Record a frame every `every` steps
+        :param max_stride: The largest interval between recorded steps under back-pressure
+        :param episodes: The function telling whether to record an episode from its index (from 0), all if None
+        :param context: The multiprocessing context (start method) of the encoder, the default one if None
+        """
+        super(VideoRecorder, self).__init__(env)
+        if video_format not in VIDEO_FORMATS:
+            raise ValueError('video_format must be one of %s, got %r' % (VIDEO_FORMATS, video_format))
+        if video_format == 'gif' and fps > GIF_MAX_FPS:
+            raise ValueError('GIF videos play at most %d fps, got %r' % (GIF_MAX_FPS, fps))
+        if video_format == 'mp4' and shutil.which('ffmpeg') is None:
+            raise DependencyNotInstalled('MP4 videos are encoded by ffmpeg, which was not found')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.video_format = video_format
+        self.fps = fps
+        self.capacity = capacity
+        self.every = every
+        self.max_stride = max(max_stride, every)
+        self.episodes = episodes
+        self.context = mp.get_context(context)
+        # interval between the recorded steps, adapted to the encoder's progress
+        self.stride = every
+        self.episode = -1
+        # paths of the videos, and number of frames recorded and dropped
+        self.videos = []  # type: List[str]
+        self.n_recorded = 0
+        self.n_dropped = 0
+        self._recording = False
+        self._step = 0
+        # ring buffer and encoder, created with the first frame
+        self._frames = None  # type: Optional[np.ndarray]
+        self._free = []  # type: List[int]
+        self._requests = self.context.Queue()
+        self._released = self.context.Queue()
+        self._encoder = None  # type: Optional[mp.Process]
+
+    def reset(self, **kwargs) -> np.ndarray:
+        observation = self.env.reset(**kwargs)
+        self._end_video()
+        self.episode += 1
+        if self.episodes is None or self.episodes(self.episode):
+            path = os.path.join(self.directory, 'episode_%06d.%s' % (self.episode, self.video_format))
+            self.videos.append(path)
+            self._requests.put(('start', path))
+            self._recording = True
+            self._step = 0
+            self._capture()
+        return observation
+
+    def step(self, action) -> Tuple[np.ndarray, float, bool, dict]:
+        observation, reward, done, info = self.env.step(action)
+        if self._recording:
+            self._step += 1
+            if self._step % self.stride == 0 or done:
+                self._capture()
+            if done:
+                self._end_video()
+        return observation, reward, done, info
+
+    def close(self):
+        """
+        Finish the current video, wait for the encoder to write all the videos and close the environment
+        """
+        self._end_video()
+        if self._encoder is not None:
+            self._requests.put(None)
+            self._encoder.join()
+            self._encoder = None
+        self._requests.close()
+        self._released.close()
+        super(VideoRecorder, self).close()
+
+    def _capture(self):
+        """
+        Render a frame into a free slot of the ring and hand it to the encoder, adapting the stride to the slots in
+        use, or drop it if there are none
+        """
+        # take back the slots the encoder is done with
+        try:
+            while True:
+                self._free.append(self._released.get_nowait())
+        except queue.Empty:
+            pass
+        in_use = self.capacity - len(self._free) if self._frames is not None else 0
+        if in_use > self.capacity // 2:
+            self.stride = min(self.stride * 2, self.max_stride)
+        elif in_use == 0:
+            self.stride = max(self.stride // 2, self.every)
+        if self._frames is not None and not self._free:
+            self.n_dropped += 1
+            return
+        frame = self.env.render('rgb_array')
+        if self._frames is None:
+            self._start_encoder(frame.shape)
+        slot = self._free.pop()
+        self._frames[slot] = frame
+        self._requests.put(('frame', slot, self._step))
+        self.n_recorded += 1
+
+    def _start_encoder(self, shape: tuple):
+        """
+        Create the ring buffer and start the encoder process
+
+        :param shape: The frames' shape (height, width, 3)
+        """
+        buffer = self.context.RawArray('B', self.capacity * int(np.prod(shape)))
+        self._frames = np.frombuffer(buffer, dtype=np.uint8).reshape((self.capacity,) + tuple(shape))
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._encoder = self.context.Process(target=_encode_videos, name='VideoRecorder',
+                                             args=(buffer, tuple(shape), self.fps, self._requests, self._released),
+                                             daemon=True)
+        self._encoder.start()
+
+    def _end_video(self):
+        """
+        Finish the current video, if any
+        """
+        if self._recording:
+            self._requests.put(('end', self._step + 1))
+            self._recording = False
+
+
+class GifWriter:
+    def __init__(self, path: str, width: int, height: int, fps: float):
+        """
+        Write an animated GIF, frame by frame (looping forever).
+
+        The frames are mapped to the 6 x 6 x 6 color cube and LZW-compressed, each with its own delay.
+
+        :param path: The file's path
+        :param width: The frames' width
+        :param height: The frames' height
+        :param fps: The number of steps per second
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.time = 0
+        self.file = open(path, 'wb')
+        # header, logical screen (global color table of 256 colors) and looping extension
+        self.file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0xf7, 0, 0) + GIF_PALETTE.tobytes())
+        self.file.write(b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def prepare(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Convert a frame to the GIF's colors (a copy, so that the frame's buffer can be reused)
+
+        :param frame: The frame, shape (height, width, 3)
+        :return: The colors' indices, shape (height, width)
+        """
+        return quantize(frame)
+
+    def write(self, indices: np.ndarray, duration: int):
+        """
+        Add a frame
+
+        :param indices: The prepared frame
+        :param duration: The number of steps the frame stands for
+        """
+        # delay in hundredths of a second, rounded without drifting
+        start = round(100 * self.time / self.fps)
+        self.time += duration
+        delay = round(100 * self.time / self.fps) - start
+        self.file.write(b'!\xf9\x04' + struct.pack('<BHBB', 0x04, delay, 0, 0))
+        self.file.write(b',' + struct.pack('<HHHHB', 0, 0, self.width, self.height, 0) + b'\x08')
+        data = lzw_encode(indices.tobytes())
+        self.file.write(b''.join(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255)))
+        self.file.write(b'\x00')
+
+    def close(self):
+        """
+        End the GIF
+        """
+        self.file.write(b';')
+        self.file.close()
+
+
+class Mp4Writer:
+    def __init__(self, path: str, width: int, height: int, fps: float):
+        """
+        Write an MP4 video, frame by frame, through an ffmpeg process (H.264)
+
+        :param path: The file's path
+        :param width: The frames' width
+        :param height: The frames' height
+        :param fps: The number of steps per second
+        """
+        self.process = subprocess.Popen(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                                         '-s', '%dx%d' % (width, height), '-r', str(fps), '-i', '-',
+                                         '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', path],
+                                        stdin=subprocess.PIPE)
+
+    def prepare(self, frame: np.ndarray) -> bytes:
+        """
+        Copy a frame, so that its buffer can be reused
+
+        :param frame: The frame, shape (height, width, 3)
+        :return: The frame's bytes
+        """
+        return frame.tobytes()
+
+    def write(self, frame: bytes, duration: int):
+        """
+        Add a frame, repeated for the steps it stands for
+
+        :param frame: The prepared frame
+        :param duration: The number of steps the frame stands for
+        """
+        for _ in range(duration):
+            self.process.stdin.write(frame)
+
+    def close(self):
+        """
+        End the video, waiting for ffmpeg to write it
+        """
+        self.process.stdin.close()
+        self.process.wait()
+
+
+# -- Functions --
+
+def quantize(frame: np.ndarray) -> np.ndarray:
+    """
+    Map the colors of a frame to the nearest ones of GIF_PALETTE
+
+    :param frame: The frame, shape (height, width, 3)
+    :return: The colors' indices, shape (height, width)
+    """
+    levels = (frame.astype(np.uint16) * (GIF_LEVELS - 1) + 127) // 255
+    return (levels[..., 0] * GIF_LEVELS ** 2 + levels[..., 1] * GIF_LEVELS + levels[..., 2]).astype(np.uint8)
+
+
+def lzw_encode(data: bytes, min_code_size: int = 8) -> bytes:
+    """
+    Compress the colors' indices of a GIF image with the GIF variant of LZW (variable-width codes, up to 12 bits,
+    packed least significant bit first)
+
+    :param data: The colors' indices, one byte each
+    :param min_code_size: The number of bits of the indices
+    :return: The compressed data, to be split into sub-blocks
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+    codes = [clear]
+    widths = [min_code_size + 1]
+    width = min_code_size + 1
+    next_code = end + 1
+    # (prefix code, byte) -> code, as prefix << 8 | byte
+    table = {}
+    prefix = data[0]
+    for byte in data[1:]:
+        key = (prefix << 8) | byte
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        codes.append(prefix)
+        widths.append(width)
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+            # the decoder widens its codes one code later, when its table reaches the same size
+            if next_code > (1 << width) and width < 12:
+                width += 1
+        else:
+            # full table: start over
+            codes.append(clear)
+            widths.append(width)
+            table = {}
+            next_code = end + 1
+            width = min_code_size + 1
+        prefix = byte
+    codes += [prefix, end]
+    widths += [width, width]
+    # pack the codes' bits, least significant first
+    codes = np.array(codes)
+    widths = np.array(widths)
+    bits = (codes[:, None] >> np.arange(12)) & 1
+    return np.packbits(bits[np.arange(12) < widths[:, None]].astype(np.uint8), bitorder='little').tobytes()
+
+
+def _encode_videos(buffer, shape: tuple, fps: float, requests: mp.Queue, released: mp.Queue):
+    """
+    Encode the videos requested by a `VideoRecorder`, until None is requested.
+
+    Each frame is held until the next one (or the end of its video) gives its duration, its slot being released as
+    soon as the frame is prepared.
+
+    :param buffer: The ring buffer's shared memory
+    :param shape: The frames' shape (height, width, 3)
+    :param fps: The number of steps per second
+    :param requests: The queue of ('start', path), ('frame', slot, step) and ('end', step) requests
+    :param released: The queue of the released slots
+    """
+    frames = np.frombuffer(buffer, dtype=np.uint8).reshape((-1,) + shape)
+    writer = None
+    held = None
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        if request[0] == 'start':
+            path = request[1]
+            writer_class = GifWriter if path.endswith('.gif') else Mp4Writer
+            writer = writer_class(path, shape[1], shape[0], fps)
+            held = None
+        elif request[0] == 'frame':
+            _, slot, step = request
+            if held is not None:
+                writer.write(held[0], step - held[1])
+            held = (writer.prepare(frames[slot]), step)
+            released.put(slot)
+        elif request[0] == 'end':
+            if held is not None:
+                writer.write(held[0], max(request[1] - held[1], 1))
+            writer.close()
+            writer = None
+            held = None
@@ -0,0 +1,395 @@
+import multiprocessing as mp
+import os
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import Callable, List, Sequence
+
+import numpy as np
+from gym import logger, spaces
+from gym.error import AlreadyPendingCallError, ClosedEnvironmentError, Error, NoAsyncCallError
+from gym.vector import VectorEnv
+from gym.vector.utils import CloudpickleWrapper
+
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+
+
+class WorkerCrashedError(Error):
+    """
+    Raised when a worker process dies while its environments are in use
+    """
+    def __init__(self, worker: int, exitcode: int):
+        super(WorkerCrashedError, self).__init__('Worker-%d died with exit code %s' % (worker, exitcode))
+        self.worker = worker
+        self.exitcode = exitcode
+
+
+class SpaceCrystalsAsyncVectorEnv(VectorEnv):
+    metadata = {'render.modes': []}
+
+    def __init__(self, env_fns: Sequence[Callable] = None, num_envs: int = None, n_workers: int = None,
+                 restart_crashed: bool = False, copy: bool = True, context: str = None, daemon: bool = True):
+        """
+        Create a batch of environments, stepped in parallel by a pool of worker processes.
+
+        Each worker owns a contiguous block of environments. Actions are read from, and observations, rewards and
+        dones written straight into, shared-memory arrays: a step only sends a command to each worker and receives
+        the (usually empty) infos back. Environments that end are automatically reset.
+
+        :param env_fns: The functions creating the environments, `num_envs` SpaceCrystalsEnv if None
+        :param num_envs: The number of environments when `env_fns` is None
+        :param n_workers: The number of worker processes, one per CPU (at most one per environment) if None
+        :param restart_crashed: Whether to restart the workers that die, ending the episodes of their environments,
+        rather than raising a `WorkerCrashedError`
+        :param copy: Whether to return a copy of the shared observations, rather than the shared array itself
+        :param context: The multiprocessing context (start method), the default one if None
+        :param daemon: Whether the workers are daemonic (they quit with the main process, but can't have children)
+        """
+        if env_fns is None:
+            if num_envs is None:
+                raise ValueError('Either env_fns or num_envs must be given')
+            env_fns = [SpaceCrystalsEnv] * num_envs
+        self.env_fns = list(env_fns)
+        self.restart_crashed = restart_crashed
+        self.copy = copy
+        self.daemon = daemon
+        self._ctx = mp.get_context(context)
+
+        dummy_env = self.env_fns[0]()
+        observation_space, action_space = dummy_env.observation_space, dummy_env.action_space
+        dummy_env.close()
+        super(SpaceCrystalsAsyncVectorEnv, self).__init__(len(self.env_fns), observation_space, action_space)
+
+        # shared step inputs and outputs, written by the workers in their own rows
+        obs_size = int(np.prod(observation_space.shape)) * observation_space.dtype.itemsize
+        self._buffers = (self._ctx.RawArray('b', self.num_envs * obs_size),  # observations, in their own dtype
+                         self._ctx.RawArray('d', self.num_envs),  # rewards
+                         self._ctx.RawArray('b', self.num_envs),  # dones
+                         self._ctx.RawArray('q', self.num_envs))  # actions
+        self.observations, self.rewards, self.dones, self._actions = _shared_arrays(self._buffers, self.num_envs,
+                                                                                    observation_space)
+
+        # contiguous blocks of environments per worker
+        n_workers = min(n_workers or os.cpu_count() or 1, self.num_envs)
+        self.blocks = [(int(block[0]), int(block[-1]) + 1)
+                       for block in np.array_split(np.arange(self.num_envs), n_workers)]
+        self.pipes = [None] * n_workers  # type: List[mp.connection.Connection]
+        self.processes = [None] * n_workers  # type: List[mp.Process]
+        self._seeds = [None] * self.num_envs
+        self._pending = None
+        for worker in range(n_workers):
+            self._start_worker(worker)
+        # wait for the environments to be created and reset
+        self._pending = 'start'
+        self._receive_all()
+
+    @property
+    def n_workers(self) -> int:
+        """
+        The number of worker processes
+        """
+        return len(self.blocks)
+
+    def seed(self, seeds=None):
+        """
+        Fix the random seeds for reproducibility
+        :param seeds: A seed per environment, or a single one (the environments get consecutive seeds)
+        """
+        self._assert_is_idle('seed')
+        if seeds is None or isinstance(seeds, int):
+            seeds = [None if seeds is None else seeds + i for i in range(self.num_envs)]
+        assert len(seeds) == self.num_envs
+        self._seeds = list(seeds)
+        self._send_all('seed')
+        return [seed for worker_seeds in self._receive_all() for seed in worker_seeds]
+
+    def reset_async(self):
+        """
+        Start resetting all the environments
+        """
+        self._assert_is_idle('reset_async')
+        self._send_all('reset')
+
+    def reset_wait(self, timeout: float = None, **kwargs):
+        """
+        Wait for all the environments to be reset
+        :param timeout: The number of seconds to wait for, forever if None
+        :return: The batch of observations
+        """
+        self._assert_is_pending('reset', 'reset_wait')
+        self._receive_all(timeout)
+        self.dones[:] = False
+        return np.copy(self.observations) if self.copy else self.observations
+
+    def step_async(self, actions):
+        """
+        Start stepping all the environments
+        :param actions: The batch of actions
+        """
+        self._assert_is_idle('step_async')
+        self._actions[:] = actions
+        self._send_all('step')
+
+    def step_wait(self, timeout: float = None, **kwargs):
+        """
+        Wait for all the environments to be stepped.
+
+        Environments that end are reset: their observation is the one of the new episode, while the last observation
+        of the ended episode is available in the infos as 'terminal_observation'. The environments of a restarted
+        worker end their episode with 'worker_restarted' in their infos.
+        :param timeout: The number of seconds to wait for, forever if None
+        :return: observations, rewards, dones, infos
+        """
+        self._assert_is_pending('step', 'step_wait')
+        infos = [{} for _ in range(self.num_envs)]
+        for worker_infos in self._receive_all(timeout):
+            for i, info in worker_infos.items():
+                infos[i] = info
+        return (np.copy(self.observations) if self.copy else self.observations,
+                np.copy(self.rewards), np.copy(self.dones), infos)
+
+    def close_extras(self, timeout: float = None, terminate: bool = False):
+        """
+        Shut the workers down, terminating them if they don't answer
+        :param timeout: The number of seconds to wait for a pending call and for the workers to quit, forever if None
+        :param terminate: Whether to terminate the workers right away
+        """
+        if self._pending is not None and not terminate:
+            logger.warn('Calling `close` while waiting for a pending call to `%s` to complete.' % self._pending)
+            try:
+                self._receive_all(timeout)
+            except (mp.TimeoutError, Error) as error:
+                logger.warn('Terminating the workers: %s' % error)
+                terminate = True
+        if not terminate:
+            self._send_all('close')
+            try:
+                self._receive_all(timeout)
+            except (mp.TimeoutError, Error):
+                terminate = True
+        for worker, process in enumerate(self.processes):
+            if process is None:
+                continue
+            if terminate and process.is_alive():
+                process.terminate()
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            if self.pipes[worker] is not None:
+                self.pipes[worker].close()
+        self.pipes = [None] * self.n_workers
+        self.processes = [None] * self.n_workers
+        self._pending = None
+
+    # -- Workers --
+
+    def _start_worker(self, worker: int):
+        """
+        Start (or restart) a worker process, with its environments reset
+        :param worker: The worker's index
+        """
+        start, stop = self.blocks[worker]
+        parent_pipe, child_pipe = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker, name='Worker<%s>-%d' % (type(self).__name__, worker),
+                                    args=(start, stop, CloudpickleWrapper(self.env_fns[start:stop]), child_pipe,
+                                          parent_pipe, self._buffers, self.num_envs,
+                                          self.single_observation_space, self._seeds[start:stop]))
+        process.daemon = self.daemon
+        process.start()
+        child_pipe.close()
+        self.pipes[worker] = parent_pipe
+        self.processes[worker] = process
+
+    def _send_all(self, command: str):
+        """
+        Send a command to all the workers
+        :param command: The command
+        """
+        self._assert_is_running()
+        data = None
+        for worker, pipe in enumerate(self.pipes):
+            if command == 'seed':
+                data = self._seeds[slice(*self.blocks[worker])]
+            try:
+                pipe.send((command, data))
+            except (BrokenPipeError, ConnectionResetError):
+                # the worker is dead: the crash is handled while receiving
+                pass
+        self._pending = command
+
+    def _receive_all(self, timeout: float = None) -> list:
+        """
+        Wait for the results of the pending command from all the workers, handling the crashed ones
+        :param timeout: The number of seconds to wait for, forever if None
+        :return: The result of each worker
+        """
+        command, self._pending = self._pending, None
+        results = [None] * self.n_workers
+        waiting = {self.pipes[worker]: worker for worker in range(self.n_workers)}
+        waiting.update({self.processes[worker].sentinel: worker for worker in range(self.n_workers)})
+        deadline = None if timeout is None else time.monotonic() + timeout
+        crashed = []
+        errors = []
+        while waiting:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready = wait(list(waiting), remaining)
+            if not ready:
+                raise mp.TimeoutError('The call to `%s` has timed out after %s second(s).' % (command, timeout))
+            for handle in ready:
+                worker = waiting.get(handle)
+                if worker is None or results[worker] is not None or worker in crashed:
+                    continue
+                pipe = self.pipes[worker]
+                try:
+                    if not pipe.poll():
+                        # the process ended without answering
+                        raise EOFError
+                    result, success = pipe.recv()
+                except (EOFError, ConnectionResetError):
+                    crashed.append(worker)
+                else:
+                    if success:
+                        results[worker] = result
+                    else:
+                        errors.append((worker, result))
+                for key in [key for key, value in waiting.items() if value == worker]:
+                    del waiting[key]
+
+        for worker, (exctype, message) in errors:
+            logger.error('Received the following error from Worker-%d: %s: %s' % (worker, exctype.__name__, message))
+            logger.error('Shutting down Worker-%d.' % worker)
+            self.processes[worker].join()
+        if errors and command not in ('start', 'close'):
+            # the workers with an error have quit: bring them back so that the environment stays usable
+            for worker, _ in errors:
+                self._start_worker(worker)
+                self._wait_started(worker)
+        if errors:
+            exctype, message = errors[-1][1]
+            raise exctype(message)
+
+        for worker in crashed:
+            process = self.processes[worker]
+            process.join()
+            if not self.restart_crashed or command == 'close':
+                if command != 'close':
+                    raise WorkerCrashedError(worker, process.exitcode)
+                continue
+            logger.warn('Worker-%d died with exit code %s, restarting it.' % (worker, process.exitcode))
+            self._start_worker(worker)
+            results[worker] = self._restarted_result(worker, command)
+        return results
+
+    def _wait_started(self, worker: int):
+        """
+        Wait for a (re)started worker to have reset its environments
+        :param worker: The worker's index
+        """
+        result, success = self.pipes[worker].recv()
+        if not success:
+            exctype, message = result
+            raise exctype(message)
+
+    def _restarted_result(self, worker: int, command: str):
+        """
+        Stand in for the result of a command sent to a worker that crashed and was restarted
+        :param worker: The worker's index
+        :param command: The command
+        :return: The result
+        """
+        self._wait_started(worker)
+        start, stop = self.blocks[worker]
+        if command == 'step':
+            # the episodes of the worker's environments ended with the crash
+            self.rewards[start:stop] = 0.
+            self.dones[start:stop] = True
+            return {i: {'worker_restarted': True} for i in range(start, stop)}
+        if command == 'seed':
+            return self._seeds[start:stop]
+        return None
+
+    def _assert_is_running(self):
+        if self.closed:
+            raise ClosedEnvironmentError('Trying to operate on `%s`, after a call to `close()`.' % type(self).__name__)
+
+    def _assert_is_idle(self, call: str):
+        self._assert_is_running()
+        if self._pending is not None:
+            raise AlreadyPendingCallError('Calling `%s` while waiting for a pending call to `%s` to complete.' %
+                                          (call, self._pending), self._pending)
+
+    def _assert_is_pending(self, command: str, call: str):
+        self._assert_is_running()
+        if self._pending != command:
+            raise NoAsyncCallError('Calling `%s` without any prior call to `%s_async`.' % (call, command), command)
+
+
+# -- Functions --
+
+def _shared_arrays(buffers: tuple, num_envs: int, observation_space: spaces.Box) -> tuple:
+    """
+    Wrap the shared buffers into arrays
+    :param buffers: The observations, rewards, dones and actions buffers
+    :param num_envs: The number of environments
+    :param observation_space: The space of an observation
+    :return: The observations, rewards, dones and actions arrays
+    """
+    observations, rewards, dones, actions = buffers
+    return (np.frombuffer(observations, dtype=observation_space.dtype).reshape((num_envs,) + observation_space.shape),
+            np.frombuffer(rewards, dtype=np.float64),
+            np.frombuffer(dones, dtype=np.bool_),
+            np.frombuffer(actions, dtype=np.int64))
+
+
+def _worker(start: int, stop: int, env_fns: CloudpickleWrapper, pipe, parent_pipe, buffers: tuple, num_envs: int,
+            observation_space: spaces.Box, seeds: list):
+    """
+    Run the environments [start, stop) of a batch, answering the commands of the main process.
+
+    Each command is answered with a (result, success) pair; on error the result is the exception type and message,
+    and the worker quits.
+    """
+    parent_pipe.close()
+    observations, rewards, dones, actions = _shared_arrays(buffers, num_envs, observation_space)
+    envs = []
+    try:
+        envs = [env_fn() for env_fn in env_fns.fn]
+        # without seeds, the environments would all share their default one: seed them from the system's entropy
+        for env, seed in zip(envs, seeds):
+            env.seed(seed)
+        for i, env in enumerate(envs, start):
+            observations[i] = env.reset()
+        pipe.send((None, True))
+        while True:
+            command, data = pipe.recv()
+            if command == 'step':
+                infos = {}
+                for i, env in enumerate(envs, start):
+                    observation, rewards[i], dones[i], info = env.step(int(actions[i]))
+                    if dones[i]:
+                        info = dict(info, terminal_observation=np.copy(observation))
+                        observation = env.reset()
+                    observations[i] = observation
+                    if info:
+                        infos[i] = info
+                pipe.send((infos, True))
+            elif command == 'reset':
+                for i, env in enumerate(envs, start):
+                    observations[i] = env.reset()
+                pipe.send((None, True))
+            elif command == 'seed':
+                pipe.send(([env.seed(seed)[0] for env, seed in zip(envs, data)], True))
+            elif command == 'close':
+                pipe.send((None, True))
+                break
+            else:
+                raise RuntimeError('Received unknown command `%s`. Must be one of {`step`, `reset`, `seed`, '
+                                   '`close`}.' % command)
+    except (KeyboardInterrupt, Exception):
+        exctype, value = sys.exc_info()[:2]
+        pipe.send(((exctype, str(value)), False))
+    finally:
+        for env in envs:
+            env.close()
+        pipe.close()
@@ -1,48 +1,125 @@
+from typing import TYPE_CHECKING
+
 import gym
 import numpy as np
 from gym import spaces, logger
 from gym.utils import seeding
 
+from gym_space_crystals.envs._config import EnvConfig, as_config
 from gym_space_crystals.envs._entities import *
+from gym_space_crystals.envs._occupancy import GRID_SIZE, OBSERVATION_MODES, OccupancyGrid
+from gym_space_crystals.envs._profiling import Profiler
+from gym_space_crystals.envs._raster import Rasterizer, view_origin
+from gym_space_crystals.envs._reset_pool import RESET_POOL_SIZE, ResetPool
+from gym_space_crystals.envs._sensors import ObservationEncoding, choose_caster
+from gym_space_crystals.envs._spatial import SpatialHash, first_hits, swept_cell_size, swept_pairs
+from gym_space_crystals.envs._state import EnvState
+from gym_space_crystals.envs._telemetry import (COUNTERS, CRYSTALS, ENDED_COLLECTED_ALL, ENDED_ENEMY,
+                                                 ENDED_OUT_OF_BOUNDS, ENDED_TRUNCATED, ENEMIES, RETURN, SHOTS, STEPS,
+                                                 TELEMETRY_INTERVAL, Telemetry)
+
+if TYPE_CHECKING:
+    from gym_space_crystals.envs._sprites import SpriteBatch
+
+# leading values of a state snapshot: spaceship's acceleration, reward, done, steps_beyond_done (-1 for None) and
+# position in the reset pool
+STATE_HEADER_SIZE = 5
+# ways of returning the frames of the ticks of a step
+FRAME_POOLINGS = [None, 'max', 'stack']
 
 
 def init_scene(env: gym.Env):
     """
-    Initialize the scene for the environment
+    Initialize the scene for the environment, loading the next initial scene of its reset pool.
+
+    The entities' storage is created, with the entity parameters, the first time only and then reused: all the
+    pools share a single storage, so that the scene is copied at once by `clone_state`.
 
     :param env: The environment
     """
+    if env.spaceship is None:
+        env.scene_values, env.scene_alive, pools = make_pools([('spaceship', 1, Spaceship),
+                                                               ('crystal', env.n_crystals, Crystal),
+                                                               ('enemy', env.n_enemies, Enemy),
+                                                               ('bullet', bullets_capacity(*env.world_size, env.dt),
+                                                                Bullet)],
+                                                              env.config)
+        spaceships, env.crystals, env.enemies, env.bullets = pools
+        env.spaceship = spaceships.entities[0]
     # clean existing scene
-    env.spaceship = None
-    env.crystals = []
-    env.enemies = []
-    env.bullets = []
+    env.spaceship.pool.clear()
+    env.crystals.clear()
+    env.enemies.clear()
+    env.bullets.clear()
 
     # initialize the scene
-    # add the spaceship
-    env.spaceship = Spaceship(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-
-    # add the crystals
-    for _ in range(ENVIRONMENT.get('n_crystals')):
-        env.crystals.append(
-            Crystal(np.random.normal(ENVIRONMENT.get('crystals_mean_1'), ENVIRONMENT.get('crystals_std_1'), 1),
-                    np.random.normal(ENVIRONMENT.get('crystals_mean_2'), ENVIRONMENT.get('crystals_std_2'), 1))
-        )
-    # add the enemies
-    for _ in range(ENVIRONMENT.get('n_enemies')):
-        env.enemies.append(
-            Enemy(np.random.normal(ENVIRONMENT.get('enemies_mean_1'), ENVIRONMENT.get('enemies_std_1'), 1),
-                  np.random.normal(ENVIRONMENT.get('enemies_mean_2'), ENVIRONMENT.get('enemies_std_2'), 1))
-        )
+    # add the spaceship, at the center of the world
+    env.spaceship.pool.spawn(env.world_size[0] / 2, env.world_size[1] / 2, 0, 0)
+    env.spaceship.acceleration = env.spaceship.pool.initial_acceleration
 
+    # add the crystals and the enemies
+    crystals_x, crystals_y, enemies_x, enemies_y = env.reset_pool.take()
+    env.crystals.spawn_many(crystals_x[0], crystals_y[0])
+    env.enemies.spawn_many(enemies_x[0], enemies_y[0])
+    # crystals don't move: index them once
+    env.crystals_grid = SpatialHash(env.crystals.x, env.crystals.y, cell_size=env.cell_size)
+    env.enemies_grid = None
 
-class SpaceCrystalsEnv(gym.Env):
-    metadata = {'render.modes': ['human']}
 
-    def __init__(self, draw_lines: bool = False):
+class SpaceCrystalsEnv(gym.Env):
+    metadata = {'render.modes': ['human', 'rgb_array']}
+
+    def __init__(self, draw_lines: bool = False, n_observations: int = N_OBSERVATIONS,
+                 reset_pool_size: int = RESET_POOL_SIZE, profile: bool = False,
+                 render_size: Tuple[int, int] = (SCREEN_WIDTH, SCREEN_HEIGHT), frame_skip: int = 1,
+                 frame_pooling: Optional[str] = None, dt: float = 1., dtype: str = 'float64',
+                 observation_mode: str = 'rays', grid_size: Tuple[int, int] = GRID_SIZE, grid_ego: bool = False,
+                 world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT), n_crystals: int = None,
+                 n_enemies: int = None, telemetry: str = None, telemetry_interval: float = TELEMETRY_INTERVAL,
+                 config: EnvConfig = None, sensor_range: float = None):
         """
         Create the environment
+
+        :param draw_lines: Draw the sensor rays hitting an entity when rendering
+        :param n_observations: The number of sensor rays, evenly spread around the spaceship
+        :param reset_pool_size: The number of initial scenes drawn at once from the environment's random generator
+        :param profile: Time the phases of `step` and `reset` and count the entities, reporting each step in the infos
+        as 'profile' and the totals through `profile_stats`
+        :param render_size: The (width, height) of the 'rgb_array' frames
+        :param frame_skip: The number of physics ticks per step, the action being repeated at each tick
+        :param frame_pooling: Also render the ticks of each step, returned in the infos as 'frame': 'max' for a single
+        frame max-pooled over the ticks (the entities' pixels, darker than the white background, are kept), 'stack'
+        for the frames of all the ticks, shape (frame_skip, height, width, 3); None not to render them
+        :param dt: The duration of a physics tick: the entities move by their velocity times `dt` per tick, and the
+        collisions are swept over the tick, so that longer ticks give fewer ticks per episode with the same gameplay
+        :param dtype: The observations' dtype: 'float64', 'float32', or 'uint8' / 'uint16' for observations quantized
+        over the features' ranges (see `ObservationEncoding`)
+        :param observation_mode: 'rays' for the spaceship's status and the sensor rays, 'grid' for a top-down occupancy
+        grid of the scene, shape (channels, height, width), one channel per entity type (see `OccupancyGrid`)
+        :param grid_size: The (width, height) of the occupancy grid, in cells
+        :param grid_ego: Centre the occupancy grid on the spaceship, with an extra channel for the cells out of the
+        world
+        :param world_size: The (width, height) of the world, the window's by default: in larger worlds, the entities
+        are spread over the world, the spaceship starts at its center and the renderers draw a window-sized view
+        following it, culled to the entities in view
+        :param n_crystals: The number of crystals per scene, overriding the config's if not None
+        :param n_enemies: The number of enemies per scene, overriding the config's if not None
+        :param telemetry: The path (without extension) to export the episodes' telemetry to, None not to count it:
+        the episodes' crystals collected, enemies killed, shots fired, steps, return and ending, reported in the infos
+        as 'telemetry' at the end of each episode, their totals being exported as .prom and .csv files (see
+        `Telemetry`)
+        :param telemetry_interval: The minimum interval between two exports of the telemetry, in seconds
+        :param config: The environment's parameters (entities' counts, spawn distributions and motion, rewards), or
+        their mapping, the defaults if None (see `EnvConfig`)
+        :param sensor_range: The sensor rays' range, normalizing the distances they sense: the world's diagonal if
+        None, so that they see the whole world; a ray seeing nothing within it reports the border at its distance
         """
+        if frame_skip < 1:
+            raise ValueError('frame_skip must be at least 1, got %r' % frame_skip)
+        if frame_pooling not in FRAME_POOLINGS:
+            raise ValueError('frame_pooling must be one of %s, got %r' % (FRAME_POOLINGS, frame_pooling))
+        if observation_mode not in OBSERVATION_MODES:
+            raise ValueError('observation_mode must be one of %s, got %r' % (OBSERVATION_MODES, observation_mode))
         # all available actions
         # int -> function
         self.actions = {
@@ -54,39 +131,88 @@ class SpaceCrystalsEnv(gym.Env):
         }
 
         self.draw_lines = draw_lines
+        self.frame_skip = frame_skip
+        self.frame_pooling = frame_pooling
+        self.dt = dt
+        # the collision grids' cells cover the entities' motion over a tick
+        self.config = as_config(config, n_crystals, n_enemies)
+        self.cell_size = swept_cell_size(dt, self.config.max_relative_velocity)
+        self.n_observations = n_observations
+        self.world_size = tuple(world_size)
+        # whether the view follows the spaceship, rather than being the window-sized world
+        self.camera = self.world_size != (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.n_crystals = self.config.n_crystals
+        self.n_enemies = self.config.n_enemies
+        self._cast_rays = choose_caster(1, n_observations, self.n_crystals + self.n_enemies)
 
         # action space depends on number of possible actions
         self.action_space = spaces.Discrete(len(self.actions))
-        # observation space
-        self.observation_space = spaces.Box(np.zeros(3 + N_OBSERVATIONS * 2),
-                                            np.ones(3 + N_OBSERVATIONS * 2),
-                                            dtype=np.float64)
-        # current state
-        self.state = None
+        # observation space, and how the observations are written in it
+        self.encoding = ObservationEncoding(dtype, diagonal(*self.world_size), sensor_range)
+        self.observation_mode = observation_mode
+        self.occupancy = None  # type: Optional[OccupancyGrid]
+        if observation_mode == 'grid':
+            self.occupancy = OccupancyGrid(*grid_size, ego=grid_ego, dtype=self.encoding.dtype,
+                                           occupied=self.encoding.maximum, world_size=self.world_size)
+            self.observation_space = self.encoding.grid_space(self.occupancy.grids.shape[1:])
+            # current state: the grid builder's buffer
+            self.state = self.occupancy.grids[0]
+        else:
+            self.observation_space = self.encoding.space(n_observations)
+            # current state
+            self.state = np.zeros(3 + n_observations * 2, dtype=self.encoding.dtype)
         # incremental angle for observations
-        self.dtheta = math.radians(360 / N_OBSERVATIONS)
+        self.dtheta = math.radians(360 / n_observations)
         # flag for end of episode
         self.done = False
         # flag for executions after end of episode
         self.steps_beyond_done = None
 
         # scene's entities
-        self.spaceship = None
-        self.crystals = []
-        self.enemies = []
-        self.bullets = []
+        self.spaceship = None  # type: Spaceship
+        self.crystals = None  # type: EntityPool
+        self.enemies = None  # type: EntityPool
+        self.bullets = None  # type: EntityPool
+        self.crystals_grid = None  # type: SpatialHash
+        # grid of the enemies alive at the last tick, and their slots (None until a tick)
+        self.enemies_grid = None  # type: Optional[SpatialHash]
+        self.grid_enemies = None  # type: np.ndarray
+        # storage shared by all the entities' pools
+        self.scene_values = None  # type: np.ndarray
+        self.scene_alive = None  # type: np.ndarray
 
         self.reward = 0
 
-        # renderer
+        # renderers: the viewer (window) and the offscreen rasterizer, created on first use
         self.viewer = None
+        self.sprites = None  # type: SpriteBatch
+        self.render_size = render_size
+        self.rasterizer = None  # type: Rasterizer
+
+        # profiler of the step and reset phases, None when off
+        self.profiler = Profiler() if profile else None  # type: Optional[Profiler]
+        # episodes' telemetry, None when off, and the running episode's counters (a list, faster to update than the
+        # telemetry's array)
+        self.telemetry = None  # type: Optional[Telemetry]
+        self._counters = None  # type: Optional[List[float]]
+        if telemetry is not None:
+            self.telemetry = Telemetry(telemetry, interval=telemetry_interval)
+            self._counters = [0.] * len(COUNTERS)
 
         # random seed fixing
         self.np_random = None
+        # initial scenes, drawn from np_random
+        self.reset_pool_size = reset_pool_size
+        self.reset_pool = None  # type: ResetPool
         self.seed(10072020)
 
         # initialize the scene
         init_scene(self)
+        # sensed entities (crystals then enemies) properties
+        self._sensed_radii = np.repeat([self.crystals.radius, self.enemies.radius],
+                                       [self.crystals.capacity, self.enemies.capacity]).astype(np.float64)
+        self._sensed_values = np.repeat([self.crystals.value, self.enemies.value],
+                                        [self.crystals.capacity, self.enemies.capacity]).astype(np.float64)
 
     def seed(self, seed: int = None):
         """
@@ -94,75 +220,62 @@ class SpaceCrystalsEnv(gym.Env):
         :param seed: Random seed
         """
         self.np_random, seed = seeding.np_random(seed)
+        if self.reset_pool is None:
+            self.reset_pool = ResetPool(self.np_random, self.n_crystals, self.n_enemies, self.reset_pool_size,
+                                        self.world_size, self.config)
+        else:
+            self.reset_pool.seed(self.np_random)
         return [seed]
 
     def step(self, action: int):
         """
-        Apply a single step in the environment using the given action
+        Apply a single step in the environment using the given action.
+
+        With frame skipping, the action is repeated for `frame_skip` physics ticks (stopping early at the end of the
+        episode), the rewards of the ticks are summed and the observations are computed once, after the last tick.
         :param action: The action to apply
         """
         # sanity check for the action
         err_msg = "%r (%s) invalid" % (action, type(action))
         assert self.action_space.contains(action), err_msg
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start('step', 'actions')
+        infos = {}
 
         # execute the action if possible
         if not self.done:
-            self.reward = MOVED
-            # apply action
-            if action is not None:
-                self.actions.get(action)()
-
-            # update positions
-            self.spaceship.advance()
-            for bullet in self.bullets:
-                bullet.advance()
-                self.check_bounds(bullet, self.bullets)
-            for enemy in self.enemies:
-                enemy.advance(self.spaceship.x, self.spaceship.y)
-                self.check_bounds(enemy, self.enemies)
-
-            # remove crystals if collected
-            for crystal in self.crystals:
-                if entity_intersection(self.spaceship, crystal):
-                    self.crystals.remove(crystal)
-                    self.viewer.geoms.remove(crystal.shape)
-                    self.reward += GOT_CRYSTAL
-
-            # remove enemies if hit by bullet
-            for enemy in self.enemies:
-                for bullet in self.bullets:
-                    if entity_intersection(enemy, bullet):
-                        self.bullets.remove(bullet)
-                        self.viewer.geoms.remove(bullet.shape)
-                        self.enemies.remove(enemy)
-                        self.viewer.geoms.remove(enemy.shape)
-                        # increment reward
-                        self.reward += KILLED_ENEMY
-                        break  # no need to check for other bullets hitting the same enemy
-
-            # remove spaceship if out of bounds or collided with enemy
-            if self.spaceship.x >= SCREEN_WIDTH or self.spaceship.y >= SCREEN_HEIGHT or \
-                    self.spaceship.x <= 0.0 or self.spaceship.y <= 0.0:
-                self.done = True  # terminate session
-                self.viewer.geoms.remove(self.spaceship.shape)
-                # decrease reward
-                self.reward += DIED
-            else:
-                for enemy in self.enemies:
-                    if entity_intersection(self.spaceship, enemy):
-                        self.done = True  # terminate session
-                        self.viewer.geoms.remove(self.spaceship.shape)
-                        # decrease reward
-                        self.reward += DIED
-                        break  # no need to check for other enemies hitting the spaceship
-
-            # check end of episode
-            if len(self.crystals) == 0:
-                self.reward += COLLECTED_ALL
-                self.done = True
-
+            reward = 0.
+            frames = []
+            for _ in range(self.frame_skip):
+                self.tick(action)
+                reward += self.reward
+                if self.frame_pooling is not None:
+                    if profiler is not None:
+                        profiler.enter('frames')
+                    frames.append(self.render('rgb_array').copy())
+                if self.done:
+                    break
+            self.reward = reward
+
+            if self.frame_pooling is not None:
+                infos['frame'] = pool_frames(frames, self.frame_pooling, self.frame_skip)
+
+            if self._counters is not None:
+                self._counters[STEPS] += 1
+                self._counters[RETURN] += reward
+                if self.done:
+                    infos['telemetry'] = self.end_telemetry()
+
+            if profiler is not None:
+                profiler.enter('observations')
             self.make_observations()
 
+            if profiler is not None:
+                profiler.count('crystals', len(self.crystals))
+                profiler.count('enemies', len(self.enemies))
+                profiler.count('bullets', len(self.bullets))
+
         # allow one more step after done
         elif self.steps_beyond_done is None:
             self.steps_beyond_done = 0
@@ -178,135 +291,376 @@ class SpaceCrystalsEnv(gym.Env):
 
         # end of step()
         # return observations, reward, done, infos
-        return self.state, self.reward, self.done, {}
+        if profiler is not None:
+            infos['profile'] = profiler.stop()
+        return self.state, self.reward, self.done, infos
+
+    def tick(self, action: int):
+        """
+        Advance the scene by one physics tick (action, movements, bounds and collisions), without computing the
+        observations: the tick's reward is left in `reward`
+        :param action: The action to apply
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter('actions')
+        config = self.config
+        self.reward = config.moved * self.dt
+        # apply action
+        if action is not None:
+            self.actions.get(action)()
+
+        # update positions, from the start positions of the tick
+        if profiler is not None:
+            profiler.enter('advance')
+        spaceship_start_x = np.array([self.spaceship.x])
+        spaceship_start_y = np.array([self.spaceship.y])
+        bullets_start_x, bullets_start_y = self.bullets.x.copy(), self.bullets.y.copy()
+        enemies_start_x, enemies_start_y = self.enemies.x.copy(), self.enemies.y.copy()
+        self.spaceship.advance(self.dt)
+        Bullet.advance_all(self.bullets, self.dt)
+        Enemy.advance_all(self.enemies, self.spaceship.x, self.spaceship.y, self.dt)
+        if profiler is not None:
+            profiler.enter('bounds')
+        bullets_out = self.check_bounds(self.bullets)
+        enemies_out = self.check_bounds(self.enemies)
+
+        spaceship_x = np.array([self.spaceship.x])
+        spaceship_y = np.array([self.spaceship.y])
+
+        # remove crystals if collected
+        if profiler is not None:
+            profiler.enter('crystals')
+        _, collected = swept_pairs(self.crystals_grid, self.crystals.x, self.crystals.y, self.crystals.x,
+                                   self.crystals.y, self.crystals.radius, spaceship_x, spaceship_y, spaceship_start_x,
+                                   spaceship_start_y, self.spaceship.radius)
+        collected = collected[self.crystals.alive[collected]]
+        self.remove_entities(self.crystals, collected)
+        self.reward += config.got_crystal * len(collected)
+
+        # index the enemies for the next collision checks
+        if profiler is not None:
+            profiler.enter('bullets')
+        enemies = self.enemies.indices()
+        enemies_x, enemies_y = self.enemies.x[enemies], self.enemies.y[enemies]
+        enemies_start_x, enemies_start_y = enemies_start_x[enemies], enemies_start_y[enemies]
+        enemies_grid = SpatialHash(enemies_x, enemies_y, cell_size=self.cell_size)
+        # kept for culling the enemies in view
+        self.enemies_grid, self.grid_enemies = enemies_grid, enemies
+
+        # remove enemies if hit by bullet
+        hit, bullets = self.bullet_hits(enemies, enemies_grid, enemies_start_x, enemies_start_y, bullets_start_x,
+                                        bullets_start_y)
+        self.remove_entities(self.enemies, hit)
+        self.remove_entities(self.bullets, bullets)
+        self.reward += config.killed_enemy * len(hit)
+
+        # remove spaceship if out of bounds or collided with enemy
+        if profiler is not None:
+            profiler.enter('enemies')
+        _, crashed = swept_pairs(enemies_grid, enemies_x, enemies_y, enemies_start_x, enemies_start_y,
+                                 self.enemies.radius, spaceship_x, spaceship_y, spaceship_start_x, spaceship_start_y,
+                                 self.spaceship.radius)
+        out = not in_bounds(self.spaceship.x, self.spaceship.y, *self.world_size)
+        died = out or np.any(self.enemies.alive[enemies[crashed]])
+        if died:
+            self.done = True  # terminate session
+            self.remove_entities(self.spaceship.pool, np.array([self.spaceship.index]))
+            # decrease reward
+            self.reward += config.died
+
+        # check end of episode
+        if len(self.crystals) == 0:
+            self.reward += config.collected_all
+            self.done = True
+
+        counters = self._counters
+        if counters is not None:
+            counters[CRYSTALS] += len(collected)
+            counters[ENEMIES] += len(hit)
+            if self.done:
+                self.telemetry.endings[0] = ENDED_OUT_OF_BOUNDS if out else ENDED_ENEMY if died else ENDED_COLLECTED_ALL
+
+        if profiler is not None:
+            profiler.count('ticks', 1)
+            profiler.count('crystals_collected', len(collected))
+            profiler.count('enemies_killed', len(hit))
+            profiler.count('enemies_out', enemies_out)
+            profiler.count('bullets_hit', len(bullets))
+            profiler.count('bullets_out', bullets_out)
 
     def reset(self):
         """
         Reset the current scene, computing the observations
         :return: The state observations
         """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start('reset', 'scene')
         # reset the scene
+        if self._counters is not None and self._counters[STEPS] > 0:
+            self.end_telemetry()
         init_scene(self)
         self.done = False
         self.steps_beyond_done = None
+        if profiler is not None:
+            profiler.enter('geoms')
         self.reset_geoms()
         # compute obs
+        if profiler is not None:
+            profiler.enter('observations')
         self.make_observations()
+        if profiler is not None:
+            profiler.stop()
         return self.state
 
     def render(self, mode='human'):
         """
-        Render the current state of the scene
+        Render the current state of the scene.
+
+        The 'rgb_array' frames are drawn offscreen, without a display, into a buffer overwritten at every call: copy
+        them to keep past frames. Both modes draw a window-sized view of the world following the spaceship (the
+        whole window for the default world), with only the entities in view.
         :param mode: The rendering mode to use
         """
+        pools = [self.spaceship.pool, self.crystals, self.enemies, self.bullets]
+        if self.camera:
+            origins = view_origin(np.array([self.spaceship.x]), np.array([self.spaceship.y]), *self.world_size)
+            visible = [self.in_view(pool, origins[0][0], origins[1][0]) for pool in pools]
+        else:
+            # the view is the world: all the entities are in view
+            origins = None
+            visible = [pool.indices() for pool in pools]
+        if mode == 'rgb_array':
+            if self.rasterizer is None:
+                self.rasterizer = Rasterizer(*self.render_size)
+            return self.rasterizer.render([layer(pool, i) for pool, i in zip(pools, visible)], origins)[0]
+
         if self.viewer is None:
+            # import the renderer only when drawing, so the simulation runs without a display
+            from gym.envs.classic_control import rendering
+            from gym_space_crystals.envs._sprites import SpriteBatch
             self.viewer = rendering.Viewer(SCREEN_WIDTH, SCREEN_HEIGHT)
-            self.reset_geoms()
+            self.sprites = SpriteBatch()
+            self.viewer.add_geom(self.sprites)
 
-        return self.viewer.render(return_rgb_array=mode == 'rgb_array')
+        # show the sprites of the entities in view, in their current state
+        if origins is not None:
+            left, bottom = origins[0][0], origins[1][0]
+            self.viewer.set_bounds(left, left + SCREEN_WIDTH, bottom, bottom + SCREEN_HEIGHT)
+        for entities, i in zip(pools, visible):
+            self.sprites.cull(entities, i)
+
+        return self.viewer.render()
 
     def close(self):
         """
-        Terminate the episode
+        Terminate the episode, exporting the telemetry
         """
+        if self.telemetry is not None:
+            self.telemetry.close()
         if self.viewer:
             self.viewer.close()
             self.viewer = None
+            self.sprites = None
+
+    def end_telemetry(self) -> dict:
+        """
+        Hand over the running episode's counters to the telemetry, as truncated if it isn't done
+        :return: The episode's counters, as reported in the infos
+        """
+        telemetry = self.telemetry
+        if not self.done:
+            telemetry.endings[0] = ENDED_TRUNCATED
+        telemetry.counters[:, 0] = self._counters
+        self._counters[:] = [0.] * len(COUNTERS)
+        episode = telemetry.episode(0)
+        telemetry.end(np.zeros(1, dtype=np.int64))
+        return episode
+
+    def profile_stats(self) -> Optional[dict]:
+        """
+        Get the aggregated profile of the `step` and `reset` calls since the profiler was created or cleared
+        (`env.profiler.clear()`)
+        :return: For `step` and `reset`: the number of calls, the total, mean and share of time of each phase, and
+        the total and mean entities counts; None if profiling is off
+        """
+        return None if self.profiler is None else self.profiler.stats()
+
+    def clone_state(self) -> EnvState:
+        """
+        Take a snapshot of the scene: the entities, the episode's flags, the reward, the observations and the position
+        in the sequence of initial scenes.
+
+        The entities are copied from their shared storage at once, and the renderer objects are left out. The random
+        generator is only drawn from by the reset pool, so its state is the one before the pool's current batch,
+        shared by the snapshots.
+        :return: The snapshot
+        """
+        n_state = self.state.size
+        values = np.empty(STATE_HEADER_SIZE + n_state + self.scene_values.size)
+        values[:STATE_HEADER_SIZE] = (self.spaceship.acceleration, self.reward, self.done,
+                                      -1 if self.steps_beyond_done is None else self.steps_beyond_done,
+                                      self.reset_pool.cursor)
+        values[STATE_HEADER_SIZE:STATE_HEADER_SIZE + n_state] = self.state.ravel()
+        values[STATE_HEADER_SIZE + n_state:] = self.scene_values.ravel()
+        return EnvState(values, self.scene_alive.copy(), self.reset_pool.batch_state)
+
+    def restore_state(self, state: EnvState):
+        """
+        Restore a snapshot of the scene taken by `clone_state`, without rebuilding the renderer objects
+        :param state: The snapshot
+        """
+        n_state = self.state.size
+        acceleration, self.reward, done, steps_beyond_done, cursor = state.values[:STATE_HEADER_SIZE].tolist()
+        self.spaceship.acceleration = acceleration
+        self.done = bool(done)
+        self.steps_beyond_done = None if steps_beyond_done < 0 else int(steps_beyond_done)
+        self.state[...] = state.values[STATE_HEADER_SIZE:STATE_HEADER_SIZE + n_state].reshape(self.state.shape)
+        self.scene_values.ravel()[:] = state.values[STATE_HEADER_SIZE + n_state:]
+        self.scene_alive[:] = state.alive
+        for pool in [self.spaceship.pool, self.crystals, self.enemies, self.bullets]:
+            pool.sync()
+        self.crystals_grid = SpatialHash(self.crystals.x, self.crystals.y, cell_size=self.cell_size)
+        self.enemies_grid = None
+        self.reset_pool.restore(state.rng, int(cursor))
+        self.reset_geoms()
 
     # -- Sugar coding functions
 
-    def check_bounds(self, entity: Entity, arr: list):
+    def check_bounds(self, entities: EntityPool) -> int:
+        """
+        Check which entities are within the world bounds and remove the others from the scene
+        :param entities: The entities' pool
+        :return: The number of removed entities
+        """
+        i = entities.indices()
+        out = i[~in_bounds(entities.x[i], entities.y[i], *self.world_size)]
+        self.remove_entities(entities, out)
+        return out.size
+
+    def bullet_hits(self, enemies: np.ndarray, enemies_grid: SpatialHash, enemies_start_x: np.ndarray,
+                    enemies_start_y: np.ndarray, bullets_start_x: np.ndarray,
+                    bullets_start_y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the enemies hit by a bullet during the tick.
+
+        Each enemy is hit by the first bullet intersecting it; a bullet intersecting more enemies only hits the first.
+        :param enemies: The slots of the alive enemies
+        :param enemies_grid: The grid indexing the alive enemies
+        :param enemies_start_x: The alive enemies' X coordinates at the start of the tick
+        :param enemies_start_y: The alive enemies' Y coordinates at the start of the tick
+        :param bullets_start_x: The X coordinates of all the bullets' slots at the start of the tick
+        :param bullets_start_y: The Y coordinates of all the bullets' slots at the start of the tick
+        :return: The slots of the enemies hit and of the bullets hitting them
         """
-        Check if an entity is within the window bounds and remove it from the scene in case it is
-        :param entity: The entity to check
-        :param arr: The array of the entity type
+        bullets = self.bullets.indices()
+        b, e = swept_pairs(enemies_grid, self.enemies.x[enemies], self.enemies.y[enemies], enemies_start_x,
+                           enemies_start_y, self.enemies.radius, self.bullets.x[bullets], self.bullets.y[bullets],
+                           bullets_start_x[bullets], bullets_start_y[bullets], self.bullets.radius)
+        e, b = first_hits(e, b)
+        return enemies[e], bullets[b]
+
+    def remove_entities(self, entities: EntityPool, indices: np.ndarray):
         """
-        if entity.x >= SCREEN_WIDTH or entity.y >= SCREEN_HEIGHT or entity.x <= 0.0 or entity.y <= 0.0:
-            # remove it from the scene
-            arr.remove(entity)
-            # remove it from the renderer
-            self.viewer.geoms.remove(entity.shape)
+        Remove entities from the scene and from the renderer
+        :param entities: The entities' pool
+        :param indices: The slots of the entities to remove
+        """
+        if indices.size > 0:
+            entities.kill(indices)
+            if self.viewer:
+                phase = self.profiler.enter('geoms') if self.profiler is not None else None
+                for i in indices:
+                    self.remove_geom(entities.entities[i])
+                if phase is not None:
+                    self.profiler.enter(phase)
+
+    def add_geom(self, entity: Entity):
+        """
+        Add an entity's sprite to the renderer, if any
+        :param entity: The entity to add
+        """
+        if self.viewer:
+            self.sprites.show(entity)
+
+    def remove_geom(self, entity: Entity):
+        """
+        Remove an entity's sprite from the renderer, if any
+        :param entity: The entity to remove
+        """
+        if self.viewer:
+            self.sprites.hide(entity)
 
     def reset_geoms(self):
         """
-        Reset the entities in the renderer
+        Reset the entities in the renderer: all the sprites are hidden, those of the entities in view being shown again
+        by the next `render` (the sprites are reused, no image is loaded again)
         """
         if self.viewer:
-            self.viewer.geoms = []
-            # add spaceship
-            self.viewer.add_geom(self.spaceship.shape)
-            # add crystals
-            for crystal in self.crystals:
-                self.viewer.add_geom(crystal.shape)
-            # add enemies
-            for enemy in self.enemies:
-                self.viewer.add_geom(enemy.shape)
-            # add bullets
-            for bullet in self.bullets:
-                self.viewer.add_geom(bullet.shape)
+            self.sprites.hide_all()
+
+    def in_view(self, entities: EntityPool, left: float, bottom: float) -> np.ndarray:
+        """
+        Cull the alive entities of a pool to the ones drawn in a window-sized view.
+
+        The crystals and the enemies are found through their collision grids, visiting only the cells in view.
+        :param entities: The entities' pool
+        :param left: The X coordinate of the view's left side
+        :param bottom: The Y coordinate of the view's bottom side
+        :return: The slots of the entities in view (or whose sprite overlaps it), in increasing order
+        """
+        # the sprites, radius x radius squares, overlap the view when their center is within a radius of it
+        box = (left - entities.radius, bottom - entities.radius, left + SCREEN_WIDTH + entities.radius,
+               bottom + SCREEN_HEIGHT + entities.radius)
+        if entities is self.crystals:
+            i = np.sort(self.crystals_grid.in_box(*box))
+        elif entities is self.enemies and self.enemies_grid is not None:
+            i = self.grid_enemies[np.sort(self.enemies_grid.in_box(*box))]
+        else:
+            i = entities.indices()
+            x, y = entities.x[i], entities.y[i]
+            return i[(x >= box[0]) & (x <= box[2]) & (y >= box[1]) & (y <= box[3])]
+        return i[entities.alive[i]]
 
     # -- Interacting with the environment --
 
     def make_observations(self):
         """
-        Compute all observations, updating the state
+        Compute all observations, updating the state.
+
+        The state buffer is allocated once and overwritten at every call: copy it to keep past observations.
         """
-        # reset state
-        self.state = np.zeros(3 + N_OBSERVATIONS * 2)
+        if self.occupancy is not None:
+            # centred on the spaceship's last position, even once it died
+            self.occupancy.render([layer(pool) for pool in [self.spaceship.pool, self.crystals, self.enemies,
+                                                            self.bullets]],
+                                  centers=(np.array([self.spaceship.x]), np.array([self.spaceship.y])))
+            return
         # spaceship status
-        self.state[0] = self.spaceship.x / DIAG
-        self.state[1] = self.spaceship.y / DIAG
-        self.state[2] = self.spaceship.rotation / math.radians(360)
-        # make observations
-        alpha = 0
-        for i in range(3, 3 + N_OBSERVATIONS * 2 - 1, 2):
-            x = self.spaceship.x + (max(SCREEN_HEIGHT, SCREEN_WIDTH)) * math.cos(
-                self.spaceship.rotation + alpha * self.dtheta)
-            y = self.spaceship.y + (max(SCREEN_HEIGHT, SCREEN_WIDTH)) * math.sin(
-                self.spaceship.rotation + alpha * self.dtheta)
-
-            # check for crystals
-            for crystal in self.crystals:
-                t, d = line_entity_intersection((self.spaceship.x, self.spaceship.y), (x, y), crystal)
-                if t != 0.0:
-                    self.state[i] = t
-                    self.state[i + 1] = d / DIAG
-
-                    # debugging lines
-                    if self.viewer and self.draw_lines:
-                        line = self.viewer.draw_line((self.spaceship.x, self.spaceship.y), (crystal.x, crystal.y))
-                        line.set_color(0., 0., 1.)
-                        self.viewer.add_onetime(line)
-
-            # check for enemies
-            for enemy in self.enemies:
-                t, d = line_entity_intersection((self.spaceship.x, self.spaceship.y), (x, y), enemy)
-                if t != 0.0:
-                    if self.state[i] != 0.0:
-                        if self.state[i + 1] > d:
-                            self.state[i] = t
-                            self.state[i + 1] = d / DIAG
-                            # debugging lines
-                            if self.viewer and self.draw_lines:
-                                line = self.viewer.draw_line((self.spaceship.x, self.spaceship.y), (enemy.x, enemy.y))
-                                line.set_color(1., 0., 0.)
-                                self.viewer.add_onetime(line)
-
-                    else:
-                        self.state[i] = t
-                        self.state[i + 1] = d / DIAG
-                        # debugging lines
-                        if self.viewer and self.draw_lines:
-                            line = self.viewer.draw_line((self.spaceship.x, self.spaceship.y), (enemy.x, enemy.y))
-                            line.set_color(1., 0., 0.)
-                            self.viewer.add_onetime(line)
-
-            # else, set border distance
-            if self.state[i] == 0.0:
-                self.state[i] = BORDER_VALUE
-                self.state[i + 1] = border_distance(self.spaceship.x, self.spaceship.y,
-                                                    self.spaceship.rotation + i * self.dtheta) / DIAG
-            alpha += 1
+        spaceship = np.array([self.spaceship.x, self.spaceship.y, self.spaceship.rotation])
+        self.state[:3] = self.encoding.status(spaceship[0:1], spaceship[1:2], spaceship[2:3])[0]
+        # make observations: ray-cast against crystals and enemies
+        seen = self._cast_rays(spaceship[0:1], spaceship[1:2], spaceship[2:3],
+                               np.concatenate((self.crystals.x, self.enemies.x))[None],
+                               np.concatenate((self.crystals.y, self.enemies.y))[None],
+                               np.concatenate((self.crystals.alive, self.enemies.alive))[None],
+                               self._sensed_radii, self._sensed_values, self.n_observations, self.state[None, 3:],
+                               self.encoding, self.world_size)[0]
+
+        # debugging lines
+        if self.viewer and self.draw_lines:
+            for k in seen[seen >= 0]:
+                if k < self.crystals.capacity:
+                    entity = self.crystals.entities[k]
+                else:
+                    entity = self.enemies.entities[k - self.crystals.capacity]
+                line = self.viewer.draw_line((self.spaceship.x, self.spaceship.y), (entity.x, entity.y))
+                if entity.pool is self.crystals:
+                    line.set_color(0., 0., 1.)
+                else:
+                    line.set_color(1., 0., 0.)
+                self.viewer.add_onetime(line)
 
     # -- Spaceship's actions --
 
@@ -338,9 +692,41 @@ class SpaceCrystalsEnv(gym.Env):
         """
         Shoot a bullet from the spaceship
 
-        The bullet is added to the scene
+        The bullet is added to the scene, and the shot is charged, unless the bullets' pool is full
         """
-        self.reward -= SHOT
-        bullet = self.spaceship.shoot()
-        self.bullets.append(bullet)
-        self.viewer.add_geom(bullet.shape)
+        bullet = self.spaceship.shoot(self.bullets)
+        if bullet is None:
+            return
+        self.reward -= self.config.shot
+        if self._counters is not None:
+            self._counters[SHOTS] += 1
+        self.add_geom(bullet)
+
+
+# -- Functions --
+
+def layer(entities: EntityPool, indices: np.ndarray = None) -> tuple:
+    """
+    Get the alive entities of a pool as a layer of the rasterizer
+
+    :param entities: The entities' pool
+    :param indices: The slots of the entities, all the alive ones if None
+    :return: The layer
+    """
+    i = entities.indices() if indices is None else indices
+    return entities._type, np.zeros(i.size, dtype=np.int64), entities.x[i], entities.y[i], entities.rotation[i]
+
+
+def pool_frames(frames: List[np.ndarray], pooling: str, n: int) -> np.ndarray:
+    """
+    Pool the frames of the ticks of a step
+
+    :param frames: The frames, at least one
+    :param pooling: 'max' to keep the entities' pixels of all the frames, 'stack' to stack them
+    :param n: The number of stacked frames, the last frame being repeated if there are fewer (early end of episode)
+    :return: The pooled frame, shape (height, width, 3), or the stacked frames, shape (n, height, width, 3)
+    """
+    if pooling == 'max':
+        # the entities are darker than the white background
+        return np.minimum.reduce(frames)
+    return np.stack(frames + frames[-1:] * (n - len(frames)))
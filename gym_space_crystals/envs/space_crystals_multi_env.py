@@ -0,0 +1,342 @@
+from typing import TYPE_CHECKING
+
+import gym
+import numpy as np
+from gym import spaces, logger
+from gym.utils import seeding
+
+from gym_space_crystals.envs._config import EnvConfig, as_config
+from gym_space_crystals.envs._entities import *
+from gym_space_crystals.envs._raster import Rasterizer
+from gym_space_crystals.envs._reset_pool import RESET_POOL_SIZE, ResetPool
+from gym_space_crystals.envs._sensors import ObservationEncoding, choose_caster
+from gym_space_crystals.envs._spatial import SpatialHash, first_hits, swept_cell_size, swept_pairs
+from gym_space_crystals.envs.space_crystals_env import layer
+
+if TYPE_CHECKING:
+    from gym_space_crystals.envs._sprites import SpriteBatch
+
+# number of actions of each agent, as in SpaceCrystalsEnv: accelerate, decelerate, rotate cw, rotate ccw, shoot
+N_ACTIONS = 5
+
+
+class SpaceCrystalsMultiAgentEnv(gym.Env):
+    metadata = {'render.modes': ['human', 'rgb_array']}
+
+    def __init__(self, n_agents: int = 2, n_observations: int = N_OBSERVATIONS, reset_pool_size: int = RESET_POOL_SIZE,
+                 render_size: Tuple[int, int] = (SCREEN_WIDTH, SCREEN_HEIGHT), dt: float = 1., dtype: str = 'float64',
+                 n_crystals: int = None, n_enemies: int = None, config: EnvConfig = None):
+        """
+        Create a scene shared by several spaceships, one per agent, for self-play and cooperative runs.
+
+        The agents collect the same crystals and face the same enemies, each enemy homing on its nearest spaceship.
+        A step takes one action per agent and returns one observation, reward and done per agent (as SpaceCrystalsEnv
+        does for its spaceship): the spaceships, bullets and enemies are advanced together, the collision grids are
+        built once and queried by all the spaceships and bullets at once, and the sensor rays of all the agents are
+        cast in a single batch, so that the cost of a step grows slowly with the number of agents.
+
+        An agent is done when its spaceship dies (its actions are then ignored, and it observes from where it died),
+        and the episode ends when all the spaceships are dead or all the crystals are collected (rewarding the
+        surviving agents). The rewards of crystals and enemies go to the agent collecting or shooting them.
+
+        :param n_agents: The number of agents, the spaceships starting spread around the window's center
+        :param n_observations: The number of sensor rays, evenly spread around each spaceship
+        :param reset_pool_size: The number of initial scenes drawn at once from the environment's random generator
+        :param render_size: The (width, height) of the 'rgb_array' frames
+        :param dt: The duration of a physics tick, as for SpaceCrystalsEnv
+        :param dtype: The observations' dtype, as for SpaceCrystalsEnv
+        :param n_crystals: The number of crystals, overriding the config's if not None
+        :param n_enemies: The number of enemies, overriding the config's if not None
+        :param config: The environment's parameters, as for SpaceCrystalsEnv (shared by all the agents)
+        """
+        if n_agents < 1:
+            raise ValueError('n_agents must be at least 1, got %r' % n_agents)
+        self.n_agents = n_agents
+        self.n_observations = n_observations
+        self.dt = dt
+        self.config = as_config(config, n_crystals, n_enemies)
+        # the collision grids' cells cover the entities' motion over a tick
+        self.cell_size = swept_cell_size(dt, self.config.max_relative_velocity)
+        self.n_crystals = self.config.n_crystals
+        self.n_enemies = self.config.n_enemies
+        self._cast_rays = choose_caster(n_agents, n_observations, self.n_crystals + self.n_enemies)
+
+        # spaces of an agent, and of the agents together
+        self.encoding = ObservationEncoding(dtype)
+        self.single_observation_space = self.encoding.space(n_observations)
+        self.single_action_space = spaces.Discrete(N_ACTIONS)
+        shape = (n_agents,) + self.single_observation_space.shape
+        self.observation_space = spaces.Box(np.broadcast_to(self.single_observation_space.low, shape),
+                                            np.broadcast_to(self.single_observation_space.high, shape),
+                                            dtype=self.encoding.dtype)
+        self.action_space = spaces.MultiDiscrete([N_ACTIONS] * n_agents)
+
+        # scene's entities, all the pools sharing a single storage
+        self.scene_values, self.scene_alive, pools = make_pools([
+            ('spaceship', n_agents, Spaceship), ('crystal', self.n_crystals, Crystal),
+            ('enemy', self.n_enemies, Enemy),
+            ('bullet', n_agents * bullets_capacity(SCREEN_WIDTH, SCREEN_HEIGHT, dt), Bullet)], self.config)
+        self.spaceships, self.crystals, self.enemies, self.bullets = pools
+        # the spaceships' accelerations (impulses of the current tick), and the agents shooting each bullet
+        self.accelerations = np.zeros(n_agents)
+        self.bullet_owners = np.zeros(self.bullets.capacity, dtype=np.int64)
+        self.crystals_grid = None  # type: SpatialHash
+        # starting positions and rotations of the spaceships: on a sunflower spiral around the window's center, about
+        # a diameter apart (closer when they wouldn't fit in the window), facing outwards
+        k = np.arange(n_agents)
+        angles = k * (np.pi * (3 - np.sqrt(5))) % (2 * np.pi)
+        distances = min(2 * self.spaceships.radius, 0.4 * SCREEN_HEIGHT / np.sqrt(n_agents)) * np.sqrt(k)
+        self._start = (SCREEN_WIDTH / 2 + distances * np.cos(angles), SCREEN_HEIGHT / 2 + distances * np.sin(angles),
+                       angles)
+
+        # sensed entities (crystals then enemies) properties
+        self._sensed_radii = np.repeat([self.crystals.radius, self.enemies.radius],
+                                       [self.crystals.capacity, self.enemies.capacity]).astype(np.float64)
+        self._sensed_values = np.repeat([self.crystals.value, self.enemies.value],
+                                        [self.crystals.capacity, self.enemies.capacity]).astype(np.float64)
+
+        # step outputs
+        self.state = np.zeros(self.observation_space.shape, dtype=self.encoding.dtype)
+        self.rewards = np.zeros(n_agents)
+        self.dones = np.zeros(n_agents, dtype=np.bool_)
+        # flag for end of episode, and for executions after it
+        self.done = False
+        self.steps_beyond_done = None
+
+        # renderers: the viewer (window) and the offscreen rasterizer, created on first use
+        self.viewer = None
+        self.sprites = None  # type: SpriteBatch
+        self.render_size = render_size
+        self.rasterizer = None  # type: Rasterizer
+
+        # random seed fixing
+        self.np_random = None
+        # initial scenes, drawn from np_random
+        self.reset_pool_size = reset_pool_size
+        self.reset_pool = None  # type: ResetPool
+        self.seed(10072020)
+        self.init_scene()
+
+    def seed(self, seed: int = None):
+        """
+        Fix the random seed for reproducibility
+        :param seed: Random seed
+        """
+        self.np_random, seed = seeding.np_random(seed)
+        if self.reset_pool is None:
+            self.reset_pool = ResetPool(self.np_random, self.n_crystals, self.n_enemies, self.reset_pool_size,
+                                        config=self.config)
+        else:
+            self.reset_pool.seed(self.np_random)
+        return [seed]
+
+    def init_scene(self):
+        """
+        Initialize the scene, loading the next initial scene of the reset pool
+        """
+        for pool in [self.spaceships, self.crystals, self.enemies, self.bullets]:
+            pool.clear()
+        x, y, rotation = self._start
+        self.spaceships.spawn_batch(x, y, rotation, np.zeros(self.n_agents))
+        self.accelerations[:] = self.spaceships.initial_acceleration
+        crystals_x, crystals_y, enemies_x, enemies_y = self.reset_pool.take()
+        self.crystals.spawn_many(crystals_x[0], crystals_y[0])
+        self.enemies.spawn_many(enemies_x[0], enemies_y[0])
+        # crystals don't move: index them once
+        self.crystals_grid = SpatialHash(self.crystals.x, self.crystals.y, cell_size=self.cell_size)
+        self.dones[:] = False
+        self.done = False
+        self.steps_beyond_done = None
+
+    def step(self, actions: np.ndarray):
+        """
+        Apply a single step in the scene using the agents' actions
+        :param actions: The action of each agent (ignored for the agents that are done)
+        :return: The agents' observations, rewards and dones, and the infos
+        """
+        actions = np.asarray(actions)
+        # sanity check for the actions
+        assert actions.shape == (self.n_agents,) and np.all((actions >= 0) & (actions < N_ACTIONS)), \
+            "%r invalid" % actions
+
+        if not self.done:
+            self.tick(actions)
+            self.make_observations()
+
+        # allow one more step after done
+        elif self.steps_beyond_done is None:
+            self.steps_beyond_done = 0
+            self.rewards[:] = 0.
+
+        # emit a warning for repetitions after done
+        else:
+            if self.steps_beyond_done == 0:
+                logger.warn("You called the 'step()' function after the environment ended. Use 'reset()' when you "
+                            "receive 'done = True' for all the agents!")
+            self.steps_beyond_done += 1
+            self.rewards[:] = 0.
+
+        return self.state, self.rewards.copy(), self.dones.copy(), {}
+
+    def tick(self, actions: np.ndarray):
+        """
+        Advance the scene by one physics tick (actions, movements, bounds and collisions), without computing the
+        observations: the agents' rewards are left in `rewards`, their dones in `dones`
+        :param actions: The action of each agent
+        """
+        ships = self.spaceships
+        alive = ships.alive.copy()
+        self.rewards[:] = self.config.moved * self.dt * alive
+
+        # apply the actions of the agents still playing
+        self.accelerations += ships.acceleration * ((actions == 0) & alive)
+        self.accelerations -= ships.acceleration * ((actions == 1) & alive)
+        ships.rotation += ships.step_rotation * (((actions == 2) & alive).astype(np.float64) - ((actions == 3) & alive))
+        self.shoot(np.flatnonzero((actions == 4) & alive))
+
+        # update positions, from the start positions of the tick
+        agents = ships.indices()
+        ships_start_x, ships_start_y = ships.x[agents], ships.y[agents]
+        bullets_start_x, bullets_start_y = self.bullets.x.copy(), self.bullets.y.copy()
+        enemies_start_x, enemies_start_y = self.enemies.x.copy(), self.enemies.y.copy()
+        Spaceship.advance_all(ships, self.accelerations, self.dt)
+        Bullet.advance_all(self.bullets, self.dt)
+        ships_x, ships_y = ships.x[agents], ships.y[agents]
+        if agents.size > 0:
+            # each enemy homes on its nearest spaceship
+            i = self.enemies.indices()
+            target = nearest(self.enemies.x[i], self.enemies.y[i], ships_x, ships_y)
+            Enemy.advance_all(self.enemies, ships_x[target], ships_y[target], self.dt)
+        self.check_bounds(self.bullets)
+        self.check_bounds(self.enemies)
+
+        # remove the crystals collected, each by the first spaceship reaching it
+        ship, collected = swept_pairs(self.crystals_grid, self.crystals.x, self.crystals.y, self.crystals.x,
+                                      self.crystals.y, self.crystals.radius, ships_x, ships_y, ships_start_x,
+                                      ships_start_y, ships.radius)
+        ship, collected = ship[self.crystals.alive[collected]], collected[self.crystals.alive[collected]]
+        collected, first = np.unique(collected, return_index=True)
+        self.crystals.kill(collected)
+        self.rewards += self.config.got_crystal * np.bincount(agents[ship[first]], minlength=self.n_agents)
+
+        # index the enemies once for the bullets and the spaceships
+        enemies = self.enemies.indices()
+        enemies_x, enemies_y = self.enemies.x[enemies], self.enemies.y[enemies]
+        enemies_start_x, enemies_start_y = enemies_start_x[enemies], enemies_start_y[enemies]
+        enemies_grid = SpatialHash(enemies_x, enemies_y, cell_size=self.cell_size)
+
+        # remove enemies if hit by bullet, rewarding the shooters
+        bullets = self.bullets.indices()
+        b, e = swept_pairs(enemies_grid, enemies_x, enemies_y, enemies_start_x, enemies_start_y, self.enemies.radius,
+                           self.bullets.x[bullets], self.bullets.y[bullets], bullets_start_x[bullets],
+                           bullets_start_y[bullets], self.bullets.radius)
+        e, b = first_hits(e, b)
+        self.enemies.kill(enemies[e])
+        self.bullets.kill(bullets[b])
+        self.rewards += self.config.killed_enemy * np.bincount(self.bullet_owners[bullets[b]], minlength=self.n_agents)
+
+        # remove the spaceships out of bounds or collided with an enemy
+        crashed, e = swept_pairs(enemies_grid, enemies_x, enemies_y, enemies_start_x, enemies_start_y,
+                                 self.enemies.radius, ships_x, ships_y, ships_start_x, ships_start_y, ships.radius)
+        died = ~in_bounds(ships_x, ships_y)
+        died[crashed[self.enemies.alive[enemies[e]]]] = True
+        died = agents[died]
+        ships.kill(died)
+        self.rewards[died] += self.config.died
+        self.dones[died] = True
+
+        # check end of episode
+        if len(self.crystals) == 0:
+            self.rewards += self.config.collected_all * ships.alive
+            self.dones[:] = True
+        self.done = bool(np.all(self.dones))
+
+    def reset(self):
+        """
+        Reset the scene, computing the observations
+        :return: The agents' observations
+        """
+        self.init_scene()
+        if self.viewer:
+            self.sprites.hide_all()
+        self.make_observations()
+        return self.state
+
+    def render(self, mode='human'):
+        """
+        Render the current state of the scene, as SpaceCrystalsEnv does
+        :param mode: The rendering mode to use
+        """
+        pools = [self.spaceships, self.crystals, self.enemies, self.bullets]
+        if mode == 'rgb_array':
+            if self.rasterizer is None:
+                self.rasterizer = Rasterizer(*self.render_size)
+            return self.rasterizer.render([layer(pool) for pool in pools])[0]
+
+        if self.viewer is None:
+            # import the renderer only when drawing, so the simulation runs without a display
+            from gym.envs.classic_control import rendering
+            from gym_space_crystals.envs._sprites import SpriteBatch
+            self.viewer = rendering.Viewer(SCREEN_WIDTH, SCREEN_HEIGHT)
+            self.sprites = SpriteBatch()
+            self.viewer.add_geom(self.sprites)
+
+        for entities in pools:
+            self.sprites.cull(entities, entities.indices())
+        return self.viewer.render()
+
+    def close(self):
+        """
+        Terminate the episode
+        """
+        if self.viewer:
+            self.viewer.close()
+            self.viewer = None
+            self.sprites = None
+
+    # -- Sugar coding functions
+
+    def check_bounds(self, entities: EntityPool):
+        """
+        Remove the entities out of the window bounds from the scene
+        :param entities: The entities' pool
+        """
+        i = entities.indices()
+        out = i[~in_bounds(entities.x[i], entities.y[i])]
+        if out.size > 0:
+            entities.kill(out)
+
+    def shoot(self, agents: np.ndarray):
+        """
+        Shoot a bullet from the spaceships of the given agents, as `Spaceship.shoot` does
+        :param agents: The shooting agents
+        """
+        if agents.size == 0:
+            return
+        velocity = self.spaceships.velocity[agents] * 2
+        velocity[velocity <= 0.] = 1
+        bullets = self.bullets.spawn_batch(self.spaceships.x[agents], self.spaceships.y[agents],
+                                           self.spaceships.rotation[agents], velocity)
+        # only the shots that fit in the pool are charged
+        agents = agents[:bullets.size]
+        self.rewards[agents] -= self.config.shot
+        self.bullet_owners[bullets] = agents
+
+    # -- Interacting with the environment --
+
+    def make_observations(self):
+        """
+        Compute the observations of all the agents at once, updating the state.
+
+        The state buffer is allocated once and overwritten at every call: copy it to keep past observations.
+        """
+        ships = self.spaceships
+        self.state[:, :3] = self.encoding.status(ships.x, ships.y, ships.rotation)
+        # ray-cast the rays of all the agents against the shared crystals and enemies
+        shape = (self.n_agents, self.crystals.capacity + self.enemies.capacity)
+        self._cast_rays(ships.x, ships.y, ships.rotation,
+                        np.broadcast_to(np.concatenate((self.crystals.x, self.enemies.x)), shape),
+                        np.broadcast_to(np.concatenate((self.crystals.y, self.enemies.y)), shape),
+                        np.broadcast_to(np.concatenate((self.crystals.alive, self.enemies.alive)), shape),
+                        self._sensed_radii, self._sensed_values, self.n_observations, self.state[:, 3:],
+                        self.encoding)
@@ -0,0 +1,164 @@
+import socket
+import struct
+from collections import deque
+from typing import Deque
+
+import numpy as np
+from gym import spaces
+from gym.error import ClosedEnvironmentError, Error, NoAsyncCallError
+from gym.vector import VectorEnv
+
+from gym_space_crystals.envs._protocol import *
+
+
+class RemoteEnvError(Error):
+    """
+    Raised when the server fails to answer a request, with the server's error
+    """
+    pass
+
+
+class SpaceCrystalsRemoteVectorEnv(VectorEnv):
+    metadata = {'render.modes': []}
+
+    def __init__(self, address: Address, num_envs: int, copy: bool = True, timeout: float = None, **kwargs):
+        """
+        Create a batch of environments hosted by an `EnvServer`, following the `gym.vector.VectorEnv` interface.
+
+        Each request is a single binary frame, and its reply's arrays are read straight into a reused buffer. The
+        requests are pipelined: `seed` and `step_async` / `reset_async` only send their request, the replies being
+        read in order by `step_wait` / `reset_wait`, so that the learner keeps working while the server steps.
+
+        :param address: The server's (host, port), or the path of its Unix socket
+        :param num_envs: The number of environments
+        :param copy: Whether to return copies of the observations, rather than views of the reply's buffer
+        (overwritten by the next reply)
+        :param timeout: The timeout of the socket's operations (in seconds), None to block
+        :param kwargs: The keyword arguments of the server's environments (e.g. SpaceCrystalsVectorEnv's), as JSON
+        """
+        self.address = address
+        self.copy = copy
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        # commands sent whose replies are not read yet, in order
+        self._pending = deque()  # type: Deque[int]
+        self._header = bytearray(REPLY_HEADER.size)
+        self._buffer = bytearray(1 << 16)
+
+        self._send(MAKE, encode_json(dict(num_envs=num_envs, kwargs=kwargs)))
+        description = decode_json(self._receive(MAKE))
+        shape = tuple(description['observation_shape'])
+        dtype = np.dtype(description['observation_dtype'])
+        observation_space = spaces.Box(np.broadcast_to(description['observation_low'], shape).astype(dtype),
+                                       np.broadcast_to(description['observation_high'], shape).astype(dtype),
+                                       dtype=dtype)
+        action_space = spaces.Discrete(description['n_actions'])
+        super(SpaceCrystalsRemoteVectorEnv, self).__init__(description['num_envs'], observation_space, action_space)
+
+    def seed(self, seeds: int = None):
+        """
+        Fix the random seed of the server's environments, without waiting for the reply
+        :param seeds: Random seed, an int as for SpaceCrystalsVectorEnv
+        """
+        if seeds is not None and not isinstance(seeds, int):
+            raise ValueError('SpaceCrystalsRemoteVectorEnv seeds its batch with a single int')
+        self._send(SEED, struct.pack('<q', -1 if seeds is None else seeds))
+
+    def reset_async(self):
+        """
+        Send a reset request
+        """
+        self._send(RESET)
+
+    def reset_wait(self, **kwargs):
+        """
+        Wait for the reply of the reset request
+        :return: The batch of observations
+        """
+        observations = np.frombuffer(self._receive(RESET), dtype=self.single_observation_space.dtype)
+        observations = observations.reshape((self.num_envs,) + self.single_observation_space.shape)
+        return np.copy(observations) if self.copy else observations
+
+    def step_async(self, actions):
+        """
+        Send a step request
+        :param actions: The batch of actions
+        """
+        self._send(STEP, np.asarray(actions, dtype=np.int64).tobytes())
+
+    def step_wait(self, **kwargs):
+        """
+        Wait for the reply of the step request.
+
+        The last observation of an ended episode is available in the infos as 'terminal_observation'.
+        :return: observations, rewards, dones, infos
+        """
+        observations, rewards, dones, infos = decode_step(self._receive(STEP), self.num_envs,
+                                                          self.single_observation_space.shape,
+                                                          self.single_observation_space.dtype)
+        return (np.copy(observations) if self.copy else observations), rewards.copy(), dones.copy(), infos
+
+    def close_extras(self, **kwargs):
+        """
+        End the session, closing the server's environments
+        """
+        try:
+            self._send(CLOSE)
+            self._receive(CLOSE)
+        except (OSError, RemoteEnvError):
+            pass
+        finally:
+            self.sock.close()
+
+    def _send(self, command: int, payload: bytes = b''):
+        """
+        Send a request
+
+        :param command: The command
+        :param payload: The payload
+        """
+        if getattr(self, 'closed', False):
+            raise ClosedEnvironmentError('Trying to use a closed SpaceCrystalsRemoteVectorEnv')
+        self.sock.sendall(encode_request(command, payload))
+        self._pending.append(command)
+
+    def _receive(self, command: int) -> memoryview:
+        """
+        Read the replies in order up to the one of a command, checking the previous ones (e.g. of `seed`)
+
+        :param command: The command
+        :return: The reply's payload, a view of the reply's buffer
+        """
+        if command not in self._pending:
+            raise NoAsyncCallError('Calling the wait of %s without any pending call' % COMMANDS[command],
+                                   COMMANDS[command])
+        while True:
+            pending = self._pending.popleft()
+            self._read_into(memoryview(self._header))
+            length, status = REPLY_HEADER.unpack(self._header)
+            if length > len(self._buffer):
+                self._buffer = bytearray(max(length, 2 * len(self._buffer)))
+            payload = memoryview(self._buffer)[:length]
+            self._read_into(payload)
+            if status != OK:
+                raise RemoteEnvError('%s failed on the server: %s' % (COMMANDS[pending],
+                                                                     bytes(payload).decode('utf-8')))
+            if pending == command:
+                return payload
+
+    def _read_into(self, view: memoryview):
+        """
+        Read exactly enough bytes to fill a buffer
+
+        :param view: The buffer
+        """
+        while view:
+            n = self.sock.recv_into(view)
+            if n == 0:
+                raise ConnectionError('The server closed the connection')
+            view = view[n:]
@@ -0,0 +1,303 @@
+"""
+Environment server: hosts batches of SpaceCrystalsVectorEnv scenes for remote learners, answering batched reset and
+step requests over TCP or a Unix socket with compact binary frames (see `SpaceCrystalsRemoteVectorEnv` for the
+client).
+
+Run it with `space-crystals-server` or `python -m gym_space_crystals.envs.space_crystals_server`.
+"""
+import argparse
+import asyncio
+import math
+import struct
+import sys
+import threading
+from typing import Callable, List, Optional, Set
+
+import numpy as np
+from gym import logger
+from gym.vector import VectorEnv
+
+from gym_space_crystals.envs._config import as_config
+from gym_space_crystals.envs._entities import diagonal
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs._occupancy import CHANNELS, GRID_SIZE
+from gym_space_crystals.envs._protocol import *
+from gym_space_crystals.envs.space_crystals_vec_env import SpaceCrystalsVectorEnv
+
+# default TCP port of the server
+DEFAULT_PORT = 5555
+# size of the replies waiting to be sent above which a session waits for the client to read them
+WRITE_HIGH_WATER = 1 << 20
+# SpaceCrystalsVectorEnv's keyword arguments a client may set: not `telemetry`, which writes files on the server (see
+# EnvServer's), nor the ones sizing buffers beyond the limits below (`initial_bullets`, `render_size`)
+CLIENT_KWARGS = {'n_observations', 'dt', 'dtype', 'observation_mode', 'grid_size', 'grid_ego', 'world_size',
+                 'n_crystals', 'n_enemies', 'config', 'sensor_range'}
+# limits of a client's batch, so that no client can exhaust the server's memory: scenes, crystals and enemies over the
+# batch, observations' features over the batch, world's side, tick's duration, and bullets over the batch (with a
+# shot per tick, a scene holds up to a bullet's lifetime in ticks: the world's diagonal over dt, at 1 px per unit of
+# time)
+MAX_SCENES = 4096
+MAX_ENTITIES = 1 << 20
+MAX_FEATURES = 1 << 24
+MAX_WORLD_SIDE = 100000
+MAX_DT = 100.
+MAX_BULLETS = 1 << 22
+
+
+class EnvServer:
+    def __init__(self, address: Address = ('127.0.0.1', DEFAULT_PORT), env_fn: Callable = SpaceCrystalsVectorEnv,
+                 telemetry: str = None):
+        """
+        Create a server hosting batches of environments, one batch per client connection.
+
+        A client first makes its batch (the number of scenes and the environment's keyword arguments, among
+        CLIENT_KWARGS and within the MAX_* limits, see `check_make`), then sends seed, reset and step requests for the
+        whole batch, answered in order: a client can send several requests before reading their replies (pipelining).
+        The requests run on the server's event loop, so the sessions share a CPU: run one server per core to use more
+        of them.
+
+        :param address: The (host, port) to listen on (port 0 for any free port), or the path of a Unix socket
+        :param env_fn: The function creating a batch from the number of scenes and the client's keyword arguments
+        :param telemetry: The path (without extension) to export the batches' telemetry to, suffixed with the
+        connection's number, None not to count it (see `Telemetry`)
+        """
+        self.address = address
+        self.env_fn = env_fn
+        self.telemetry = telemetry
+        self._n_connections = 0
+        self._server = None  # type: Optional[asyncio.AbstractServer]
+        self._sessions = set()  # type: Set[asyncio.Task]
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._thread = None  # type: Optional[threading.Thread]
+
+    async def start(self) -> Address:
+        """
+        Start listening
+
+        :return: The address listened on (with the actual port when listening on port 0)
+        """
+        if isinstance(self.address, str):
+            self._server = await asyncio.start_unix_server(self._serve, self.address)
+        else:
+            self._server = await asyncio.start_server(self._serve, *self.address)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self.address
+
+    async def stop(self):
+        """
+        Stop listening, and end the sessions
+        """
+        self._server.close()
+        await self._server.wait_closed()
+        for task in list(self._sessions):
+            task.cancel()
+        await asyncio.gather(*self._sessions, return_exceptions=True)
+
+    def serve_forever(self):
+        """
+        Serve in the current thread, until interrupted
+        """
+        async def serve():
+            await self.start()
+            logger.info('Serving environments on %s', self.address)
+            try:
+                await self._server.serve_forever()
+            finally:
+                await self.stop()
+
+        asyncio.run(serve())
+
+    def start_thread(self) -> Address:
+        """
+        Serve from a background (daemon) thread, e.g. to test a client on localhost, until `stop_thread`
+
+        :return: The address listened on
+        """
+        self._loop = asyncio.new_event_loop()
+        address = self._loop.run_until_complete(self.start())
+        self._thread = threading.Thread(target=self._loop.run_forever, name='EnvServer', daemon=True)
+        self._thread.start()
+        return address
+
+    def stop_thread(self):
+        """
+        Stop serving from the background thread
+        """
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answer the requests of a client, in order
+        """
+        self._sessions.add(asyncio.current_task())
+        self._n_connections += 1
+        telemetry = None if self.telemetry is None else '%s-%d' % (self.telemetry, self._n_connections)
+        session = Session(self.env_fn, telemetry)
+        try:
+            while True:
+                length, command = REQUEST_HEADER.unpack(await reader.readexactly(REQUEST_HEADER.size))
+                payload = await reader.readexactly(length) if length else b''
+                try:
+                    writer.write(encode_reply(session.handle(command, payload)))
+                except Exception as error:
+                    writer.write(encode_reply([('%s: %s' % (type(error).__name__, error)).encode('utf-8')], ERROR))
+                if command == CLOSE:
+                    await writer.drain()
+                    break
+                # pipelined requests are answered without waiting for the client to read the replies, up to a point
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # the client left
+            pass
+        finally:
+            session.close()
+            writer.close()
+            self._sessions.discard(asyncio.current_task())
+
+
+class Session:
+    def __init__(self, env_fn: Callable, telemetry: str = None):
+        """
+        Create the session of a client: its batch of environments, made on its first request
+
+        :param env_fn: The function creating the batch
+        :param telemetry: The path (without extension) to export the batch's telemetry to, None not to count it
+        """
+        self.env_fn = env_fn
+        self.telemetry = telemetry
+        self.env = None  # type: Optional[VectorEnv]
+
+    def handle(self, command: int, payload: bytes) -> List[bytes]:
+        """
+        Answer a request
+
+        :param command: The request's command
+        :param payload: The request's payload
+        :return: The parts of the reply's payload
+        """
+        if command == MAKE:
+            return self.make(**decode_json(payload))
+        if self.env is None and command != CLOSE:
+            raise RuntimeError('%s before make' % COMMANDS.get(command, command))
+        if command == SEED:
+            seed, = struct.unpack('<q', payload)
+            self.env.seed(None if seed < 0 else seed)
+            return []
+        if command == RESET:
+            return [np.ascontiguousarray(self.env.reset()).tobytes()]
+        if command == STEP:
+            actions = np.frombuffer(payload, dtype=np.int64)
+            return encode_step(*self.env.step(actions))
+        if command == CLOSE:
+            return []
+        raise ValueError('unknown command %r' % command)
+
+    def make(self, num_envs: int, kwargs: dict) -> List[bytes]:
+        """
+        Make the batch of environments
+
+        :param num_envs: The number of environments
+        :param kwargs: The environment's keyword arguments
+        :return: The description of the batch: the number of environments and their spaces
+        """
+        check_make(num_envs, kwargs)
+        if self.telemetry is not None:
+            kwargs = dict(kwargs, telemetry=self.telemetry)
+        self.close()
+        self.env = self.env_fn(num_envs, **kwargs)
+        observation_space = self.env.single_observation_space
+        return [encode_json(dict(num_envs=self.env.num_envs, observation_shape=list(observation_space.shape),
+                                 observation_dtype=observation_space.dtype.str,
+                                 observation_low=bound(observation_space.low),
+                                 observation_high=bound(observation_space.high),
+                                 n_actions=int(self.env.single_action_space.n)))]
+
+    def close(self):
+        """
+        Close the batch of environments
+        """
+        if self.env is not None:
+            self.env.close()
+            self.env = None
+
+
+# -- Functions --
+
+def bound(values: np.ndarray):
+    """
+    Get a bound of a space as JSON
+
+    :param values: The bound
+    :return: The bound's value if uniform, else its values
+    """
+    return values.flat[0].item() if np.all(values == values.flat[0]) else values.tolist()
+
+
+def check_make(num_envs: int, kwargs: dict):
+    """
+    Check that a client's batch only sets CLIENT_KWARGS, and stays within the MAX_* limits
+
+    :param num_envs: The number of environments
+    :param kwargs: The environment's keyword arguments
+    :raise ValueError: If the batch isn't accepted
+    """
+    refused = sorted(set(kwargs) - CLIENT_KWARGS)
+    if refused:
+        raise ValueError('keyword arguments not accepted from clients: %s' % ', '.join(refused))
+    if not isinstance(num_envs, int) or not 1 <= num_envs <= MAX_SCENES:
+        raise ValueError('num_envs must be between 1 and %d, got %r' % (MAX_SCENES, num_envs))
+    configs = kwargs.get('config')
+    if not isinstance(configs, (list, tuple)):
+        configs = [configs]
+    configs = [as_config(config, kwargs.get('n_crystals'), kwargs.get('n_enemies')) for config in configs]
+    # the scenes' arrays are sized for the largest counts
+    n_entities = num_envs * (max(int(config.n_crystals) for config in configs) +
+                             max(int(config.n_enemies) for config in configs))
+    if n_entities > MAX_ENTITIES:
+        raise ValueError('at most %d crystals and enemies per batch, got %d' % (MAX_ENTITIES, n_entities))
+    if kwargs.get('observation_mode') == 'grid':
+        width, height = kwargs.get('grid_size', GRID_SIZE)
+        n_features = (len(CHANNELS) + 1) * int(width) * int(height)
+    else:
+        n_features = 3 + 2 * int(kwargs.get('n_observations', N_OBSERVATIONS))
+    if num_envs * n_features > MAX_FEATURES:
+        raise ValueError('at most %d observation features per batch, got %d' % (MAX_FEATURES, num_envs * n_features))
+    world_size = kwargs.get('world_size', (SCREEN_WIDTH, SCREEN_HEIGHT))
+    if not all(0 < float(side) <= MAX_WORLD_SIDE for side in world_size):
+        raise ValueError('world_size must be within (0, %d], got %r' % (MAX_WORLD_SIDE, world_size))
+    dt = kwargs.get('dt', 1.)
+    if not 0 < float(dt) <= MAX_DT:
+        raise ValueError('dt must be within (0, %r], got %r' % (MAX_DT, dt))
+    n_bullets = num_envs * math.ceil(diagonal(*map(float, world_size)) / float(dt))
+    if n_bullets > MAX_BULLETS:
+        raise ValueError('at most %d bullets per batch (scenes times the world\'s diagonal over dt), got %d' %
+                         (MAX_BULLETS, n_bullets))
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='host to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port to listen on')
+    parser.add_argument('--unix', help='path of a Unix socket to listen on, instead of TCP')
+    parser.add_argument('--telemetry', help='path (without extension) to export the batches\' telemetry to, suffixed '
+                                            'with the connection\'s number')
+    args = parser.parse_args(argv)
+
+    server = EnvServer(args.unix or (args.host, args.port), telemetry=args.telemetry)
+    logger.set_level(logger.INFO)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('stopped', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
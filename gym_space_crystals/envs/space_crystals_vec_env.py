@@ -0,0 +1,534 @@
+from typing import List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from gym import spaces
+from gym.utils import seeding
+from gym.vector import VectorEnv
+
+from gym_space_crystals.envs._config import EnvConfig, as_config, stack_configs
+from gym_space_crystals.envs._entities import diagonal, in_bounds
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs._occupancy import GRID_SIZE, OBSERVATION_MODES, OccupancyGrid
+from gym_space_crystals.envs._raster import Layer, Rasterizer, view_origin
+from gym_space_crystals.envs._reset_pool import RESET_POOL_SIZE, ResetPool, spawn_distribution
+from gym_space_crystals.envs._sensors import ObservationEncoding, choose_caster
+from gym_space_crystals.envs._spatial import SpatialHash, first_hits, swept_cell_size, swept_pairs
+from gym_space_crystals.envs._telemetry import (CRYSTALS, ENDED_COLLECTED_ALL, ENDED_ENEMY, ENDED_OUT_OF_BOUNDS,
+                                                 ENEMIES, RETURN, SHOTS, STEPS, TELEMETRY_INTERVAL, Telemetry)
+
+
+class SpaceCrystalsVectorEnv(VectorEnv):
+    metadata = {'render.modes': ['rgb_array']}
+
+    def __init__(self, num_envs: int, n_observations: int = N_OBSERVATIONS, initial_bullets: int = 32,
+                 render_size: Tuple[int, int] = (SCREEN_WIDTH, SCREEN_HEIGHT), dt: float = 1., dtype: str = 'float64',
+                 observation_mode: str = 'rays', grid_size: Tuple[int, int] = GRID_SIZE, grid_ego: bool = False,
+                 world_size: Tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT), n_crystals: int = None,
+                 n_enemies: int = None, telemetry: str = None, telemetry_interval: float = TELEMETRY_INTERVAL,
+                 config: Union[EnvConfig, Sequence[EnvConfig]] = None, sensor_range: float = None):
+        """
+        Create a batch of environments, simulated together.
+
+        The state of every scene lives in shared arrays (one row per scene) and each step applies the actions,
+        advances the entities, resolves the collisions and computes the observations with one batched operation
+        across all scenes. Scenes that end are automatically reset.
+
+        :param num_envs: The number of scenes
+        :param n_observations: The number of sensor rays, evenly spread around each spaceship
+        :param initial_bullets: The initial per-scene bullets capacity (grown as needed)
+        :param render_size: The (width, height) of the rendered frames
+        :param dt: The duration of a step: the entities move by their velocity times `dt`, and the collisions are
+        swept over the step
+        :param dtype: The observations' dtype, as for SpaceCrystalsEnv
+        :param observation_mode: 'rays' or 'grid', as for SpaceCrystalsEnv: the grids of all the scenes are built at
+        once
+        :param grid_size: The (width, height) of the occupancy grids, in cells
+        :param grid_ego: Centre the occupancy grids on the spaceships
+        :param world_size: The (width, height) of the world, as for SpaceCrystalsEnv: each scene's frame is a
+        window-sized view following its spaceship
+        :param n_crystals: The number of crystals per scene, overriding the configs' if not None
+        :param n_enemies: The number of enemies per scene, overriding the configs' if not None
+        :param telemetry: The path (without extension) to export the episodes' telemetry to, None not to count it, as
+        for SpaceCrystalsEnv: the counters of all the scenes are updated at once, an ended episode's being reported in
+        its infos as 'telemetry'
+        :param telemetry_interval: The minimum interval between two exports of the telemetry, in seconds
+        :param config: The parameters of all the scenes, or one config per scene (entities' counts, spawn
+        distributions and motion, and rewards may differ between the scenes), or their mappings, the defaults if None
+        (see `EnvConfig`)
+        :param sensor_range: The sensor rays' range, as for SpaceCrystalsEnv
+        """
+        if observation_mode not in OBSERVATION_MODES:
+            raise ValueError('observation_mode must be one of %s, got %r' % (OBSERVATION_MODES, observation_mode))
+        self.n_observations = n_observations
+        self.dt = dt
+        self.world_size = tuple(world_size)
+        if config is None or isinstance(config, (EnvConfig, Mapping)):
+            config = [config] * num_envs
+        elif len(config) != num_envs:
+            raise ValueError('config must be a single config or one per scene (%d), got %d' % (num_envs, len(config)))
+        configs = [as_config(scene_config, n_crystals, n_enemies) for scene_config in config]
+        # the scenes' entities arrays fit the largest counts, the extra slots of the other scenes staying dead
+        n_crystals = max(scene_config.n_crystals for scene_config in configs)
+        n_enemies = max(scene_config.n_enemies for scene_config in configs)
+        self._cast_rays = choose_caster(num_envs, n_observations, n_crystals + n_enemies)
+        self.encoding = ObservationEncoding(dtype, diagonal(*self.world_size), sensor_range)
+        self.observation_mode = observation_mode
+        self.occupancy = None  # type: Optional[OccupancyGrid]
+        if observation_mode == 'grid':
+            self.occupancy = OccupancyGrid(*grid_size, n_scenes=num_envs, ego=grid_ego, dtype=self.encoding.dtype,
+                                           occupied=self.encoding.maximum, world_size=self.world_size)
+            observation_space = self.encoding.grid_space(self.occupancy.grids.shape[1:])
+        else:
+            observation_space = self.encoding.space(self.n_observations)
+        # same actions as SpaceCrystalsEnv: accelerate, decelerate, rotate cw, rotate ccw, shoot
+        action_space = spaces.Discrete(5)
+        super(SpaceCrystalsVectorEnv, self).__init__(num_envs, observation_space, action_space)
+
+        # spaceships
+        self.spaceship_x = np.zeros(num_envs)
+        self.spaceship_y = np.zeros(num_envs)
+        self.spaceship_rotation = np.zeros(num_envs)
+        self.spaceship_velocity = np.zeros(num_envs)
+        self.spaceship_acceleration = np.zeros(num_envs)
+        # crystals
+        self.crystals_x = np.zeros((num_envs, n_crystals))
+        self.crystals_y = np.zeros((num_envs, n_crystals))
+        self.crystals_alive = np.zeros((num_envs, n_crystals), dtype=np.bool_)
+        # enemies
+        self.enemies_x = np.zeros((num_envs, n_enemies))
+        self.enemies_y = np.zeros((num_envs, n_enemies))
+        self.enemies_rotation = np.zeros((num_envs, n_enemies))
+        self.enemies_velocity = np.zeros((num_envs, n_enemies))
+        self.enemies_alive = np.zeros((num_envs, n_enemies), dtype=np.bool_)
+        # bullets (the per-step displacement is fixed when shot)
+        self.bullets_x = np.zeros((num_envs, initial_bullets))
+        self.bullets_y = np.zeros((num_envs, initial_bullets))
+        self.bullets_rotation = np.zeros((num_envs, initial_bullets))
+        self.bullets_dx = np.zeros((num_envs, initial_bullets))
+        self.bullets_dy = np.zeros((num_envs, initial_bullets))
+        self.bullets_alive = np.zeros((num_envs, initial_bullets), dtype=np.bool_)
+        # per-scene parameters, from their configs (see `configure`): stacked configs, one value per scene in each
+        # field, the scenes' entities slots, and spawn distributions
+        self.configs = configs  # type: List[EnvConfig]
+        self.parameters = stack_configs(configs)
+        self._crystals_slots = np.zeros((num_envs, n_crystals), dtype=np.bool_)
+        self._enemies_slots = np.zeros((num_envs, n_enemies), dtype=np.bool_)
+        self._spawn_mean = np.zeros((num_envs, 2 * (n_crystals + n_enemies)))
+        self._spawn_std = np.zeros((num_envs, 2 * (n_crystals + n_enemies)))
+        self.cell_size = None  # type: float
+
+        # sensed entities (crystals then enemies) properties
+        self._sensed_radii = np.array([ENTITIES.get('crystal').get('radius')] * n_crystals +
+                                      [ENTITIES.get('enemy').get('radius')] * n_enemies, dtype=np.float64)
+        self._sensed_values = np.array([ENTITIES.get('crystal').get('value')] * n_crystals +
+                                       [ENTITIES.get('enemy').get('value')] * n_enemies, dtype=np.float64)
+
+        # step outputs
+        self.observations = np.zeros((num_envs,) + observation_space.shape, dtype=self.encoding.dtype)
+        self.rewards = np.zeros(num_envs)
+        self.dones = np.zeros(num_envs, dtype=np.bool_)
+        self._actions = None
+        # episodes' telemetry, None when off
+        self.telemetry = None  # type: Optional[Telemetry]
+        if telemetry is not None:
+            self.telemetry = Telemetry(telemetry, num_envs, telemetry_interval)
+        # crystals' collision grid
+        self._crystals_grid = None  # type: SpatialHash
+        # offscreen renderer, created on first use
+        self.render_size = render_size
+        self.rasterizer = None  # type: Rasterizer
+
+        # random seed fixing
+        self.np_random = None
+        # initial scenes, drawn from np_random (as standard normal coordinates, stretched per scene)
+        self.reset_pool = None  # type: ResetPool
+        self.seed(10072020)
+        self.configure(configs)
+
+        # initialize the scenes
+        self.reset_scenes(np.arange(num_envs))
+        self.make_observations(np.arange(num_envs))
+
+    def seed(self, seeds: int = None):
+        """
+        Fix the random seed for reproducibility.
+
+        All the scenes share a single random generator, so only one seed is used.
+        :param seeds: Random seed
+        """
+        if seeds is not None and not isinstance(seeds, int):
+            raise ValueError('SpaceCrystalsVectorEnv uses a single random generator, seed it with an int')
+        self.np_random, seed = seeding.np_random(seeds)
+        if self.reset_pool is None:
+            self.reset_pool = ResetPool(self.np_random, self.crystals_x.shape[1], self.enemies_x.shape[1],
+                                        max(RESET_POOL_SIZE, self.num_envs), standard=True)
+        else:
+            self.reset_pool.seed(self.np_random)
+        return [seed]
+
+    def configure(self, config: Union[EnvConfig, Sequence[EnvConfig]], indices: np.ndarray = None):
+        """
+        Change the parameters of scenes (e.g. for a curriculum): their motion and rewards from the next step, their
+        entities' counts and spawn distributions from their next reset
+        :param config: The config of all the given scenes, or one per scene, or their mappings
+        :param indices: The indices of the scenes, all of them if None
+        """
+        indices = np.arange(self.num_envs) if indices is None else np.asarray(indices)
+        configs = [config] * indices.size if isinstance(config, (EnvConfig, Mapping)) else config
+        if len(configs) != indices.size:
+            raise ValueError('config must be a single config or one per scene (%d), got %d' % (indices.size,
+                                                                                              len(configs)))
+        configs = [as_config(scene_config) for scene_config in configs]
+        parameters = stack_configs(configs)
+        n_crystals, n_enemies = self.crystals_x.shape[1], self.enemies_x.shape[1]
+        if np.any(parameters.n_crystals > n_crystals) or np.any(parameters.n_enemies > n_enemies):
+            raise ValueError('The scenes have room for %d crystals and %d enemies at most' % (n_crystals, n_enemies))
+        for i, scene_config in zip(indices.tolist(), configs):
+            self.configs[i] = scene_config
+        for field, values in zip(self.parameters, parameters):
+            field[indices] = values
+        self._crystals_slots[indices] = np.arange(n_crystals) < parameters.n_crystals[:, None]
+        self._enemies_slots[indices] = np.arange(n_enemies) < parameters.n_enemies[:, None]
+        self._spawn_mean[indices], self._spawn_std[indices] = spawn_distribution(parameters, n_crystals, n_enemies,
+                                                                                 self.world_size)
+        # the collision grids' cells cover the entities' motion over a step, in the fastest scene
+        cell_size = swept_cell_size(self.dt, self.parameters.max_relative_velocity.max())
+        if cell_size != self.cell_size:
+            self.cell_size = cell_size
+            self._crystals_grid = None
+
+    def reset_wait(self, **kwargs):
+        """
+        Reset all the scenes, computing the observations
+        :return: The batch of observations
+        """
+        indices = np.arange(self.num_envs)
+        if self.telemetry is not None:
+            self.telemetry.truncate(indices)
+        self.reset_scenes(indices)
+        self.dones[:] = False
+        self.make_observations(indices)
+        return np.copy(self.observations)
+
+    def step_async(self, actions):
+        """
+        Store the actions to apply at the next `step_wait`
+        :param actions: The batch of actions
+        """
+        self._actions = np.asarray(actions)
+
+    def step_wait(self, **kwargs):
+        """
+        Apply a single step in all the scenes using the stored actions.
+
+        Scenes that end are reset: their observation is the one of the new scene, while the last observation of
+        the ended scene is available in the infos as 'terminal_observation'.
+        :return: observations, rewards, dones, infos
+        """
+        actions = self._actions
+        # sanity check for the actions
+        assert actions.shape == (self.num_envs,) and np.all((actions >= 0) & (actions < 5)), \
+            "%r invalid" % actions
+        parameters = self.parameters
+        self.rewards[:] = parameters.moved * self.dt
+
+        # apply actions
+        self.spaceship_acceleration += parameters.spaceship_acceleration * \
+            ((actions == 0).astype(np.float64) - (actions == 1))
+        self.spaceship_rotation += np.radians(parameters.spaceship_step_rotation) * \
+            ((actions == 2).astype(np.float64) - (actions == 3))
+        shooting = np.flatnonzero(actions == 4)
+        if shooting.size > 0:
+            self.rewards[shooting] -= parameters.shot[shooting]
+            if self.telemetry is not None:
+                self.telemetry.counters[SHOTS, shooting] += 1
+            self.shoot(shooting)
+
+        # update positions, from the start positions of the step
+        spaceships_start = self.spaceship_x.copy(), self.spaceship_y.copy()
+        bullets_start = self.bullets_x.copy(), self.bullets_y.copy()
+        enemies_start = self.enemies_x.copy(), self.enemies_y.copy()
+        self.advance_spaceships()
+        self.advance_bullets()
+        self.advance_enemies()
+
+        # collisions, swept over the step
+        self.collect_crystals(spaceships_start)
+        enemies = self.index_enemies()
+        self.hit_enemies(*enemies, enemies_start, bullets_start)
+        self.check_spaceships(*enemies, enemies_start, spaceships_start)
+        if self.telemetry is not None:
+            self.telemetry.counters[STEPS] += 1
+            self.telemetry.counters[RETURN] += self.rewards
+
+        indices = np.arange(self.num_envs)
+        self.make_observations(indices)
+
+        # reset ended scenes
+        infos = [{} for _ in range(self.num_envs)]
+        ended = np.flatnonzero(self.dones)
+        if ended.size > 0:
+            for i in ended:
+                infos[i]['terminal_observation'] = np.copy(self.observations[i])
+            if self.telemetry is not None:
+                for i in ended:
+                    infos[i]['telemetry'] = self.telemetry.episode(i)
+                self.telemetry.end(ended)
+            self.reset_scenes(ended)
+            self.make_observations(ended)
+
+        return np.copy(self.observations), np.copy(self.rewards), np.copy(self.dones), infos
+
+    def render(self, mode: str = 'rgb_array') -> np.ndarray:
+        """
+        Draw all the scenes offscreen, into a buffer overwritten at every call (copy the frames to keep them): each
+        frame is a window-sized view following the scene's spaceship (the whole window for the default world)
+        :param mode: The rendering mode to use, only 'rgb_array'
+        :return: The frames, shape (num_envs, height, width, 3)
+        """
+        if mode != 'rgb_array':
+            raise ValueError('SpaceCrystalsVectorEnv only renders in rgb_array mode, not %r' % mode)
+        if self.rasterizer is None:
+            self.rasterizer = Rasterizer(*self.render_size, n_scenes=self.num_envs)
+        origins = view_origin(self.spaceship_x, self.spaceship_y, *self.world_size)
+        return self.rasterizer.render(self.layers(np.arange(self.num_envs)), origins)
+
+    def close_extras(self, **kwargs):
+        """
+        Export the telemetry: all the scenes live in this process, there's nothing else to release
+        """
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+    # -- Scenes --
+
+    def reset_scenes(self, indices: np.ndarray):
+        """
+        Initialize the scenes at the given indices
+        :param indices: The indices of the scenes to reset
+        """
+        # spaceships, at the center of the world
+        self.spaceship_x[indices] = self.world_size[0] / 2
+        self.spaceship_y[indices] = self.world_size[1] / 2
+        self.spaceship_rotation[indices] = ENTITIES.get('spaceship').get('initial_rotation')
+        self.spaceship_velocity[indices] = ENTITIES.get('spaceship').get('initial_velocity')
+        self.spaceship_acceleration[indices] = ENTITIES.get('spaceship').get('initial_acceleration')
+        # standard normal coordinates, stretched to the scenes' distributions
+        coordinates = np.concatenate(self.reset_pool.take(indices.size), axis=1)
+        coordinates = self._spawn_mean[indices] + self._spawn_std[indices] * coordinates
+        c, e = self.crystals_x.shape[1], self.enemies_x.shape[1]
+        # crystals
+        self.crystals_x[indices] = coordinates[:, :c]
+        self.crystals_y[indices] = coordinates[:, c:2 * c]
+        self.crystals_alive[indices] = self._crystals_slots[indices]
+        self._crystals_grid = None
+        # enemies
+        self.enemies_x[indices] = coordinates[:, 2 * c:2 * c + e]
+        self.enemies_y[indices] = coordinates[:, 2 * c + e:]
+        self.enemies_rotation[indices] = 0
+        self.enemies_velocity[indices] = 0
+        self.enemies_alive[indices] = self._enemies_slots[indices]
+        # bullets
+        self.bullets_alive[indices] = False
+
+    def layers(self, indices: np.ndarray) -> List[Layer]:
+        """
+        Get the alive entities of the scenes at the given indices, one layer per type as for the rasterizer
+        :param indices: The indices of the scenes, numbered by their position in the layers
+        :return: The layers
+        """
+        crystals = np.nonzero(self.crystals_alive[indices])
+        enemies = np.nonzero(self.enemies_alive[indices])
+        bullets = np.nonzero(self.bullets_alive[indices])
+        crystals_at = indices[crystals[0]], crystals[1]
+        enemies_at = indices[enemies[0]], enemies[1]
+        bullets_at = indices[bullets[0]], bullets[1]
+        return [
+            ('spaceship', np.arange(indices.size), self.spaceship_x[indices], self.spaceship_y[indices],
+             self.spaceship_rotation[indices]),
+            ('crystal', crystals[0], self.crystals_x[crystals_at], self.crystals_y[crystals_at],
+             np.full(crystals[0].size, ENTITIES.get('crystal').get('initial_rotation'))),
+            ('enemy', enemies[0], self.enemies_x[enemies_at], self.enemies_y[enemies_at],
+             self.enemies_rotation[enemies_at]),
+            ('bullet', bullets[0], self.bullets_x[bullets_at], self.bullets_y[bullets_at],
+             self.bullets_rotation[bullets_at]),
+        ]
+
+    def make_observations(self, indices: np.ndarray):
+        """
+        Compute the observations of the scenes at the given indices
+        :param indices: The indices of the scenes
+        """
+        if self.occupancy is not None:
+            self.observations[indices] = self.occupancy.render(self.layers(indices), indices.size)
+            return
+        x = self.spaceship_x[indices]
+        y = self.spaceship_y[indices]
+        rotation = self.spaceship_rotation[indices]
+        obs = np.empty((indices.size, 3 + self.n_observations * 2), dtype=self.encoding.dtype)
+        # spaceship status
+        obs[:, :3] = self.encoding.status(x, y, rotation)
+        # ray-cast against crystals and enemies
+        self._cast_rays(x, y, rotation,
+                        np.concatenate([self.crystals_x[indices], self.enemies_x[indices]], axis=1),
+                        np.concatenate([self.crystals_y[indices], self.enemies_y[indices]], axis=1),
+                        np.concatenate([self.crystals_alive[indices], self.enemies_alive[indices]], axis=1),
+                        self._sensed_radii, self._sensed_values, self.n_observations, obs[:, 3:], self.encoding,
+                        self.world_size)
+        self.observations[indices] = obs
+
+    # -- Spaceships' actions --
+
+    def shoot(self, indices: np.ndarray):
+        """
+        Shoot a bullet from the spaceships of the given scenes.
+
+        The bullet has the same rotation of the spaceship and double its velocity if it's moving, else 1.
+        :param indices: The indices of the shooting scenes
+        """
+        free = ~self.bullets_alive[indices]
+        if not np.all(free.any(axis=1)):
+            self._grow_bullets()
+            free = ~self.bullets_alive[indices]
+        slots = free.argmax(axis=1)
+        rotation = self.spaceship_rotation[indices]
+        velocity = 2 * self.spaceship_velocity[indices]
+        velocity[velocity <= 0.0] = 1
+        self.bullets_x[indices, slots] = self.spaceship_x[indices]
+        self.bullets_y[indices, slots] = self.spaceship_y[indices]
+        self.bullets_rotation[indices, slots] = rotation
+        self.bullets_dx[indices, slots] = np.cos(rotation) * velocity
+        self.bullets_dy[indices, slots] = np.sin(rotation) * velocity
+        self.bullets_alive[indices, slots] = True
+
+    def _grow_bullets(self):
+        """
+        Double the per-scene bullets capacity
+        """
+        for name in ['bullets_x', 'bullets_y', 'bullets_rotation', 'bullets_dx', 'bullets_dy', 'bullets_alive']:
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros_like(arr)], axis=1))
+
+    # -- Motion --
+
+    def advance_spaceships(self):
+        """
+        Update the spaceships' positions, resetting their acceleration
+        """
+        self.spaceship_velocity += self.spaceship_acceleration
+        self.spaceship_acceleration[:] = 0
+        max_velocity = self.parameters.spaceship_max_velocity
+        np.clip(self.spaceship_velocity, -max_velocity, max_velocity, out=self.spaceship_velocity)
+        self.spaceship_x += np.cos(self.spaceship_rotation) * (self.spaceship_velocity * self.dt)
+        self.spaceship_y += np.sin(self.spaceship_rotation) * (self.spaceship_velocity * self.dt)
+
+    def advance_bullets(self):
+        """
+        Update the bullets' positions, removing the ones out of bounds
+        """
+        self.bullets_x += self.bullets_dx * (self.bullets_alive * self.dt)
+        self.bullets_y += self.bullets_dy * (self.bullets_alive * self.dt)
+        self.bullets_alive &= in_bounds(self.bullets_x, self.bullets_y, *self.world_size)
+
+    def advance_enemies(self):
+        """
+        Update the enemies' positions towards their scene's spaceship, removing the ones out of bounds
+        """
+        self.enemies_velocity += (self.parameters.enemy_step_velocity * self.dt)[:, None] * self.enemies_alive
+        np.minimum(self.enemies_velocity, self.parameters.enemy_max_velocity[:, None], out=self.enemies_velocity)
+        self.enemies_rotation[:] = np.arctan2(self.spaceship_y[:, None] - self.enemies_y,
+                                              self.spaceship_x[:, None] - self.enemies_x)
+        self.enemies_x += np.cos(self.enemies_rotation) * (self.enemies_velocity * self.dt)
+        self.enemies_y += np.sin(self.enemies_rotation) * (self.enemies_velocity * self.dt)
+        self.enemies_alive &= in_bounds(self.enemies_x, self.enemies_y, *self.world_size)
+
+    # -- Collisions --
+
+    def collect_crystals(self, spaceships_start: Tuple[np.ndarray, np.ndarray]):
+        """
+        Remove the crystals collected by the spaceships during the step
+        :param spaceships_start: The spaceships' X and Y coordinates at the start of the step
+        """
+        n_crystals = self.crystals_x.shape[1]
+        if self._crystals_grid is None:
+            # crystals don't move: index them again only after a reset
+            self._crystals_grid = SpatialHash(self.crystals_x.ravel(), self.crystals_y.ravel(),
+                                              np.repeat(np.arange(self.num_envs), n_crystals), self.cell_size)
+        crystals_x, crystals_y = self.crystals_x.ravel(), self.crystals_y.ravel()
+        _, collected = swept_pairs(self._crystals_grid, crystals_x, crystals_y, crystals_x, crystals_y,
+                                   ENTITIES.get('crystal').get('radius'), self.spaceship_x, self.spaceship_y,
+                                   *spaceships_start, ENTITIES.get('spaceship').get('radius'),
+                                   np.arange(self.num_envs))
+        scenes, crystals = np.divmod(collected, n_crystals)
+        alive = self.crystals_alive[scenes, crystals]
+        scenes, crystals = scenes[alive], crystals[alive]
+        self.crystals_alive[scenes, crystals] = False
+        collected = np.bincount(scenes, minlength=self.num_envs)
+        self.rewards += self.parameters.got_crystal * collected
+        if self.telemetry is not None:
+            self.telemetry.counters[CRYSTALS] += collected
+
+    def index_enemies(self) -> Tuple[np.ndarray, np.ndarray, SpatialHash]:
+        """
+        Index the alive enemies of all the scenes in a grid
+        :return: The scenes and slots of the indexed enemies, and the grid
+        """
+        scenes, enemies = np.nonzero(self.enemies_alive)
+        grid = SpatialHash(self.enemies_x[scenes, enemies], self.enemies_y[scenes, enemies], scenes, self.cell_size)
+        return scenes, enemies, grid
+
+    def hit_enemies(self, scenes: np.ndarray, enemies: np.ndarray, grid: SpatialHash,
+                    enemies_start: Tuple[np.ndarray, np.ndarray], bullets_start: Tuple[np.ndarray, np.ndarray]):
+        """
+        Remove the enemies hit by a bullet during the step, along with the bullet.
+
+        Each enemy is hit by the first bullet intersecting it; a bullet intersecting more enemies only hits the first.
+        :param scenes: The scenes of the indexed enemies
+        :param enemies: The slots of the indexed enemies
+        :param grid: The grid indexing the enemies
+        :param enemies_start: All the enemies' X and Y coordinates at the start of the step
+        :param bullets_start: All the bullets' X and Y coordinates at the start of the step
+        """
+        bullets_scenes, bullets = np.nonzero(self.bullets_alive)
+        b, e = swept_pairs(grid, self.enemies_x[scenes, enemies], self.enemies_y[scenes, enemies],
+                           enemies_start[0][scenes, enemies], enemies_start[1][scenes, enemies],
+                           ENTITIES.get('enemy').get('radius'),
+                           self.bullets_x[bullets_scenes, bullets], self.bullets_y[bullets_scenes, bullets],
+                           bullets_start[0][bullets_scenes, bullets], bullets_start[1][bullets_scenes, bullets],
+                           ENTITIES.get('bullet').get('radius'), bullets_scenes)
+        e, b = first_hits(e, b)
+        self.enemies_alive[scenes[e], enemies[e]] = False
+        self.bullets_alive[bullets_scenes[b], bullets[b]] = False
+        killed = np.bincount(scenes[e], minlength=self.num_envs)
+        self.rewards += self.parameters.killed_enemy * killed
+        if self.telemetry is not None:
+            self.telemetry.counters[ENEMIES] += killed
+
+    def check_spaceships(self, scenes: np.ndarray, enemies: np.ndarray, grid: SpatialHash,
+                         enemies_start: Tuple[np.ndarray, np.ndarray], spaceships_start: Tuple[np.ndarray, np.ndarray]):
+        """
+        End the scenes whose spaceship is out of bounds or collided with an enemy during the step, or that have no
+        crystals left
+        :param scenes: The scenes of the indexed enemies
+        :param enemies: The slots of the indexed enemies
+        :param grid: The grid indexing the enemies
+        :param enemies_start: All the enemies' X and Y coordinates at the start of the step
+        :param spaceships_start: The spaceships' X and Y coordinates at the start of the step
+        """
+        out = ~in_bounds(self.spaceship_x, self.spaceship_y, *self.world_size)
+        died = out.copy()
+        crashed, e = swept_pairs(grid, self.enemies_x[scenes, enemies], self.enemies_y[scenes, enemies],
+                                 enemies_start[0][scenes, enemies], enemies_start[1][scenes, enemies],
+                                 ENTITIES.get('enemy').get('radius'), self.spaceship_x, self.spaceship_y,
+                                 *spaceships_start, ENTITIES.get('spaceship').get('radius'), np.arange(self.num_envs))
+        died[crashed[self.enemies_alive[scenes[e], enemies[e]]]] = True
+        self.rewards += self.parameters.died * died
+        collected_all = ~self.crystals_alive.any(axis=1)
+        self.rewards += self.parameters.collected_all * collected_all
+        self.dones[:] = died | collected_all
+        if self.telemetry is not None:
+            # the first reason only, as for SpaceCrystalsEnv
+            endings = self.telemetry.endings
+            endings[:] = ENDED_COLLECTED_ALL
+            endings[died] = ENDED_ENEMY
+            endings[out] = ENDED_OUT_OF_BOUNDS
@@ -2,5 +2,9 @@ from setuptools import setup
 
 setup(name='gym_space_crystals',
       version='0.0.1',
-      install_requires=['gym']
-)
\ No newline at end of file
+      install_requires=['gym'],
+      entry_points={
+          'console_scripts': ['space-crystals-bench=gym_space_crystals.benchmarks.suite:main',
+                              'space-crystals-server=gym_space_crystals.envs.space_crystals_server:main'],
+      }
+)
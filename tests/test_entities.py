@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from gym_space_crystals.envs._entities import Bullet, EntityPool, Spaceship, bullets_capacity, diagonal, make_pools
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+from gym_space_crystals.envs.space_crystals_vec_env import SpaceCrystalsVectorEnv
+
+SHOOT = 4
+
+
+def test_bullets_capacity_holds_a_shot_per_tick():
+    for dt in [0.5, 1., 4.]:
+        env = SpaceCrystalsEnv(dt=dt, n_enemies=0)
+        env.seed(0)
+        env.reset()
+        assert env.bullets.capacity == bullets_capacity(SCREEN_WIDTH, SCREEN_HEIGHT, dt)
+        assert env.bullets.capacity * dt > diagonal(SCREEN_WIDTH, SCREEN_HEIGHT)
+        vec_env = SpaceCrystalsVectorEnv(1, dt=dt, n_enemies=0)
+        vec_env.seed(0)
+        vec_env.reset()
+        # more shots than the window's capacity at dt=1
+        for _ in range(1000):
+            _, reward, done, _ = env.step(SHOOT)
+            _, vec_rewards, _, _ = vec_env.step(np.array([SHOOT]))
+            assert reward == vec_rewards[0]
+            if done:
+                break
+        assert env.bullets.n_alive == vec_env.bullets_alive.sum()
+        env.close()
+        vec_env.close()
+
+
+def test_shot_not_charged_when_the_pool_is_full():
+    env = SpaceCrystalsEnv()
+    env.seed(0)
+    env.reset()
+    while env.bullets.spawn(env.spaceship.x, env.spaceship.y, 0., 1.) is not None:
+        pass
+    env.reward = 0.
+    env.shoot()
+    assert env.reward == 0.
+    env.close()
+
+
+def test_pool_reuses_freed_slots():
+    pool = EntityPool('bullet', 4, Bullet)
+    bullets = [pool.spawn(float(i), 0., 0., 1.) for i in range(4)]
+    assert [bullet.index for bullet in bullets] == [0, 1, 2, 3]
+    pool.kill(np.array([2, 1]))
+    assert len(pool) == 2
+    np.testing.assert_array_equal(pool.indices(), [0, 3])
+    # the last freed slot first, the entity objects being reused
+    assert pool.spawn(10., 0.) is bullets[1]
+    assert pool.spawn(11., 0.) is bullets[2]
+    assert (pool.x[1], pool.x[2]) == (10., 11.)
+    np.testing.assert_array_equal(pool.spawn_batch(np.zeros(2), np.zeros(2), np.zeros(2), np.ones(2)), [])
+
+
+def test_full_pool():
+    pool = EntityPool('bullet', 3, Bullet)
+    slots = pool.spawn_batch(np.arange(5.), np.zeros(5), np.zeros(5), np.ones(5))
+    np.testing.assert_array_equal(slots, [0, 1, 2])
+    assert len(pool) == 3
+    assert pool.spawn(0., 0.) is None
+    pool.clear()
+    assert len(pool) == 0
+    assert pool.spawn(0., 0.).index == 0
+
+
+def test_spaceship_shoots_into_its_pool():
+    _, _, (spaceships, bullets) = make_pools([('spaceship', 1, Spaceship), ('bullet', 1, Bullet)])
+    spaceship = spaceships.spawn(100., 200., 0.5, 2.)
+    bullet = spaceship.shoot(bullets)
+    assert (bullet.x, bullet.y, bullet.rotation, bullet.velocity) == (100., 200., 0.5, 4.)
+    # the pool is full
+    assert spaceship.shoot(bullets) is None
+    bullets.remove(bullet)
+    spaceship.velocity = 0.
+    assert spaceship.shoot(bullets).velocity == 1
+
+
+@pytest.mark.parametrize('seed', [0, 2])
+def test_single_env_matches_vector_env(seed):
+    env = SpaceCrystalsEnv()
+    env.seed(seed)
+    vec_env = SpaceCrystalsVectorEnv(1)
+    vec_env.seed(seed)
+    np.testing.assert_array_equal(env.reset(), vec_env.reset()[0])
+    rng = np.random.RandomState(seed)
+    done = False
+    while not done:
+        action = int(rng.randint(5))
+        observation, reward, done, _ = env.step(action)
+        vec_observations, vec_rewards, vec_dones, vec_infos = vec_env.step(np.array([action]))
+        assert (reward, done) == (vec_rewards[0], vec_dones[0])
+        np.testing.assert_array_equal(observation, vec_infos[0].get('terminal_observation', vec_observations[0]))
+    env.close()
+    vec_env.close()
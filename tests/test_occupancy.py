@@ -0,0 +1,16 @@
+import numpy as np
+
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+
+
+def test_ego_grid_until_terminal():
+    env = SpaceCrystalsEnv(observation_mode='grid', grid_ego=True, dtype='uint8')
+    env.seed(0)
+    rng = np.random.RandomState(0)
+    for _ in range(5):
+        observation = env.reset()
+        done = False
+        while not done:
+            observation, _, done, _ = env.step(int(rng.randint(5)))
+            assert env.observation_space.contains(observation)
+    env.close()
@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+
+from gym_space_crystals.envs._recording import TrajectoryRecorder, TrajectoryReplayer
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+
+
+def _record(directory: str, chunk_size: int) -> int:
+    """
+    Record an episode of a fixed policy
+
+    :return: The number of rows
+    """
+    recorder = TrajectoryRecorder(SpaceCrystalsEnv(), directory, chunk_size=chunk_size, seed=3)
+    recorder.reset()
+    rng = np.random.RandomState(0)
+    done = False
+    while not done:
+        _, _, done, _ = recorder.step(int(rng.randint(5)))
+    recorder.close()
+    return recorder.n_rows
+
+
+def test_no_empty_chunk_left(tmpdir):
+    n_rows = _record(str(tmpdir.join('probe')), 1000)
+    for chunk_size in [n_rows, n_rows // 2 + 1, (n_rows + 1) // 2, 7]:
+        directory = str(tmpdir.join('chunks_%d' % chunk_size))
+        assert _record(directory, chunk_size) == n_rows
+        n_chunks = -(-n_rows // chunk_size)
+        assert len([name for name in os.listdir(directory) if name.startswith('actions_')]) == n_chunks
+        replayer = TrajectoryReplayer(directory)
+        assert sum(1 for _ in replayer.replay(SpaceCrystalsEnv(), 0)) == n_rows - 1
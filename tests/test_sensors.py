@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from gym_space_crystals.envs._entities import diagonal
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs._sensors import ObservationEncoding, cast_rays, cast_rays_bucketed
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+
+WORLD_SIZE = (6000, 4000)
+CRYSTAL_RADIUS = ENTITIES.get('crystal').get('radius')
+CRYSTAL_VALUE = ENTITIES.get('crystal').get('value')
+
+
+def _observe(caster, distance: float, sensor_range: float = None) -> np.ndarray:
+    """
+    Cast 4 rays from (1000, 2000), the first one towards a crystal at a distance
+
+    :return: The (value, normalized distance) pairs
+    """
+    encoding = ObservationEncoding('float64', diagonal(*WORLD_SIZE), sensor_range)
+    out = np.zeros((1, 8))
+    caster(np.array([1000.]), np.array([2000.]), np.array([0.]), np.array([[1000. + distance]]),
+           np.array([[2000.]]), np.array([[True]]), np.array([CRYSTAL_RADIUS]), np.array([CRYSTAL_VALUE]), 4, out,
+           encoding, WORLD_SIZE)
+    return out[0]
+
+
+@pytest.mark.parametrize('caster', [cast_rays, cast_rays_bucketed])
+def test_rays_see_the_whole_world(caster):
+    for distance in [500., 800., 4900.]:
+        value, sensed = _observe(caster, distance)[:2]
+        assert value == CRYSTAL_VALUE
+        assert sensed == pytest.approx(distance / diagonal(*WORLD_SIZE))
+
+
+@pytest.mark.parametrize('caster', [cast_rays, cast_rays_bucketed])
+def test_sensor_range(caster):
+    observations = _observe(caster, 500., sensor_range=600.)
+    assert observations[0] == CRYSTAL_VALUE
+    assert observations[1] == pytest.approx(500. / 600.)
+    # the borders are beyond the range
+    np.testing.assert_array_equal(observations[2::2], [BORDER_VALUE] * 3)
+    np.testing.assert_array_equal(observations[3::2], [1.] * 3)
+    # nothing beyond the range is seen
+    observations = _observe(caster, 800., sensor_range=600.)
+    assert (observations[0], observations[1]) == (BORDER_VALUE, 1.)
+
+
+def test_observations_within_space_for_every_dtype():
+    observations = {}
+    for dtype in ['float64', 'float32', 'uint8']:
+        env = SpaceCrystalsEnv(dtype=dtype)
+        env.seed(0)
+        rng = np.random.RandomState(0)
+        observation = env.reset()
+        steps = []
+        for _ in range(200):
+            # rotating keeps the spaceship alive, its rotation going around several turns
+            observation, _, done, _ = env.step(int(rng.choice([2, 2, 4])))
+            assert env.observation_space.contains(observation)
+            steps.append(env.encoding.decode(observation))
+            if done:
+                break
+        observations[dtype] = np.array(steps)
+        env.close()
+    assert (observations['float64'][:, 3::2] < 0).any()
+    np.testing.assert_allclose(observations['float32'], observations['float64'], atol=1e-6)
+    np.testing.assert_allclose(observations['uint8'][:, 2], observations['float64'][:, 2], atol=1 / 255)
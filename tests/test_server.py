@@ -0,0 +1,28 @@
+import pytest
+
+from gym_space_crystals.envs.space_crystals_server import MAX_SCENES, check_make
+
+
+def test_check_make_accepts_client_kwargs():
+    check_make(64, dict(dtype='float32', world_size=[2000, 2000], config=[dict(n_enemies=2)] * 64, sensor_range=300))
+
+
+@pytest.mark.parametrize('num_envs, kwargs', [
+    (2, dict(telemetry='/tmp/space-crystals')),
+    (2, dict(initial_bullets=1 << 30)),
+    (MAX_SCENES + 1, {}),
+    ('2', {}),
+    (64, dict(n_crystals=1 << 20)),
+    (2, dict(config=[dict(n_crystals=1 << 30), {}])),
+    (64, dict(n_observations=1 << 20)),
+    (64, dict(observation_mode='grid', grid_size=[4096, 4096])),
+    (2, dict(world_size=[1e12, 600])),
+    (2, dict(dt=1e-9, world_size=[100000, 100000])),
+    (2, dict(dt=0)),
+    (2, dict(dt=-1)),
+    (2, dict(dt=1e6)),
+    (4096, dict(world_size=[100000, 100000])),
+])
+def test_check_make_refuses(num_envs, kwargs):
+    with pytest.raises(ValueError):
+        check_make(num_envs, kwargs)
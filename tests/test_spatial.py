@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from gym_space_crystals.envs._config import EnvConfig
+from gym_space_crystals.envs._entities import swept_box_intersection
+from gym_space_crystals.envs._globals import *
+from gym_space_crystals.envs._spatial import MAX_ALL_PAIRS, SpatialHash, first_hits, swept_cell_size, swept_pairs
+from gym_space_crystals.envs.space_crystals_env import SpaceCrystalsEnv
+from gym_space_crystals.envs.space_crystals_vec_env import SpaceCrystalsVectorEnv
+
+WORLD_SIZE = (6000, 4000)
+DECELERATE = 1
+
+
+def _moving(rng: np.random.Generator, n: int, velocity: float, dt: float):
+    """
+    Draw entities over the world, moving by at most a velocity over a tick
+
+    :return: Their end and start coordinates
+    """
+    x = rng.uniform(0, WORLD_SIZE[0], n)
+    y = rng.uniform(0, WORLD_SIZE[1], n)
+    angle = rng.uniform(-np.pi, np.pi, n)
+    speed = rng.uniform(-velocity, velocity, n) * dt
+    return x, y, x - np.cos(angle) * speed, y - np.sin(angle) * speed
+
+
+@pytest.mark.parametrize('dt', [1., 4.])
+def test_swept_pairs_grid_matches_all_pairs(dt):
+    config = EnvConfig()
+    rng = np.random.default_rng(0)
+    # bullets against enemies: the largest relative velocity
+    bullets = _moving(rng, 2000, 2 * config.spaceship_max_velocity, dt)
+    enemies = _moving(rng, 3000, config.enemy_max_velocity, dt)
+    bullet_radius = ENTITIES.get('bullet').get('radius')
+    enemy_radius = ENTITIES.get('enemy').get('radius')
+    assert len(bullets[0]) * len(enemies[0]) > MAX_ALL_PAIRS
+
+    grid = SpatialHash(enemies[0], enemies[1], cell_size=swept_cell_size(dt, config.max_relative_velocity))
+    i, j = swept_pairs(grid, *enemies, enemy_radius, *bullets, bullet_radius)
+    hit = swept_box_intersection(*(c[:, None] for c in bullets), bullet_radius,
+                                 *(c[None, :] for c in enemies), enemy_radius)
+    all_i, all_j = np.nonzero(hit)
+    assert all_i.size > 0
+    assert sorted(zip(i.tolist(), j.tolist())) == sorted(zip(all_i.tolist(), all_j.tolist()))
+
+
+def test_spaceship_velocity_bounded_backwards():
+    env = SpaceCrystalsEnv(world_size=WORLD_SIZE, n_enemies=0)
+    env.seed(0)
+    env.reset()
+    for _ in range(80):
+        env.step(DECELERATE)
+    assert env.spaceship.velocity == -env.config.spaceship_max_velocity
+    env.close()
+
+    vec_env = SpaceCrystalsVectorEnv(2, world_size=WORLD_SIZE, n_enemies=0)
+    vec_env.seed(0)
+    vec_env.reset()
+    for _ in range(80):
+        vec_env.step(np.full(2, DECELERATE))
+    np.testing.assert_array_equal(vec_env.spaceship_velocity, -vec_env.parameters.spaceship_max_velocity)
+    vec_env.close()
+
+
+def test_first_hits_ordering():
+    i = np.array([2, 0, 2, 1, 1])
+    j = np.array([5, 4, 3, 3, 6])
+    # each i keeps its lowest j (0: 4, 1: 3, 2: 3), then each j its lowest i (3: 1, 4: 0)
+    first_i, first_j = first_hits(i, j)
+    assert sorted(zip(first_i.tolist(), first_j.tolist())) == [(0, 4), (1, 3)]
+
+
+def test_first_hits_pairs_each_entity_once():
+    rng = np.random.default_rng(0)
+    i, j = rng.integers(0, 50, (2, 400))
+    first_i, first_j = first_hits(i, j)
+    assert np.unique(first_i).size == first_i.size
+    assert np.unique(first_j).size == first_j.size
+    pairs = set(zip(i.tolist(), j.tolist()))
+    assert all(pair in pairs for pair in zip(first_i.tolist(), first_j.tolist()))
+
+
+def test_each_bullet_hits_at_most_one_enemy():
+    env = SpaceCrystalsEnv(n_crystals=0, n_enemies=3)
+    env.seed(0)
+    env.reset()
+    env.enemies.clear()
+    env.bullets.clear()
+    # two overlapping enemies on the path of a bullet, and a third one hit by two bullets
+    for x, y in [(300., 300.), (305., 300.), (500., 100.)]:
+        env.enemies.spawn(x, y, 0., 0.)
+    for x, y in [(300., 300.), (500., 100.), (502., 100.)]:
+        env.bullets.spawn(x, y, 0., 1.)
+    enemies = env.enemies.indices()
+    grid = SpatialHash(env.enemies.x[enemies], env.enemies.y[enemies], cell_size=env.cell_size)
+    hit_enemies, hit_bullets = env.bullet_hits(enemies, grid, env.enemies.x[enemies], env.enemies.y[enemies],
+                                               env.bullets.x.copy(), env.bullets.y.copy())
+    assert sorted(zip(hit_enemies.tolist(), hit_bullets.tolist())) == [(0, 0), (2, 1)]
+    env.close()